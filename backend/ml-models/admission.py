@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Admission Control
+Bounded, deadline-aware priority queue in front of the analyzer workers
+
+Requests are served text-only first, then by earliest deadline. A request
+is shed, with an error response instead of an analysis, when:
+    queueFull - the queue is at max_depth and nothing queued ranks below it
+    deadline  - its remaining budget is shorter than the recent service time
+                of requests of its kind, at admission or when dequeued
+    expired   - its deadline passed while it waited
+
+Every deadline shed also decays the estimate for that kind, so one slow
+outlier (a cold model load, say) cannot starve a kind indefinitely: after a
+few sheds a request is let through and measured again.
+"""
+
+import heapq
+import itertools
+import math
+import threading
+import time
+from collections import deque
+
+from instrumentation import METRICS
+
+# Lower runs first
+TEXT_PRIORITY = 0
+MEDIA_PRIORITY = 1
+
+
+def request_kind(request):
+    """"text", "image", "audio" or "image+audio" by the payloads a request carries"""
+    media = [name for name, field in (("image", "imageData"), ("audio", "audioData")) if request.get(field)]
+    return "+".join(media) or "text"
+
+
+class AdmissionQueue:
+    def __init__(self, on_shed, max_depth=64, default_deadline_s=None, ewma_alpha=0.2):
+        """
+        on_shed(request, reason) answers requests dropped after they were
+        queued. max_depth bounds the queued (not yet running) requests. A
+        request's deadline comes from its "deadlineMs" (budget from arrival)
+        and falls back to default_deadline_s; without either it is never shed
+        for time.
+        """
+        self.on_shed = on_shed
+        self.max_depth = max_depth
+        self.default_deadline_s = default_deadline_s
+        self.ewma_alpha = ewma_alpha
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._closed = False
+
+        self.service_seconds = {}
+        self.admitted = 0
+        self.shed = {"queueFull": 0, "deadline": 0, "expired": 0}
+        self.waits = deque(maxlen=1000)
+
+    def _deadline(self, request, now):
+        budget_ms = request.get("deadlineMs")
+        if budget_ms is not None:
+            try:
+                budget_ms = None if isinstance(budget_ms, bool) else float(budget_ms)
+            except (TypeError, ValueError):
+                budget_ms = None
+            # NaN fails every comparison, so this also rejects it
+            if budget_ms is None or not (0 <= budget_ms < math.inf):
+                raise ValueError("invalid deadlineMs")
+            return now + budget_ms / 1000.0
+        if self.default_deadline_s is not None:
+            return now + self.default_deadline_s
+        return None
+
+    def _record_shed(self, reason, kind):
+        self.shed[reason] += 1
+        METRICS.inc("shed_total", 1, "Analyze requests shed by admission control", reason=reason, kind=kind)
+
+    def _too_slow(self, kind, deadline, now):
+        estimate = self.service_seconds.get(kind)
+        if deadline is None or estimate is None or now + estimate <= deadline:
+            return False
+        self.service_seconds[kind] = estimate * (1.0 - self.ewma_alpha)
+        return True
+
+    def submit(self, request):
+        """
+        Queue a request; returns the shed reason instead if it is not admitted.
+        Raises ValueError for a deadlineMs that is not a non-negative number.
+        """
+        now = time.monotonic()
+        kind = request_kind(request)
+        priority = TEXT_PRIORITY if kind == "text" else MEDIA_PRIORITY
+        deadline = self._deadline(request, now)
+
+        evicted = None
+        with self._cond:
+            if self._too_slow(kind, deadline, now):
+                self._record_shed("deadline", kind)
+                return "deadline"
+            key = (priority, deadline if deadline is not None else float("inf"), next(self._seq))
+            if len(self._heap) >= self.max_depth:
+                # Make room by dropping the lowest ranked entry, if this one outranks it
+                worst = max(self._heap)
+                if key >= worst[:3]:
+                    self._record_shed("queueFull", kind)
+                    return "queueFull"
+                self._heap.remove(worst)
+                heapq.heapify(self._heap)
+                self._record_shed("queueFull", worst[4])
+                evicted = worst[5]
+            heapq.heappush(self._heap, key + (now, kind, request))
+            self.admitted += 1
+            self._cond.notify()
+        if evicted is not None:
+            self.on_shed(evicted, "queueFull")
+        return None
+
+    def get(self):
+        """
+        Next request to run as (request, kind), blocking until one is queued;
+        None once closed and drained. Requests that can no longer make their
+        deadline go to on_shed instead.
+        """
+        with self._cond:
+            while True:
+                while not self._heap and not self._closed:
+                    self._cond.wait()
+                if not self._heap:
+                    return None
+                _, deadline, _, enqueued, kind, request = heapq.heappop(self._heap)
+                now = time.monotonic()
+                wait = now - enqueued
+                self.waits.append(wait)
+                METRICS.observe("queue_wait_seconds", wait, "Time analyze requests spent queued", kind=kind)
+
+                reason = None
+                if deadline != float("inf") and now >= deadline:
+                    reason = "expired"
+                elif self._too_slow(kind, deadline, now):
+                    reason = "deadline"
+                if reason is None:
+                    return request, kind
+                self._record_shed(reason, kind)
+                self._cond.release()
+                try:
+                    self.on_shed(request, reason)
+                finally:
+                    self._cond.acquire()
+
+    def observe_service(self, kind, seconds):
+        """Feed the per-kind service time estimate with a finished request"""
+        with self._cond:
+            previous = self.service_seconds.get(kind)
+            self.service_seconds[kind] = seconds if previous is None else (
+                previous + self.ewma_alpha * (seconds - previous)
+            )
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def depth(self):
+        with self._cond:
+            return len(self._heap)
+
+    def stats(self):
+        with self._cond:
+            by_kind = {}
+            for entry in self._heap:
+                by_kind[entry[4]] = by_kind.get(entry[4], 0) + 1
+            recent = sorted(self.waits)
+
+            def percentile(p):
+                if not recent:
+                    return None
+                return round(recent[min(len(recent) - 1, int(round(p * (len(recent) - 1))))] * 1000, 3)
+
+            return {
+                "depth": len(self._heap),
+                "maxDepth": self.max_depth,
+                "depthByKind": by_kind,
+                "admitted": self.admitted,
+                "shed": dict(self.shed),
+                "waitMs": {"p50": percentile(0.50), "p95": percentile(0.95), "max": percentile(1.0)},
+                "serviceMs": {kind: round(seconds * 1000, 1) for kind, seconds in self.service_seconds.items()},
+                "defaultDeadlineSeconds": self.default_deadline_s,
+            }
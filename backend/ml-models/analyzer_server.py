@@ -0,0 +1,684 @@
+#!/usr/bin/env python3
+"""
+Civic Analyzer Server
+Keeps EnhancedCivicAnalyzer loaded and serves requests as JSON lines over stdin/stdout
+
+Protocol (one JSON object per line):
+    request:  {"id": "abc", "op": "analyze", "imageData": ..., "text": ..., "audioData": ..., "location": ...,
+               "deadlineMs": 30000}
+    request:  {"id": "h1", "op": "health"}
+    request:  {"id": "m1", "op": "metrics"}  -> Prometheus text in data.prometheus
+    request:  {"id": "d1", "op": "duplicates", "imageData": ..., "location": ...}
+    request:  {"id": "n1", "op": "nearby", "location": "23.34, 85.31", "radiusM": 500, "category": ...}
+    request:  {"id": "b1", "op": "bbox", "minLat": ..., "minLng": ..., "maxLat": ..., "maxLng": ...}
+    request:  {"id": "s1", "op": "hotspots", "category": ..., "minSize": ...}
+    request:  {"id": "i1", "op": "indexIssue", "reportId": ..., "location": ..., "category": ...}
+    response: {"id": "abc", "success": true, "data": {...}}
+    response: {"id": "abc", "success": false, "error": ..., "shed": "queueFull" | "deadline" | "expired"}
+    event:    {"event": "ready", ...} is written once the analyzer is ready
+    event:    {"id": "abc", "event": "partial", ...} carries partial transcripts when "stream" is set
+
+With --prefork-workers N the models are loaded before forking N worker
+processes that share them (see prefork.py); health then reports each
+worker's RSS and PSS.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+import argparse
+
+from instrumentation import METRICS, Profiler
+
+
+SPATIAL_OPS = ("nearby", "bbox", "hotspots", "indexIssue")
+
+
+class AnalyzerService:
+    def __init__(self, caption_batch_size=1, caption_batch_wait_ms=10.0,
+                 idle_ttl=None, preload=False,
+                 caption_cache_size=256, caption_cache_path=None, asr_batch_size=4,
+                 vad_enabled=True, quantize=False, quantized_cache_dir=None,
+                 caption_backend="torch", speech_backend="torch", onnx_dir=None,
+                 branch_threads=None, caption_timeout=None, speech_timeout=None,
+                 profile_sample_rate=0.0, profile_dir="profiles", profiler="cprofile",
+                 dedup=False, dedup_radius_m=50.0, dedup_max_hash_distance=10,
+                 dedup_max_age_seconds=7 * 86400, caption_skip_threshold=None,
+                 text_classifier_path=None, classifier_min_probability=0.5,
+                 model_dir=None, warmup=False, model_memory_budget_mb=None,
+                 spatial_index_path=None, hotspot_eps_m=100.0, hotspot_min_samples=5,
+                 spatial_save_every=200):
+        """Create the service; the analyzer is built by start()"""
+        self.analyzer = None
+        self.caption_batch_size = caption_batch_size
+        self.caption_batch_wait_ms = caption_batch_wait_ms
+        self.idle_ttl = idle_ttl
+        self.preload = preload
+        self.caption_cache_size = caption_cache_size
+        self.caption_cache_path = caption_cache_path
+        self.asr_batch_size = asr_batch_size
+        self.vad_enabled = vad_enabled
+        self.quantize = quantize
+        self.quantized_cache_dir = quantized_cache_dir
+        self.caption_backend = caption_backend
+        self.speech_backend = speech_backend
+        self.onnx_dir = onnx_dir
+        self.branch_threads = branch_threads
+        self.caption_timeout = caption_timeout
+        self.speech_timeout = speech_timeout
+        self.profiler = Profiler(profile_sample_rate, profile_dir, profiler)
+        self.dedup = dedup
+        self.dedup_radius_m = dedup_radius_m
+        self.dedup_max_hash_distance = dedup_max_hash_distance
+        self.dedup_max_age_seconds = dedup_max_age_seconds
+        self.caption_skip_threshold = caption_skip_threshold
+        self.text_classifier_path = text_classifier_path
+        self.classifier_min_probability = classifier_min_probability
+        self.model_dir = model_dir
+        self.warmup = warmup
+        self.model_memory_budget_mb = model_memory_budget_mb
+        self.startup = {}
+        self.worker_pool = None
+        self.admission = None
+        self.state = "starting"
+        self.load_error = None
+        self.started_at = time.time()
+        self.ready_at = None
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        METRICS.add_collector(self._collect_metrics)
+
+        # Analyzed issues with coordinates, for nearby/bbox queries and hotspots
+        from spatial_index import SpatialIndex
+        self.spatial_index_path = spatial_index_path
+        self.spatial_save_every = spatial_save_every
+        self._unsaved_issues = 0
+        if spatial_index_path and os.path.exists(spatial_index_path):
+            self.spatial_index = SpatialIndex.load(spatial_index_path)
+        else:
+            self.spatial_index = SpatialIndex(eps_m=hotspot_eps_m, min_samples=hotspot_min_samples)
+
+    def start(self, warmup=None):
+        """Build the analyzer once for the lifetime of the process
+
+        Models load lazily on first use unless preload or warmup is set, so the
+        server is ready for text-only complaints almost immediately. warmup
+        overrides the service setting (pre-fork parents leave it to workers).
+        """
+        started = time.perf_counter()
+        from enhanced_civic_analyzer import EnhancedCivicAnalyzer
+        self.startup["analyzerImportSeconds"] = round(time.perf_counter() - started, 4)
+
+        self.state = "loading"
+        try:
+            started = time.perf_counter()
+            self.analyzer = EnhancedCivicAnalyzer(
+                caption_batch_size=self.caption_batch_size,
+                caption_batch_wait_ms=self.caption_batch_wait_ms,
+                idle_ttl=self.idle_ttl,
+                preload=self.preload,
+                caption_cache_size=self.caption_cache_size,
+                caption_cache_path=self.caption_cache_path,
+                asr_batch_size=self.asr_batch_size,
+                vad_enabled=self.vad_enabled,
+                quantize=self.quantize,
+                quantized_cache_dir=self.quantized_cache_dir,
+                caption_backend=self.caption_backend,
+                speech_backend=self.speech_backend,
+                onnx_dir=self.onnx_dir,
+                branch_threads=self.branch_threads,
+                caption_timeout=self.caption_timeout,
+                speech_timeout=self.speech_timeout,
+                dedup=self.dedup,
+                dedup_radius_m=self.dedup_radius_m,
+                dedup_max_hash_distance=self.dedup_max_hash_distance,
+                dedup_max_age_seconds=self.dedup_max_age_seconds,
+                caption_skip_threshold=self.caption_skip_threshold,
+                text_classifier_path=self.text_classifier_path,
+                classifier_min_probability=self.classifier_min_probability,
+                model_dir=self.model_dir,
+                warmup=self.warmup if warmup is None else warmup,
+                model_memory_budget_mb=self.model_memory_budget_mb
+            )
+            self.startup["analyzerInitSeconds"] = round(time.perf_counter() - started, 4)
+            self.state = "ready"
+            self.ready_at = time.time()
+        except Exception as e:
+            self.state = "failed"
+            self.load_error = str(e)
+        finally:
+            self._ready.set()
+
+    def wait_until_ready(self, timeout=None):
+        """Block until model loading has finished (successfully or not)"""
+        return self._ready.wait(timeout)
+
+    def health(self):
+        """Report liveness, readiness and request counters"""
+        with self._lock:
+            counters = {
+                "inFlight": self.in_flight,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+        batcher = getattr(self.analyzer, "caption_batcher", None)
+        cache = getattr(self.analyzer, "caption_cache", None)
+        duplicates = getattr(self.analyzer, "duplicate_index", None)
+        classifier = getattr(self.analyzer, "text_classifier", None)
+        return {
+            "status": self.state,
+            "ready": self.state == "ready",
+            "uptimeSeconds": round(time.time() - self.started_at, 3),
+            "loadSeconds": round(self.ready_at - self.started_at, 3) if self.ready_at else None,
+            "startup": dict(self.startup, models=self.analyzer.startup_stats()) if self.analyzer else self.startup,
+            "error": self.load_error,
+            "requests": counters,
+            "models": self.analyzer.model_stats() if self.analyzer else None,
+            "modelMemory": self.analyzer.model_manager.stats() if self.analyzer else None,
+            "captionBatching": batcher.metrics() if batcher else None,
+            "captionCache": cache.stats() if cache else None,
+            "duplicates": duplicates.stats() if duplicates else None,
+            "textClassifier": classifier.stats() if classifier else None,
+            "spatialIndex": self.spatial_index.stats(),
+            "prefork": self.worker_pool.stats() if self.worker_pool else None,
+            "admission": self.admission.stats() if self.admission else None,
+        }
+
+    def _collect_metrics(self):
+        """Scrape-time gauges for the Prometheus endpoint"""
+        with self._lock:
+            in_flight = self.in_flight
+        metrics = [("in_flight_requests", "gauge", "Analyze requests in progress", in_flight),
+                   ("ready", "gauge", "1 once the analyzer is loaded", int(self.state == "ready"))]
+        if self.admission is not None:
+            metrics.append(("queue_depth", "gauge", "Requests waiting for a worker", self.admission.depth()))
+        if self.analyzer is None:
+            return metrics
+
+        model_stats = self.analyzer.model_stats()
+        loaded = {(("model", name),): int(stats["loaded"]) for name, stats in model_stats.items()}
+        metrics.append(("model_loaded", "gauge", "1 while a model is resident", loaded))
+        resident = {(("model", name),): int(stats["residentMb"] * 2 ** 20) if stats["loaded"] else 0
+                    for name, stats in model_stats.items() if stats["residentMb"] is not None}
+        metrics.append(("model_resident_bytes", "gauge",
+                        "RSS growth measured when a model loaded (0 while unloaded)", resident))
+        budget = self.analyzer.model_manager.budget_bytes
+        if budget is not None:
+            metrics.append(("model_memory_budget_bytes", "gauge", "Memory budget for loaded models", budget))
+        cache = self.analyzer.caption_cache
+        if cache is not None:
+            stats = cache.stats()
+            metrics.append(("caption_cache_entries", "gauge", "Captions held in memory", stats.get("entries")))
+            metrics.append(("caption_cache_hits_total", "counter", "Caption cache hits", stats.get("hits")))
+            metrics.append(("caption_cache_misses_total", "counter", "Caption cache misses", stats.get("misses")))
+        if self.worker_pool is not None:
+            stats = self.worker_pool.stats()
+            metrics.append(("prefork_workers_alive", "gauge", "Forked analyzer workers still running",
+                            sum(worker["alive"] for worker in stats["workers"])))
+            metrics.append(("prefork_rss_bytes", "gauge", "Summed RSS of the server and its workers",
+                            int(stats["totalRssMb"] * 2 ** 20)))
+            metrics.append(("prefork_pss_bytes", "gauge", "Summed PSS of the server and its workers",
+                            int(stats["totalPssMb"] * 2 ** 20)))
+        return metrics
+
+    def metrics(self):
+        """Aggregated stage histograms and gauges in Prometheus text format"""
+        return METRICS.render_prometheus()
+
+    def analyze(self, request, emit=None):
+        """Run one analysis request against the shared analyzer
+
+        With "stream": true and an emit callback, partial transcripts of long
+        voice notes are emitted as {"id", "event": "partial"} messages.
+        """
+        if not self.wait_until_ready(timeout=request.get("readyTimeout")):
+            return {"success": False, "error": "Analyzer is still loading"}
+        if self.analyzer is None:
+            return {"success": False, "error": f"Analyzer failed to load: {self.load_error}"}
+
+        on_partial = None
+        if request.get("stream") and emit is not None:
+            def on_partial(index, total, text, transcript):
+                emit({
+                    "id": request.get("id"),
+                    "event": "partial",
+                    "data": {"chunk": index, "chunks": total, "text": text, "transcript": transcript}
+                })
+
+        if self.worker_pool is not None:
+            return self.worker_pool.analyze(request, emit=emit)
+
+        with self.profiler.maybe_profile(request.get("id")):
+            return self.analyzer.analyze_civic_issue(
+                image_data=request.get("imageData"),
+                text=request.get("text"),
+                audio_data=request.get("audioData"),
+                location=request.get("location"),
+                include_timings=bool(request.get("includeTimings")),
+                on_partial_transcript=on_partial,
+                report_id=request.get("reportId")
+            )
+
+    def find_duplicate(self, request):
+        """Look up an earlier report matching this photo and location, without analyzing it"""
+        if not self.wait_until_ready(timeout=request.get("readyTimeout")):
+            return {"success": False, "error": "Analyzer is still loading"}
+        if self.analyzer is None:
+            return {"success": False, "error": f"Analyzer failed to load: {self.load_error}"}
+        if self.analyzer.duplicate_index is None:
+            return {"success": False, "error": "Duplicate detection is disabled (start with --dedup)"}
+
+        match = self.analyzer.find_duplicate(request.get("imageData"), request.get("location"))
+        return {"success": True, "data": {"duplicateOf": match}}
+
+    def index_issue(self, issue_id, location, category, reported_at=None):
+        """Add an issue to the spatial index; returns False if it has no coordinates"""
+        from geo_utils import parse_location
+
+        coordinates = parse_location(location)
+        if coordinates is None:
+            return False
+        self.spatial_index.add(issue_id, coordinates[0], coordinates[1], category, added=reported_at)
+
+        with self._lock:
+            self._unsaved_issues += 1
+            save = bool(self.spatial_index_path) and self._unsaved_issues >= self.spatial_save_every
+            if save:
+                self._unsaved_issues = 0
+        if save:
+            self.spatial_index.save(self.spatial_index_path)
+        return True
+
+    def spatial_query(self, op, request):
+        """nearby, bbox, hotspots and indexIssue ops"""
+        from geo_utils import parse_location
+
+        index = self.spatial_index
+        category = request.get("category")
+        limit = request.get("limit")
+        try:
+            if op == "indexIssue":
+                indexed = self.index_issue(request.get("reportId") or uuid.uuid4().hex,
+                                           request.get("location"), category or "OTHER",
+                                           request.get("reportedAt"))
+                if not indexed:
+                    return {"success": False, "error": "Location has no coordinates"}
+                return {"success": True, "data": {"issues": len(index)}}
+            if op == "nearby":
+                coordinates = parse_location(request.get("location") or
+                                             {"lat": request.get("lat"), "lng": request.get("lng")})
+                if coordinates is None:
+                    return {"success": False, "error": "Location has no coordinates"}
+                issues = index.radius(coordinates[0], coordinates[1], float(request.get("radiusM", 500)),
+                                      category=category, limit=limit)
+                return {"success": True, "data": {"issues": issues}}
+            if op == "bbox":
+                issues = index.bbox(float(request["minLat"]), float(request["minLng"]),
+                                    float(request["maxLat"]), float(request["maxLng"]),
+                                    category=category, limit=limit)
+                return {"success": True, "data": {"issues": issues}}
+            hotspots = index.hotspots(category=category, min_size=request.get("minSize"), limit=limit)
+            return {"success": True, "data": {"hotspots": hotspots}}
+        except (KeyError, TypeError, ValueError) as e:
+            return {"success": False, "error": f"Invalid {op} request: {e}"}
+
+    def start_workers(self, workers, threads_per_worker=None, interop_threads=1, concurrency=1):
+        """Fork pre-loaded analyzer workers (see prefork.py); call before starting any thread"""
+        from prefork import PreforkPool
+
+        if self.analyzer is None:
+            raise RuntimeError(f"Analyzer failed to load: {self.load_error}")
+        self.worker_pool = PreforkPool(self, workers, threads_per_worker=threads_per_worker,
+                                       interop_threads=interop_threads, concurrency=concurrency)
+
+    def close(self):
+        """Persist state that outlives the process"""
+        if self.worker_pool is not None:
+            self.worker_pool.close()
+        if self.spatial_index_path:
+            self.spatial_index.save(self.spatial_index_path)
+
+    def handle(self, request, emit=None):
+        """Dispatch a decoded request and return the response object"""
+        request_id = request.get("id")
+        op = request.get("op", "analyze")
+
+        if op == "health":
+            return {"id": request_id, "success": True, "data": self.health()}
+        if op == "ready":
+            return {"id": request_id, "success": True, "data": {"ready": self.state == "ready"}}
+        if op == "metrics":
+            return {"id": request_id, "success": True, "data": {"prometheus": self.metrics()}}
+        if op == "duplicates":
+            response = {"id": request_id}
+            response.update(self.find_duplicate(request))
+            return response
+        if op in SPATIAL_OPS:
+            response = {"id": request_id}
+            response.update(self.spatial_query(op, request))
+            return response
+        if op != "analyze":
+            return {"id": request_id, "success": False, "error": f"Unknown op: {op}"}
+
+        with self._lock:
+            self.in_flight += 1
+        started = time.perf_counter()
+        try:
+            result = self.analyze(request, emit=emit)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+        status = "ok" if result.get("success") else "error"
+        METRICS.observe("request_seconds", time.perf_counter() - started,
+                        "End-to-end analyze latency", status=status)
+        METRICS.inc("requests_total", 1, "Analyze requests handled", status=status)
+
+        with self._lock:
+            if result.get("success"):
+                self.completed += 1
+            else:
+                self.failed += 1
+
+        data = result.get("data") or {}
+        if result.get("success") and not data.get("duplicateOf"):
+            self.index_issue(data.get("reportId") or request.get("reportId") or uuid.uuid4().hex,
+                             request.get("location"), data.get("category", "OTHER"))
+
+        response = {"id": request_id}
+        response.update(result)
+        return response
+
+
+class JsonLineTransport:
+    def __init__(self, service, infile, outfile, workers=2, max_queue_depth=64, default_deadline_s=None):
+        """Serve requests read from infile and write responses to outfile
+
+        Requests wait in an AdmissionQueue (see admission.py) for one of the
+        `workers` threads: text-only first, then earliest deadline, with at
+        most max_queue_depth waiting; the rest are shed with an error
+        response carrying "shed": reason.
+        """
+        from admission import AdmissionQueue
+
+        self.service = service
+        self.infile = infile
+        self.outfile = outfile
+        self.admission = AdmissionQueue(self._shed, max_depth=max_queue_depth,
+                                        default_deadline_s=default_deadline_s)
+        service.admission = self.admission
+        self._write_lock = threading.Lock()
+        self.threads = [
+            threading.Thread(target=self._dispatch, name=f"analyzer-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def write(self, message):
+        """Write one JSON line; safe to call from worker threads"""
+        line = json.dumps(message)
+        with self._write_lock:
+            self.outfile.write(line + "\n")
+            self.outfile.flush()
+
+    def _process(self, request):
+        self.write(self.service.handle(request, emit=self.write))
+
+    def _shed(self, request, reason):
+        messages = {
+            "queueFull": "Analyzer overloaded; request queue is full",
+            "deadline": "Analyzer cannot finish this request before its deadline",
+            "expired": "Request deadline passed while it was queued",
+        }
+        self.write({"id": request.get("id"), "success": False, "error": messages[reason], "shed": reason})
+
+    def _dispatch(self):
+        while True:
+            item = self.admission.get()
+            if item is None:
+                return
+            request, kind = item
+            started = time.perf_counter()
+            self._process(request)
+            if request.get("op", "analyze") == "analyze":
+                self.admission.observe_service(kind, time.perf_counter() - started)
+
+    def serve_forever(self):
+        """Read requests until stdin is closed"""
+        for line in self.infile:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError as e:
+                self.write({"id": None, "success": False, "error": f"Invalid JSON: {e}"})
+                continue
+            if not isinstance(request, dict):
+                self.write({"id": None, "success": False, "error": "Invalid JSON: request must be an object"})
+                continue
+
+            # Health checks must answer even while models load or workers are busy
+            if request.get("op") in ("health", "ready", "metrics"):
+                self.write(self.service.handle(request))
+                continue
+            try:
+                reason = self.admission.submit(request)
+            except Exception as e:
+                # A malformed request must never end the read loop
+                self.write({"id": request.get("id"), "success": False, "error": str(e)})
+                continue
+            if reason is not None:
+                self._shed(request, reason)
+
+        self.admission.close()
+        for thread in self.threads:
+            thread.join()
+
+
+def serve_metrics_http(service, port, host="127.0.0.1"):
+    """Expose GET /metrics for Prometheus scraping on a background thread"""
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = service.metrics().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    """Run the analyzer as a long-lived JSON-lines server"""
+    from inference_backends import BACKENDS
+
+    parser = argparse.ArgumentParser(description="Civic Analyzer Server")
+    parser.add_argument("--workers", type=int, default=2,
+                        help="Number of requests processed concurrently")
+    parser.add_argument("--max-queue-depth", type=int, default=64,
+                        help="Requests allowed to wait for a worker; beyond that the lowest ranked is shed")
+    parser.add_argument("--default-deadline-s", type=float, default=None,
+                        help="Deadline for requests without deadlineMs (default: none)")
+    parser.add_argument("--prefork-workers", type=int, default=0,
+                        help="Load the models once and fork this many worker processes sharing them "
+                             "(0 analyzes in this process)")
+    parser.add_argument("--worker-threads", type=int, default=None,
+                        help="torch intra-op threads per forked worker (default: one per CPU it is pinned to)")
+    parser.add_argument("--worker-interop-threads", type=int, default=1,
+                        help="torch inter-op threads per forked worker")
+    parser.add_argument("--worker-concurrency", type=int, default=1,
+                        help="Requests each forked worker analyzes at once")
+    parser.add_argument("--batch-max-size", type=int, default=1,
+                        help="Max images per BLIP generate call (1 disables batching)")
+    parser.add_argument("--batch-max-wait-ms", type=float, default=10.0,
+                        help="Max time an image waits for its batch to fill")
+    parser.add_argument("--model-idle-ttl", type=float, default=None,
+                        help="Unload a model after this many idle seconds")
+    parser.add_argument("--model-memory-budget-mb", type=float, default=None,
+                        help="Keep loaded models within this many MB, unloading the least recently used "
+                             "one to load another, and free memory after each request")
+    parser.add_argument("--preload", action="store_true",
+                        help="Load all models at startup instead of on first use")
+    parser.add_argument("--model-dir",
+                        help="Pinned local model directory (see model_loader.py pin); no hub lookups at startup")
+    parser.add_argument("--warmup", action="store_true",
+                        help="Load the models and run a tiny inference through each before reporting ready")
+    parser.add_argument("--asr-batch-size", type=int, default=4,
+                        help="Chunks of a long voice note decoded per Whisper forward pass")
+    parser.add_argument("--no-vad", action="store_true",
+                        help="Send voice notes to Whisper without trimming silence")
+    parser.add_argument("--quantize", action="store_true",
+                        help="Run BLIP and Whisper with int8 dynamic quantization (CPU)")
+    parser.add_argument("--quantized-cache-dir",
+                        help="Where quantized weights are cached between runs")
+    parser.add_argument("--caption-backend", choices=BACKENDS, default="torch",
+                        help="Runtime for the captioning stage")
+    parser.add_argument("--speech-backend", choices=BACKENDS, default="torch",
+                        help="Runtime for the speech-to-text stage")
+    parser.add_argument("--onnx-dir",
+                        help="Directory holding (or receiving) exported ONNX models")
+    parser.add_argument("--branch-threads", type=int, default=None,
+                        help="torch intra-op threads for each image/audio branch")
+    parser.add_argument("--caption-timeout", type=float, default=12.0,
+                        help="Seconds to wait for the caption stage before answering without it")
+    parser.add_argument("--speech-timeout", type=float, default=15.0,
+                        help="Seconds to wait for speech-to-text before answering without it")
+    parser.add_argument("--caption-cache-size", type=int, default=256,
+                        help="Captions kept in the in-memory LRU cache (0 disables it)")
+    parser.add_argument("--caption-cache-path",
+                        help="SQLite file that persists cached captions across restarts")
+    parser.add_argument("--caption-skip-threshold", type=float, default=None,
+                        help="Skip BLIP when the typed text's confidence score (0-1) reaches this and its "
+                             "categories agree (default: always caption)")
+    parser.add_argument("--text-classifier",
+                        help="Trained classifier (see text_classifier.py) used instead of the keyword rules")
+    parser.add_argument("--classifier-min-probability", type=float, default=0.5,
+                        help="Below this top probability the keyword rules pick the category")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Reuse the analysis of an earlier report with a near-identical photo nearby")
+    parser.add_argument("--dedup-radius-m", type=float, default=50.0,
+                        help="Max distance in meters between duplicate reports")
+    parser.add_argument("--dedup-max-hash-distance", type=int, default=10,
+                        help="Max differing bits (of 64) in the pHash and dHash of duplicate photos")
+    parser.add_argument("--dedup-max-age-hours", type=float, default=168.0,
+                        help="How long a report stays eligible as the original of duplicates")
+    parser.add_argument("--spatial-index-path",
+                        help=".npz file the spatial issue index is loaded from (keeping its clustering parameters) and saved to")
+    parser.add_argument("--spatial-save-every", type=int, default=200,
+                        help="Save the spatial index after this many new issues")
+    parser.add_argument("--hotspot-eps-m", type=float, default=100.0,
+                        help="DBSCAN neighbourhood radius in meters for hotspot clustering")
+    parser.add_argument("--hotspot-min-samples", type=int, default=5,
+                        help="Issues within --hotspot-eps-m needed to seed a hotspot")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics on http://127.0.0.1:PORT/metrics")
+    parser.add_argument("--profile-sample-rate", type=float, default=0.0,
+                        help="Fraction of analyze requests to profile (0 disables profiling)")
+    parser.add_argument("--profile-dir", default="profiles",
+                        help="Directory receiving profiler dumps")
+    parser.add_argument("--profiler", choices=["cprofile", "torch"], default="cprofile",
+                        help="cprofile: .prof of the request thread; torch: Chrome trace of torch ops")
+    args = parser.parse_args()
+    if args.prefork_workers:
+        # Each of these would give every worker private copies or dead threads
+        if "onnx" in (args.caption_backend, args.speech_backend):
+            parser.error("--prefork-workers needs torch or tiny backends (ONNX Runtime pools do not survive fork)")
+        if args.model_idle_ttl:
+            parser.error("--model-idle-ttl would make workers reload private copies of the shared weights")
+        if args.model_memory_budget_mb:
+            parser.error("--model-memory-budget-mb would make workers reload private copies of the shared weights")
+        if args.dedup:
+            parser.error("--dedup keeps its index per process; it cannot be combined with --prefork-workers")
+
+    # The protocol owns stdout; route diagnostic prints to stderr
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    service = AnalyzerService(
+        caption_batch_size=args.batch_max_size,
+        caption_batch_wait_ms=args.batch_max_wait_ms,
+        idle_ttl=args.model_idle_ttl,
+        preload=args.preload,
+        caption_cache_size=args.caption_cache_size,
+        caption_cache_path=args.caption_cache_path,
+        asr_batch_size=args.asr_batch_size,
+        vad_enabled=not args.no_vad,
+        quantize=args.quantize,
+        quantized_cache_dir=args.quantized_cache_dir,
+        caption_backend=args.caption_backend,
+        speech_backend=args.speech_backend,
+        onnx_dir=args.onnx_dir,
+        branch_threads=args.branch_threads,
+        caption_timeout=args.caption_timeout,
+        speech_timeout=args.speech_timeout,
+        profile_sample_rate=args.profile_sample_rate,
+        profile_dir=args.profile_dir,
+        profiler=args.profiler,
+        dedup=args.dedup,
+        dedup_radius_m=args.dedup_radius_m,
+        dedup_max_hash_distance=args.dedup_max_hash_distance,
+        dedup_max_age_seconds=args.dedup_max_age_hours * 3600,
+        caption_skip_threshold=args.caption_skip_threshold,
+        text_classifier_path=args.text_classifier,
+        classifier_min_probability=args.classifier_min_probability,
+        model_dir=args.model_dir,
+        warmup=args.warmup,
+        model_memory_budget_mb=args.model_memory_budget_mb,
+        spatial_index_path=args.spatial_index_path,
+        hotspot_eps_m=args.hotspot_eps_m,
+        hotspot_min_samples=args.hotspot_min_samples,
+        spatial_save_every=args.spatial_save_every
+    )
+    workers = args.workers
+    if args.prefork_workers:
+        # Fork while this process is still single-threaded, before anything else
+        # starts; inference (warm-up included) would start OpenMP pools, so it
+        # happens in the workers
+        service.start(warmup=False)
+        if service.analyzer is not None:
+            service.start_workers(args.prefork_workers, threads_per_worker=args.worker_threads,
+                                  interop_threads=args.worker_interop_threads,
+                                  concurrency=args.worker_concurrency)
+        workers = max(workers, args.prefork_workers * args.worker_concurrency)
+    if args.metrics_port:
+        serve_metrics_http(service, args.metrics_port)
+    transport = JsonLineTransport(service, sys.stdin, protocol_out, workers=workers,
+                                  max_queue_depth=args.max_queue_depth,
+                                  default_deadline_s=args.default_deadline_s)
+
+    def load():
+        if not args.prefork_workers:
+            service.start()
+        transport.write({"event": "ready" if service.state == "ready" else "failed",
+                         "data": service.health()})
+
+    threading.Thread(target=load, daemon=True).start()
+    try:
+        transport.serve_forever()
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
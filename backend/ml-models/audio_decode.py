@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Audio Decoding
+In-memory decoding of browser recordings to 16 kHz mono float32 for Whisper
+
+PCM WAV is parsed directly with the standard library. Everything else
+(WebM/Opus, Ogg, MP3, float WAV, ...) is piped through ffmpeg over
+stdin/stdout, so no temporary files are written.
+"""
+
+import io
+import subprocess
+import wave
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+
+def decode_audio(audio_bytes, sampling_rate=SAMPLE_RATE):
+    """Decode encoded audio bytes into a mono float32 array at sampling_rate"""
+    if audio_bytes[:4] == b"RIFF" and audio_bytes[8:12] == b"WAVE":
+        try:
+            return decode_wav(audio_bytes, sampling_rate)
+        except (wave.Error, ValueError):
+            # Non-PCM WAV (e.g. IEEE float); let ffmpeg handle it
+            pass
+    return decode_with_ffmpeg(audio_bytes, sampling_rate)
+
+
+def decode_wav(audio_bytes, sampling_rate=SAMPLE_RATE):
+    """Decode a PCM WAV payload without touching the filesystem"""
+    with wave.open(io.BytesIO(audio_bytes), "rb") as wav:
+        channels = wav.getnchannels()
+        width = wav.getsampwidth()
+        rate = wav.getframerate()
+        frames = wav.readframes(wav.getnframes())
+
+    if width == 1:
+        audio = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        audio = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768.0
+    elif width == 3:
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3)
+        ints = (raw[:, 0].astype(np.int32) | (raw[:, 1].astype(np.int32) << 8)
+                | (raw[:, 2].astype(np.int32) << 16))
+        ints = np.where(ints >= 1 << 23, ints - (1 << 24), ints)
+        audio = ints.astype(np.float32) / float(1 << 23)
+    elif width == 4:
+        audio = np.frombuffer(frames, dtype="<i4").astype(np.float32) / float(1 << 31)
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {width}")
+
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+    return resample(audio, rate, sampling_rate)
+
+
+def decode_with_ffmpeg(audio_bytes, sampling_rate=SAMPLE_RATE):
+    """Decode any ffmpeg-supported container/codec through pipes"""
+    command = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-i", "pipe:0",
+        "-ac", "1", "-ar", str(sampling_rate),
+        "-f", "f32le", "pipe:1",
+    ]
+    try:
+        process = subprocess.run(command, input=bytes(audio_bytes), capture_output=True, check=False)
+    except FileNotFoundError:
+        raise ValueError("ffmpeg is required to decode non-WAV audio (WebM/Opus, MP3)")
+    if process.returncode != 0:
+        raise ValueError(f"ffmpeg failed to decode audio: {process.stderr.decode(errors='replace').strip()}")
+    audio = np.frombuffer(process.stdout, dtype=np.float32)
+    if audio.size == 0:
+        raise ValueError("Audio payload decoded to zero samples")
+    return audio
+
+
+def resample(audio, source_rate, target_rate=SAMPLE_RATE):
+    """Linear-interpolation resampling; adequate for speech going into Whisper"""
+    audio = np.ascontiguousarray(audio, dtype=np.float32)
+    if source_rate == target_rate or audio.size == 0:
+        return audio
+    duration = audio.size / source_rate
+    target_length = max(1, int(round(duration * target_rate)))
+    source_times = np.arange(audio.size, dtype=np.float64) / source_rate
+    target_times = np.arange(target_length, dtype=np.float64) / target_rate
+    return np.interp(target_times, source_times, audio).astype(np.float32)
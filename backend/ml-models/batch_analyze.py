@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Batch Civic Issue Analysis
+Re-analyzes a backlog of complaints with a pool of worker processes
+
+Input is either a JSONL file (one complaint per line) or a directory of
+*.json files (one complaint per file), using the same fields as
+enhanced_civic_analyzer.py: imageData, text, audioData, location and an
+optional id. Results are streamed to a JSONL file in input order.
+
+Each worker loads the models once. Only a bounded window of complaints is in
+flight at a time, so memory does not grow with the input size. A checkpoint
+next to the output file records progress; --resume continues from it after
+an interruption.
+
+Usage:
+    python batch_analyze.py complaints.jsonl results.jsonl --workers 4
+    python batch_analyze.py complaints.jsonl results.jsonl --resume
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from multiprocessing import get_context
+
+_analyzer = None
+_analyzer_kind = None
+
+
+def _parse_record(raw, where):
+    """Complaint object parsed from raw, or an _error record for malformed input"""
+    try:
+        record = json.loads(raw)
+    except json.JSONDecodeError as e:
+        return {"_error": f"Invalid JSON {where}: {e}"}
+    if not isinstance(record, dict):
+        return {"_error": f"Invalid JSON {where}: complaint must be an object"}
+    return record
+
+
+def iter_complaints(source):
+    """Yield complaint records lazily from a JSONL file or a directory of JSON files"""
+    if os.path.isdir(source):
+        names = sorted(name for name in os.listdir(source) if name.endswith(".json"))
+        for name in names:
+            with open(os.path.join(source, name)) as f:
+                record = _parse_record(f.read(), f"in {name}")
+            record.setdefault("id", os.path.splitext(name)[0])
+            yield record
+        return
+
+    with open(source) as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            yield _parse_record(line, f"on line {line_number}")
+
+
+def _init_worker(kind, analyzer_options):
+    """Load the analyzer once per worker process"""
+    global _analyzer, _analyzer_kind
+
+    # Worker chatter must not interleave with the progress output
+    sys.stdout = sys.stderr
+    _analyzer_kind = kind
+    if kind == "basic":
+        from civic_analyzer import CivicAnalyzer
+        _analyzer = CivicAnalyzer()
+    else:
+        from enhanced_civic_analyzer import EnhancedCivicAnalyzer
+        _analyzer = EnhancedCivicAnalyzer(**analyzer_options)
+
+
+def _analyze(record):
+    if "_error" in record:
+        return {"success": False, "error": record["_error"]}
+    try:
+        if _analyzer_kind == "basic":
+            return _analyzer.analyze_civic_issue(
+                image_path=record.get("imageData") or record.get("image"),
+                text=record.get("text"),
+                audio_path=record.get("audioData") or record.get("audio"),
+                location=record.get("location")
+            )
+        return _analyzer.analyze_civic_issue(
+            image_data=record.get("imageData"),
+            text=record.get("text"),
+            audio_data=record.get("audioData"),
+            location=record.get("location")
+        )
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, state):
+    """Atomically replace the checkpoint file"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def run_batch(source, output, workers=2, kind="enhanced", analyzer_options=None,
+              max_in_flight=None, checkpoint_every=100, resume=False):
+    """Analyze every complaint in source and write ordered results to output"""
+    checkpoint_path = f"{output}.ckpt"
+    processed = 0
+    output_bytes = 0
+
+    if resume:
+        state = load_checkpoint(checkpoint_path)
+        if state:
+            if state.get("source") != os.path.abspath(source):
+                raise ValueError(f"Checkpoint {checkpoint_path} belongs to {state.get('source')}")
+            processed = state["processed"]
+            output_bytes = state["outputBytes"]
+            # Truncating a shorter file would pad it with NULs, not restore the results
+            actual_bytes = os.path.getsize(output) if os.path.exists(output) else None
+            if actual_bytes is None or actual_bytes < output_bytes:
+                raise ValueError(
+                    f"Cannot resume: {output} holds {actual_bytes or 0} bytes but checkpoint "
+                    f"{checkpoint_path} recorded {output_bytes}; delete the checkpoint to start over"
+                )
+            print(f"Resuming after {processed} complaints", file=sys.stderr)
+
+    # Drop anything written after the last checkpoint so no result is duplicated
+    out = open(output, "r+b" if resume and os.path.exists(output) else "wb")
+    out.truncate(output_bytes)
+    out.seek(output_bytes)
+
+    max_in_flight = max_in_flight or workers * 4
+    context = get_context("spawn")
+    pool = context.Pool(workers, initializer=_init_worker, initargs=(kind, analyzer_options or {}))
+
+    started = time.time()
+    window = deque()
+    index = 0
+
+    def write_oldest():
+        nonlocal processed
+        record_index, record_id, pending = window.popleft()
+        line = {"index": record_index, "id": record_id, "result": pending.get()}
+        out.write((json.dumps(line) + "\n").encode("utf-8"))
+        processed += 1
+        if processed % checkpoint_every == 0:
+            out.flush()
+            os.fsync(out.fileno())
+            save_checkpoint(checkpoint_path, {
+                "source": os.path.abspath(source),
+                "processed": processed,
+                "outputBytes": out.tell(),
+            })
+            rate = processed / max(time.time() - started, 1e-9)
+            print(f"{processed} complaints analyzed ({rate:.1f}/s)", file=sys.stderr)
+
+    try:
+        for record in iter_complaints(source):
+            if index < processed:
+                index += 1
+                continue
+            window.append((index, record.get("id"), pool.apply_async(_analyze, (record,))))
+            index += 1
+            # Bounded window: wait for the oldest result before reading further
+            while len(window) >= max_in_flight:
+                write_oldest()
+
+        while window:
+            write_oldest()
+
+        out.flush()
+        os.fsync(out.fileno())
+        save_checkpoint(checkpoint_path, {
+            "source": os.path.abspath(source),
+            "processed": processed,
+            "outputBytes": out.tell(),
+            "complete": True,
+        })
+    finally:
+        out.close()
+        pool.terminate()
+        pool.join()
+
+    return processed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch Civic Issue Analysis")
+    parser.add_argument("source", help="JSONL file or directory of *.json complaints")
+    parser.add_argument("output", help="JSONL file receiving results in input order")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Worker processes, each with its own copy of the models")
+    parser.add_argument("--analyzer", choices=["enhanced", "basic"], default="enhanced",
+                        help="enhanced_civic_analyzer.py or civic_analyzer.py")
+    parser.add_argument("--max-in-flight", type=int,
+                        help="Complaints queued or running at once (default: 4 per worker)")
+    parser.add_argument("--checkpoint-every", type=int, default=100,
+                        help="Write a checkpoint after this many results")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue from the checkpoint next to the output file")
+    args = parser.parse_args()
+
+    total = run_batch(
+        args.source, args.output,
+        workers=args.workers,
+        kind=args.analyzer,
+        max_in_flight=args.max_in_flight,
+        checkpoint_every=args.checkpoint_every,
+        resume=args.resume
+    )
+    print(json.dumps({"success": True, "processed": total, "output": args.output}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,464 @@
+#!/usr/bin/env python3
+"""
+Civic Analyzer Benchmark
+Reproducible latency, throughput and memory benchmark over synthetic
+complaints, with regression checks against a stored baseline
+
+Fixtures are generated up front from a seed: JPEG images at several
+resolutions, voice-like WAV clips of several lengths and a Hinglish
+complaint corpus. Each scenario then runs in its own subprocess so cold
+start and peak RSS are measured independently. With --models tiny the analyzers run on the
+random-weight stand-ins from tiny_models.py, so the suite works offline.
+
+Usage:
+    python benchmark.py --models tiny --output bench.json
+    python benchmark.py --models tiny --baseline bench.json --threshold 0.15
+"""
+
+import argparse
+import base64
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import peak_rss_bytes
+
+SAMPLE_RATE = 16000
+
+# Metrics compared against the baseline and whether larger is better
+REGRESSION_METRICS = {
+    "coldStart.totalSeconds": False,
+    "latency.p50Ms": False,
+    "latency.p95Ms": False,
+    "latency.p99Ms": False,
+    "peakRssMb": False,
+    "throughput.requestsPerSecond": True,
+}
+
+CORPUS_PLACES = ["hamare mohalle mein", "main road par", "school ke paas", "market ke saamne",
+                 "gali number 4 mein", "station road pe", "colony ke gate par", "hospital ke bahar"]
+CORPUS_PROBLEMS = ["bada gaddha hai", "paani leak ho raha hai", "bijli nahi hai", "kooda pada hai",
+                   "nala jam hai", "light kharab hai", "pipe toot gaya hai", "gutter overflow ho raha hai",
+                   "signal band hai", "sadak toot gayi hai", "dustbin bhar gaya hai"]
+CORPUS_DETAILS = ["3 din se", "ek hafte se", "kal raat se", "bahut dino se", ""]
+CORPUS_ASKS = ["jaldi theek karo", "bahut pareshani ho rahi hai", "accident ho sakta hai",
+               "bachche beemar ho rahe hain", "please help", ""]
+
+
+def make_corpus(size, seed=0):
+    """Hinglish complaints assembled from civic templates"""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        parts = [rng.choice(CORPUS_PLACES), rng.choice(CORPUS_DETAILS), rng.choice(CORPUS_PROBLEMS)]
+        if rng.random() < 0.5:
+            parts.append(rng.choice(CORPUS_PROBLEMS))
+        parts.append(rng.choice(CORPUS_ASKS))
+        corpus.append(" ".join(part for part in parts if part))
+    return corpus
+
+
+def make_image(width, height, seed=0):
+    """JPEG data URL with gradients, noise and a few solid shapes"""
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None, None]
+    pixels = np.concatenate(np.broadcast_arrays(x, y, (x + y) / 2), axis=-1)
+    pixels += rng.normal(0, 20, size=pixels.shape).astype(np.float32)
+    image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+    draw = ImageDraw.Draw(image)
+    for _ in range(6):
+        x0, y0 = rng.integers(0, width), rng.integers(0, height)
+        x1, y1 = x0 + rng.integers(width // 10, width // 3), y0 + rng.integers(height // 10, height // 3)
+        draw.ellipse([x0, y0, x1, y1], fill=tuple(int(c) for c in rng.integers(0, 255, 3)))
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def make_audio(seconds, seed=0):
+    """16 kHz WAV data URL of voiced 'syllables' separated by pauses, over background noise"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    n = int(seconds * SAMPLE_RATE)
+    audio = rng.normal(0, 0.003, n).astype(np.float32)
+    position = int(0.3 * SAMPLE_RATE)
+    while position < n:
+        length = int(rng.uniform(0.12, 0.35) * SAMPLE_RATE)
+        t = np.arange(min(length, n - position)) / SAMPLE_RATE
+        pitch = rng.uniform(100, 220)
+        voiced = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+        envelope = np.sin(np.pi * np.arange(t.size) / max(t.size, 1))
+        audio[position:position + t.size] += 0.2 * voiced * envelope
+        position += length + int(rng.choice([0.05, 0.1, 0.2, 0.8]) * SAMPLE_RATE)
+
+    samples = (np.clip(audio, -1, 1) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(samples.tobytes())
+    return "data:audio/wav;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+def percentiles(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def pick(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 3)
+
+    return {
+        "count": len(ordered),
+        "meanMs": round(statistics.mean(ordered) * 1000, 3),
+        "p50Ms": pick(0.50),
+        "p95Ms": pick(0.95),
+        "p99Ms": pick(0.99),
+        "maxMs": round(ordered[-1] * 1000, 3),
+    }
+
+
+def build_requests(scenario, seed, corpus_size):
+    """Request payloads for one scenario, as keyword arguments for the enhanced analyzer"""
+    kind = scenario["kind"]
+    if kind == "text":
+        return [{"text": text} for text in make_corpus(corpus_size, seed)]
+    if kind == "image":
+        width, height = scenario["size"]
+        return [{"image_data": make_image(width, height, seed + i)} for i in range(4)]
+    if kind == "audio":
+        return [{"audio_data": make_audio(scenario["seconds"], seed + i)} for i in range(2)]
+
+    # mixed: what the service sees, mostly text with some photos and voice notes
+    corpus = make_corpus(64, seed)
+    image = make_image(1280, 960, seed)
+    audio = make_audio(8, seed)
+    payloads = ([{"text": text} for text in corpus[:48]]
+                + [{"text": text, "image_data": image} for text in corpus[48:60]]
+                + [{"audio_data": audio} for _ in range(4)])
+    random.Random(seed).shuffle(payloads)
+    return payloads
+
+
+def build_analyzer(kind, models, workdir, model_dir=None, warm_start=False, memory_budget_mb=None):
+    """Analyzer plus a function running one request payload through it"""
+    if kind == "basic":
+        import civic_analyzer
+        analyzer = civic_analyzer.CivicAnalyzer()
+        if models == "tiny":
+            from model_loader import LazyModel
+            from tiny_models import load_tiny_blip, load_tiny_whisper
+            analyzer.blip = LazyModel("BLIP", load_tiny_blip)
+            analyzer.whisper = LazyModel("Whisper", load_tiny_whisper)
+
+        audio_paths = {}
+
+        def run(payload):
+            # civic_analyzer.py takes voice notes as files
+            audio_path = None
+            if payload.get("audio_data"):
+                audio_path = audio_paths.get(payload["audio_data"])
+                if audio_path is None:
+                    audio_path = os.path.join(workdir, f"clip{len(audio_paths)}.wav")
+                    with open(audio_path, "wb") as f:
+                        f.write(base64.b64decode(payload["audio_data"].split(",")[1]))
+                    audio_paths[payload["audio_data"]] = audio_path
+            return analyzer.analyze_civic_issue(image_path=payload.get("image_data"),
+                                                text=payload.get("text"), audio_path=audio_path)
+        return analyzer, run
+
+    from enhanced_civic_analyzer import EnhancedCivicAnalyzer
+    backend = "tiny" if models == "tiny" else "torch"
+    # The caption cache would turn repeated fixtures into cache hits
+    analyzer = EnhancedCivicAnalyzer(caption_cache_size=0, caption_backend=backend, speech_backend=backend,
+                                     model_dir=model_dir, warmup=warm_start,
+                                     model_memory_budget_mb=memory_budget_mb)
+
+    def run(payload):
+        return analyzer.analyze_civic_issue(include_timings=True, **payload)
+    return analyzer, run
+
+
+def run_worker(spec):
+    """Measure one scenario in this (fresh) process"""
+    started = time.perf_counter()
+    if spec["analyzer"] == "basic":
+        import civic_analyzer  # noqa: F401
+    else:
+        import enhanced_civic_analyzer  # noqa: F401
+    import_seconds = time.perf_counter() - started
+
+    with open(spec["fixtures"]) as f:
+        payloads = json.load(f)
+
+    started = time.perf_counter()
+    # Audio files for civic_analyzer.py land next to the fixtures, cleaned up by the parent
+    analyzer, run = build_analyzer(spec["analyzer"], spec["models"], os.path.dirname(spec["fixtures"]),
+                                   model_dir=spec.get("modelDir"), warm_start=spec.get("warmStart"),
+                                   memory_budget_mb=spec.get("modelMemoryBudgetMb"))
+    init_seconds = time.perf_counter() - started
+
+    stage_wall, stage_growth = {}, {}
+
+    def record_stages(result, timed=True):
+        # Peak growth shows how much memory a stage added on top of everything before it
+        for stage, entry in result.get("timings", {}).get("stages", {}).items():
+            if timed:
+                stage_wall.setdefault(stage, []).append(entry["wallMs"] / 1000)
+            if entry.get("peakRssGrowthMb") is not None:
+                stage_growth[stage] = max(stage_growth.get(stage, 0.0), entry["peakRssGrowthMb"])
+
+    started = time.perf_counter()
+    record_stages(run(payloads[0]), timed=False)
+    first_request_seconds = time.perf_counter() - started
+    peak_after_first = peak_rss_bytes() / 2 ** 20
+
+    for i in range(spec["warmup"]):
+        run(payloads[i % len(payloads)])
+
+    latencies = []
+    failures = 0
+    for i in range(spec["requests"]):
+        request_started = time.perf_counter()
+        result = run(payloads[i % len(payloads)])
+        latencies.append(time.perf_counter() - request_started)
+        failures += not result.get("success")
+        record_stages(result)
+
+    throughput = {}
+    for concurrency in spec["concurrency"]:
+        total = max(spec["requests"], concurrency * 8)
+        concurrent_latencies = []
+
+        def timed_run(payload):
+            request_started = time.perf_counter()
+            run(payload)
+            concurrent_latencies.append(time.perf_counter() - request_started)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(timed_run, (payloads[i % len(payloads)] for i in range(total))))
+        elapsed = time.perf_counter() - started
+        throughput[str(concurrency)] = {
+            "requestsPerSecond": round(total / elapsed, 3),
+            "latency": percentiles(concurrent_latencies),
+        }
+
+    return {
+        "coldStart": {
+            "importSeconds": round(import_seconds, 4),
+            "initSeconds": round(init_seconds, 4),
+            "firstRequestSeconds": round(first_request_seconds, 4),
+            "totalSeconds": round(import_seconds + init_seconds + first_request_seconds, 4),
+            "peakRssMb": round(peak_after_first, 1),
+            "models": analyzer.startup_stats() if hasattr(analyzer, "startup_stats") else None,
+        },
+        "latency": percentiles(latencies),
+        "failures": failures,
+        "throughput": throughput,
+        "stages": {
+            stage: dict(percentiles(values), peakRssGrowthMb=stage_growth.get(stage))
+            for stage, values in sorted(stage_wall.items())
+        },
+        "peakRssMb": round(peak_rss_bytes() / 2 ** 20, 1),
+        # Reloads forced by the memory budget show up as loads > 1
+        "models": analyzer.model_stats() if hasattr(analyzer, "model_stats") else None,
+    }
+
+
+def scenarios_from_args(args):
+    scenarios = {"text": {"kind": "text"}}
+    for size in args.image_sizes:
+        width, height = (int(v) for v in size.lower().split("x"))
+        scenarios[f"image-{width}x{height}"] = {"kind": "image", "size": [width, height]}
+    for seconds in args.audio_seconds:
+        scenarios[f"audio-{seconds:g}s"] = {"kind": "audio", "seconds": seconds}
+    scenarios["mixed"] = {"kind": "mixed"}
+    return scenarios
+
+
+def run_scenario(analyzer, name, scenario, fixtures, args):
+    spec = {
+        "analyzer": analyzer,
+        "models": args.models,
+        "fixtures": fixtures,
+        "requests": args.requests,
+        "warmup": args.warmup,
+        "modelDir": args.model_dir,
+        "warmStart": args.warm_start,
+        "modelMemoryBudgetMb": args.model_memory_budget_mb,
+        # Concurrency only matters for the mixed workload
+        "concurrency": args.concurrency if scenario["kind"] == "mixed" else [],
+    }
+    command = [sys.executable, os.path.abspath(__file__), "--worker", json.dumps(spec)]
+    process = subprocess.run(command, capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    if process.returncode != 0:
+        raise RuntimeError(f"{analyzer}/{name} failed: {process.stderr.strip()}")
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def environment():
+    from importlib import metadata
+
+    versions = {}
+    for package in ("torch", "transformers", "numpy", "Pillow", "onnxruntime"):
+        try:
+            versions[package] = metadata.version(package)
+        except metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpuCount": os.cpu_count(),
+        "packages": versions,
+    }
+
+
+def flatten(results):
+    """(analyzer/scenario, metric) -> value for every regression-checked metric"""
+    values = {}
+    for analyzer, scenarios in results.items():
+        for name, result in scenarios.items():
+            for metric in REGRESSION_METRICS:
+                if metric.startswith("throughput."):
+                    for concurrency, entry in result.get("throughput", {}).items():
+                        values[(f"{analyzer}/{name}@{concurrency}", metric)] = entry["requestsPerSecond"]
+                    continue
+                value = result
+                for part in metric.split("."):
+                    value = value.get(part) if isinstance(value, dict) else None
+                if value is not None:
+                    values[(f"{analyzer}/{name}", metric)] = value
+    return values
+
+
+def compare(baseline, current, threshold):
+    """Relative change per metric; a regression is a change for the worse beyond threshold"""
+    base_values = flatten(baseline["results"])
+    regressions, comparisons = [], []
+    for key, value in sorted(flatten(current["results"]).items()):
+        base = base_values.get(key)
+        if not base:
+            continue
+        higher_is_better = REGRESSION_METRICS[key[1]]
+        change = (value - base) / base
+        worse = -change if higher_is_better else change
+        entry = {"scenario": key[0], "metric": key[1], "baseline": base, "current": value,
+                 "change": round(change, 4)}
+        comparisons.append(entry)
+        if worse > threshold:
+            regressions.append(entry)
+    return {"threshold": threshold, "comparisons": comparisons, "regressions": regressions}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Civic Analyzer Benchmark")
+    parser.add_argument("--analyzer", choices=["enhanced", "basic", "both"], default="enhanced",
+                        help="enhanced_civic_analyzer.py, civic_analyzer.py or both")
+    parser.add_argument("--models", choices=["tiny", "real"], default="tiny",
+                        help="tiny: offline random-weight stand-ins; real: BLIP and Whisper")
+    parser.add_argument("--image-sizes", nargs="*", default=["640x480", "1920x1080", "4000x3000"],
+                        help="Image fixture resolutions (WIDTHxHEIGHT)")
+    parser.add_argument("--audio-seconds", nargs="*", type=float, default=[3.0, 12.0, 45.0],
+                        help="Audio fixture durations in seconds")
+    parser.add_argument("--corpus-size", type=int, default=2000,
+                        help="Hinglish complaints in the text corpus")
+    parser.add_argument("--requests", type=int, default=50, help="Timed requests per scenario")
+    parser.add_argument("--warmup", type=int, default=3, help="Untimed requests before measuring")
+    parser.add_argument("--concurrency", nargs="*", type=int, default=[1, 4, 8],
+                        help="Concurrent request levels for the throughput run")
+    parser.add_argument("--model-dir",
+                        help="Pinned local model directory for --models real (see model_loader.py pin)")
+    parser.add_argument("--warm-start", action="store_true",
+                        help="Load and warm up the models during init, as the server's --warmup does")
+    parser.add_argument("--model-memory-budget-mb", type=float, default=None,
+                        help="Run the enhanced analyzer under this model memory budget (see ModelManager)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for every synthetic fixture")
+    parser.add_argument("--scenarios", nargs="*",
+                        help="Only run these scenarios (e.g. text image-640x480 mixed)")
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    parser.add_argument("--baseline", help="Earlier report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Relative change counted as a regression (0.10 = 10%%)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        # Keep stdout clean for the JSON result
+        real_stdout, sys.stdout = sys.stdout, sys.stderr
+        try:
+            result = run_worker(json.loads(args.worker))
+        finally:
+            sys.stdout = real_stdout
+        print(json.dumps(result))
+        return
+
+    analyzers = ["enhanced", "basic"] if args.analyzer == "both" else [args.analyzer]
+    scenarios = scenarios_from_args(args)
+    if args.scenarios:
+        unknown = set(args.scenarios) - set(scenarios)
+        if unknown:
+            parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+        scenarios = {name: scenarios[name] for name in args.scenarios}
+
+    fixture_dir = tempfile.mkdtemp(prefix="civic-bench-fixtures-")
+    fixtures = {}
+    for name, scenario in scenarios.items():
+        fixtures[name] = os.path.join(fixture_dir, f"{name}.json")
+        with open(fixtures[name], "w") as f:
+            json.dump(build_requests(scenario, args.seed, args.corpus_size), f)
+
+    results = {}
+    try:
+        for analyzer in analyzers:
+            results[analyzer] = {}
+            for name, scenario in scenarios.items():
+                print(f"Running {analyzer}/{name}...", file=sys.stderr)
+                results[analyzer][name] = run_scenario(analyzer, name, scenario, fixtures[name], args)
+    finally:
+        shutil.rmtree(fixture_dir, ignore_errors=True)
+
+    report = {
+        "models": args.models,
+        "seed": args.seed,
+        "environment": environment(),
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["comparison"] = compare(json.load(f), report, args.threshold)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+    if report.get("comparison", {}).get("regressions"):
+        for entry in report["comparison"]["regressions"]:
+            print(f"REGRESSION {entry['scenario']} {entry['metric']}: "
+                  f"{entry['baseline']} -> {entry['current']} ({entry['change']:+.1%})", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Caption Batcher
+Groups images from concurrent requests into one BLIP generate call
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class CaptionBatcher:
+    def __init__(self, caption_batch_fn, max_batch_size=8, max_wait_ms=10.0):
+        """
+        caption_batch_fn takes a list of images and returns one caption per image.
+        A batch is dispatched once it holds max_batch_size images or the oldest
+        image has waited max_wait_ms, whichever comes first.
+        """
+        self.caption_batch_fn = caption_batch_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Metrics
+        self.batches = 0
+        self.images = 0
+        self.batch_size_counts = {}
+        self.queue_delays = deque(maxlen=1000)
+        self.max_queue_delay = 0.0
+        self.total_queue_delay = 0.0
+        self.total_generate_seconds = 0.0
+
+        self._worker = threading.Thread(target=self._run, name="caption-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, image):
+        """Queue an image and return a Future resolving to its caption"""
+        if self._closed:
+            raise RuntimeError("CaptionBatcher is closed")
+        future = Future()
+        self._queue.put((time.perf_counter(), image, future))
+        return future
+
+    def caption(self, image, timeout=None):
+        """Caption a single image, blocking until its batch has run"""
+        return self.submit(image).result(timeout=timeout)
+
+    def close(self):
+        """Stop accepting work and let the worker drain the queue"""
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join()
+
+    def _collect(self, first):
+        batch = [first]
+        deadline = first[0] + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                # Past the deadline we still take whatever is already queued
+                if remaining <= 0:
+                    item = self._queue.get_nowait()
+                else:
+                    item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                # Re-queue the shutdown marker for the main loop
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = self._collect(first)
+            self._dispatch(batch)
+
+    def _dispatch(self, batch):
+        started = time.perf_counter()
+        delays = [started - enqueued for enqueued, _, _ in batch]
+        images = [image for _, image, _ in batch]
+
+        try:
+            captions = self.caption_batch_fn(images)
+            if len(captions) != len(batch):
+                raise RuntimeError(f"Expected {len(batch)} captions, got {len(captions)}")
+        except Exception as e:
+            for _, _, future in batch:
+                future.set_exception(e)
+            captions = None
+
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.batches += 1
+            self.images += len(batch)
+            self.batch_size_counts[len(batch)] = self.batch_size_counts.get(len(batch), 0) + 1
+            self.queue_delays.extend(delays)
+            self.total_queue_delay += sum(delays)
+            self.max_queue_delay = max(self.max_queue_delay, max(delays))
+            self.total_generate_seconds += elapsed
+
+        if captions is not None:
+            for (_, _, future), caption in zip(batch, captions):
+                future.set_result(caption)
+
+    def metrics(self):
+        """Batch size and queueing delay statistics for tuning the window"""
+        with self._lock:
+            recent = sorted(self.queue_delays)
+            batches = self.batches
+            images = self.images
+
+            def percentile(p):
+                if not recent:
+                    return None
+                index = min(len(recent) - 1, int(round(p * (len(recent) - 1))))
+                return round(recent[index] * 1000, 3)
+
+            return {
+                "maxBatchSize": self.max_batch_size,
+                "maxWaitMs": self.max_wait * 1000,
+                "batches": batches,
+                "images": images,
+                "meanBatchSize": round(images / batches, 3) if batches else None,
+                "batchSizeCounts": dict(sorted(self.batch_size_counts.items())),
+                "queueDelayMs": {
+                    "mean": round(self.total_queue_delay / images * 1000, 3) if images else None,
+                    "p50": percentile(0.50),
+                    "p95": percentile(0.95),
+                    "max": round(self.max_queue_delay * 1000, 3),
+                },
+                "meanGenerateMs": round(self.total_generate_seconds / batches * 1000, 3) if batches else None,
+                "pending": self._queue.qsize(),
+            }
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Caption Cache
+Content-addressed cache of BLIP captions with an in-memory LRU tier and an
+optional SQLite tier that survives restarts
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+class CaptionCache:
+    def __init__(self, max_entries=256, disk_path=None):
+        """
+        max_entries bounds the in-memory LRU tier. With disk_path set, captions
+        are also written to a SQLite file and looked up there on memory misses.
+        """
+        self.max_entries = max(1, int(max_entries))
+        self.disk_path = disk_path
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.stores = 0
+
+        self._db = None
+        self._inherited_db = None
+        if disk_path:
+            self._db = self._connect()
+
+    def _connect(self):
+        db = sqlite3.connect(self.disk_path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("CREATE TABLE IF NOT EXISTS captions (key TEXT PRIMARY KEY, caption TEXT NOT NULL)")
+        db.commit()
+        return db
+
+    def reopen(self):
+        """
+        Give a forked child its own SQLite connection. The inherited one is
+        kept referenced but unused: closing it in the child could release
+        locks the parent still holds.
+        """
+        self._lock = threading.Lock()
+        if self._db is not None:
+            self._inherited_db = self._db
+            self._db = self._connect()
+
+    @staticmethod
+    def make_key(image_bytes, model_name, params=None):
+        """Hash of the decoded image bytes plus the model and generation params"""
+        digest = hashlib.sha256()
+        digest.update(model_name.encode("utf-8"))
+        digest.update(json.dumps(params or {}, sort_keys=True).encode("utf-8"))
+        digest.update(image_bytes)
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return the cached caption or None"""
+        with self._lock:
+            caption = self._memory.get(key)
+            if caption is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return caption
+
+            if self._db is not None:
+                row = self._db.execute("SELECT caption FROM captions WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self.disk_hits += 1
+                    self._remember(key, row[0])
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, key, caption):
+        """Store a caption in memory and, if configured, on disk"""
+        with self._lock:
+            self.stores += 1
+            self._remember(key, caption)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO captions (key, caption) VALUES (?, ?)", (key, caption)
+                )
+                self._db.commit()
+
+    def _remember(self, key, caption):
+        self._memory[key] = caption
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._memory),
+                "maxEntries": self.max_entries,
+                "diskPath": self.disk_path,
+                "hits": self.hits,
+                "diskHits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "stores": self.stores,
+                "hitRate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else None,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -10,33 +10,60 @@ import argparse
 from pathlib import Path
 from typing import Dict, Any, Optional
 import base64
-import io
-
-# ML Model Imports
-try:
-    from transformers import BlipProcessor, BlipForConditionalGeneration, pipeline
-    from PIL import Image
-    import torch
-except ImportError as e:
-    print(f"Error importing ML libraries: {e}")
-    print("Please install required packages: pip install transformers torch pillow")
-    sys.exit(1)
+
+# ML Model Imports (torch/transformers load lazily on first image or audio input)
+from model_loader import LazyModel, IdleModelReaper, load_blip, load_whisper
+from hinglish_normalizer import HinglishNormalizer
+from image_preprocess import load_image
+
+HINGLISH_REPLACEMENTS = {
+    "paani": "water",
+    "gaddha": "pothole",
+    "sadak": "road",
+    "bijli": "electricity",
+    "light": "streetlight",
+    "kooda": "garbage",
+    "dustbin": "dustbin",
+    "pipe": "pipeline",
+    "leak": "leakage",
+    "nala": "drainage",
+    "gutter": "drainage",
+    "traffic": "traffic",
+    "signal": "traffic signal",
+    # Consumed whole, so "light" and "signal" above do not double them up
+    "street light": "streetlight",
+    "traffic light": "traffic light",
+    "traffic signal": "traffic signal"
+}
 
 class CivicAnalyzer:
-    def __init__(self):
-        """Initialize the ML models"""
-        try:
-            print("Loading BLIP model for image captioning...")
-            self.processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-large")
-            self.model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-large")
-            
-            print("Loading Whisper model for speech-to-text...")
-            self.asr = pipeline("automatic-speech-recognition", model="openai/whisper-small")
-            
-            print("Models loaded successfully!")
-        except Exception as e:
-            print(f"Error loading models: {e}")
-            raise
+    normalizer = HinglishNormalizer(HINGLISH_REPLACEMENTS)
+
+    def __init__(self, idle_ttl=None):
+        """Initialize the ML models; each one is loaded on first use
+
+        idle_ttl (seconds) unloads models that have not been used for that
+        long, as in EnhancedCivicAnalyzer.
+        """
+        self.blip = LazyModel("BLIP", load_blip, idle_ttl=idle_ttl)
+        self.whisper = LazyModel("Whisper", load_whisper, idle_ttl=idle_ttl)
+
+        self.model_reaper = None
+        if idle_ttl:
+            self.model_reaper = IdleModelReaper([self.blip, self.whisper],
+                                                interval=min(30.0, idle_ttl))
+
+    @property
+    def processor(self):
+        return self.blip.get()[0]
+
+    @property
+    def model(self):
+        return self.blip.get()[1]
+
+    @property
+    def asr(self):
+        return self.whisper.get()
 
     def generate_caption(self, image_path: str) -> str:
         """Generate caption from image using BLIP"""
@@ -49,14 +76,15 @@ class CivicAnalyzer:
                 # Remove data URL prefix
                 image_data = image_path.split(',')[1]
                 image_bytes = base64.b64decode(image_data)
-                image = Image.open(io.BytesIO(image_bytes))
+                image = load_image(image_bytes)
             else:
                 # Handle file path
-                image = Image.open(image_path)
+                image = load_image(image_path)
             
-            inputs = self.processor(images=image, return_tensors="pt")
-            out = self.model.generate(**inputs, max_new_tokens=30)
-            caption = self.processor.decode(out[0], skip_special_tokens=True)
+            processor, model = self.blip.get()
+            inputs = processor(images=image, return_tensors="pt")
+            out = model.generate(**inputs, max_new_tokens=30)
+            caption = processor.decode(out[0], skip_special_tokens=True)
             return caption
         except Exception as e:
             print(f"Error generating caption: {e}")
@@ -75,29 +103,7 @@ class CivicAnalyzer:
 
     def normalize_text(self, text: str) -> str:
         """Normalize Hinglish text to English"""
-        if not text:
-            return ""
-        
-        text = text.lower()
-        replacements = {
-            "paani": "water",
-            "gaddha": "pothole", 
-            "sadak": "road",
-            "bijli": "electricity",
-            "light": "streetlight",
-            "kooda": "garbage",
-            "dustbin": "dustbin",
-            "pipe": "pipeline",
-            "leak": "leakage",
-            "nala": "drainage",
-            "gutter": "drainage",
-            "traffic": "traffic",
-            "signal": "traffic signal"
-        }
-        
-        for k, v in replacements.items():
-            text = text.replace(k, v)
-        return text
+        return self.normalizer.normalize(text)
 
     def identify_problem(self, caption: str, text: str) -> str:
         """Identify the civic problem from caption and text"""
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Quantization Comparison
+Runs the fp32 and int8 analyzers over the same images and voice notes and
+reports latency, peak RSS and caption/category agreement
+
+Each mode runs in its own subprocess so peak RSS is measured independently.
+
+Usage:
+    python compare_quantization.py --images a.jpg b.jpg --audio note.wav --output report.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from instrumentation import peak_rss_bytes
+
+
+def run_worker(args):
+    """Measure one mode and return its raw results"""
+    from enhanced_civic_analyzer import EnhancedCivicAnalyzer
+    from image_preprocess import load_image
+
+    analyzer = EnhancedCivicAnalyzer(
+        caption_cache_size=0,
+        quantize=args.worker == "int8",
+        quantized_cache_dir=args.quantized_cache_dir
+    )
+
+    started = time.perf_counter()
+    if args.images:
+        analyzer.blip.get()
+    if args.audio:
+        analyzer.whisper.get()
+    load_seconds = time.perf_counter() - started
+
+    captions, caption_latencies = [], []
+    for path in args.images:
+        image = load_image(path)
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            caption = analyzer.generate_captions([image])[0]
+            caption_latencies.append(time.perf_counter() - started)
+        captions.append(caption)
+
+    transcripts, asr_latencies = [], []
+    for path in args.audio:
+        with open(path, "rb") as f:
+            audio_bytes = f.read()
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            transcript = analyzer.speech_to_text(audio_bytes)
+            asr_latencies.append(time.perf_counter() - started)
+        transcripts.append(transcript)
+
+    categories = [analyzer.identify_problem(caption, "") for caption in captions]
+    categories += [analyzer.identify_problem("", analyzer.normalize_text(t)) for t in transcripts]
+
+    return {
+        "mode": args.worker,
+        "loadSeconds": load_seconds,
+        "captionLatencies": caption_latencies,
+        "asrLatencies": asr_latencies,
+        # VmHWM, as benchmark.py reports it
+        "peakRssMb": round(peak_rss_bytes() / 2 ** 20, 1),
+        "captions": captions,
+        "transcripts": transcripts,
+        "categories": categories,
+    }
+
+
+def token_jaccard(a, b):
+    tokens_a, tokens_b = set(a.lower().split()), set(b.lower().split())
+    if not tokens_a and not tokens_b:
+        return 1.0
+    return len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+
+
+def summarize_latency(values):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return {
+        "meanMs": round(statistics.mean(ordered) * 1000, 2),
+        "p50Ms": round(ordered[len(ordered) // 2] * 1000, 2),
+        "maxMs": round(ordered[-1] * 1000, 2),
+    }
+
+
+def run_mode(mode, args):
+    command = [sys.executable, os.path.abspath(__file__), "--worker", mode, "--runs", str(args.runs)]
+    if args.images:
+        command += ["--images"] + [os.path.abspath(path) for path in args.images]
+    if args.audio:
+        command += ["--audio"] + [os.path.abspath(path) for path in args.audio]
+    if args.quantized_cache_dir:
+        command += ["--quantized-cache-dir", args.quantized_cache_dir]
+
+    process = subprocess.run(command, capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+    if process.returncode != 0:
+        raise RuntimeError(f"{mode} run failed: {process.stderr.strip()}")
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def compare(baseline, candidate):
+    def ratio(a, b):
+        return round(a / b, 3) if a and b else None
+
+    base_caption = summarize_latency(baseline["captionLatencies"])
+    cand_caption = summarize_latency(candidate["captionLatencies"])
+    base_asr = summarize_latency(baseline["asrLatencies"])
+    cand_asr = summarize_latency(candidate["asrLatencies"])
+
+    caption_pairs = list(zip(baseline["captions"], candidate["captions"]))
+    transcript_pairs = list(zip(baseline["transcripts"], candidate["transcripts"]))
+    category_pairs = list(zip(baseline["categories"], candidate["categories"]))
+
+    def mean(values):
+        return round(statistics.mean(values), 4) if values else None
+
+    return {
+        "captionSpeedup": ratio(base_caption and base_caption["meanMs"], cand_caption and cand_caption["meanMs"]),
+        "asrSpeedup": ratio(base_asr and base_asr["meanMs"], cand_asr and cand_asr["meanMs"]),
+        "loadSpeedup": ratio(baseline["loadSeconds"], candidate["loadSeconds"]),
+        "peakRssReductionMb": round(baseline["peakRssMb"] - candidate["peakRssMb"], 1),
+        "captionExactAgreement": mean([float(a == b) for a, b in caption_pairs]),
+        "captionTokenJaccard": mean([token_jaccard(a, b) for a, b in caption_pairs]),
+        "transcriptTokenJaccard": mean([token_jaccard(a, b) for a, b in transcript_pairs]),
+        "categoryAgreement": mean([float(a == b) for a, b in category_pairs]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare fp32 and int8 analyzer models")
+    parser.add_argument("--images", nargs="*", default=[], help="Image files to caption")
+    parser.add_argument("--audio", nargs="*", default=[], help="Audio files to transcribe")
+    parser.add_argument("--runs", type=int, default=3, help="Timed repetitions per input")
+    parser.add_argument("--quantized-cache-dir", help="Where quantized weights are cached")
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    parser.add_argument("--worker", choices=["fp32", "int8"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        # Keep stdout clean for the JSON result
+        real_stdout, sys.stdout = sys.stdout, sys.stderr
+        try:
+            result = run_worker(args)
+        finally:
+            sys.stdout = real_stdout
+        print(json.dumps(result))
+        return
+
+    if not args.images and not args.audio:
+        parser.error("provide --images and/or --audio")
+
+    baseline = run_mode("fp32", args)
+    candidate = run_mode("int8", args)
+
+    report = {}
+    for result in (baseline, candidate):
+        report[result["mode"]] = {
+            "loadSeconds": round(result["loadSeconds"], 3),
+            "caption": summarize_latency(result["captionLatencies"]),
+            "asr": summarize_latency(result["asrLatencies"]),
+            "peakRssMb": round(result["peakRssMb"], 1),
+        }
+    report["comparison"] = compare(baseline, candidate)
+    report["samples"] = [
+        {"fp32": a, "int8": b} for a, b in zip(baseline["captions"], candidate["captions"])
+    ]
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
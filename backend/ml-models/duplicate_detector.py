@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Duplicate Report Detection
+Perceptual image hashes indexed in a geohash grid, so repeat reports of the
+same pothole or garbage heap reuse the earlier analysis instead of running BLIP
+
+A report is a duplicate of an earlier one when both were filed within
+radius_m of each other and both the pHash and dHash of their photos differ
+in at most max_hash_distance of 64 bits. Lookups only scan the report's
+geohash cell and its 8 neighbours.
+"""
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from PIL import Image
+
+from geo_utils import geohash_encode, geohash_neighbors, geohash_precision_for_radius, haversine_m
+
+# Hashes are computed from a small thumbnail, so decoding can stop early
+HASH_DECODE_SIZE = 64
+
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II basis"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    basis = np.cos(np.pi * (2 * i + 1) * k / (2 * n)) * np.sqrt(2.0 / n)
+    basis[0] /= np.sqrt(2.0)
+    return basis.astype(np.float32)
+
+
+_DCT_32 = _dct_matrix(32)
+
+
+def _pack(bits):
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+def image_hashes(image):
+    """(pHash, dHash) of a PIL image as 64-bit integers"""
+    gray = image.convert("L")
+
+    # dHash: is each pixel brighter than its right neighbour, on a 9x8 thumbnail
+    small = np.asarray(gray.resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    dhash = _pack(small[:, 1:] > small[:, :-1])
+
+    # pHash: lowest 8x8 DCT frequencies of a 32x32 thumbnail against their median
+    pixels = np.asarray(gray.resize((32, 32), Image.BILINEAR), dtype=np.float32)
+    low = (_DCT_32 @ pixels @ _DCT_32.T)[:8, :8].ravel()
+    phash = _pack(low > np.median(low[1:]))
+    return phash, dhash
+
+
+def image_bytes_hashes(image_bytes):
+    """(pHash, dHash) straight from encoded image bytes, decoding only a thumbnail"""
+    from image_preprocess import load_image
+    return image_hashes(load_image(image_bytes, target_size=HASH_DECODE_SIZE))
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+class DuplicateIndex:
+    def __init__(self, radius_m=50.0, max_hash_distance=10, max_age_seconds=7 * 86400,
+                 max_entries=100000):
+        """
+        In-memory index of recent reports. Entries older than max_age_seconds
+        stop matching and are dropped, as are the oldest entries beyond
+        max_entries.
+        """
+        self.radius_m = radius_m
+        self.max_hash_distance = max_hash_distance
+        self.max_age_seconds = max_age_seconds
+        self.max_entries = max_entries
+        self.precision = geohash_precision_for_radius(radius_m)
+        self._cells = {}
+        self._order = deque()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+
+    def _expire(self, now):
+        while self._order and (len(self._order) > self.max_entries
+                               or now - self._order[0]["added"] > self.max_age_seconds):
+            entry = self._order.popleft()
+            cell = self._cells.get(entry["cell"])
+            if cell is not None:
+                cell[:] = [other for other in cell if other is not entry]
+                if not cell:
+                    del self._cells[entry["cell"]]
+
+    def find(self, phash, dhash, lat, lon, now=None):
+        """Closest earlier report matching in place and picture, or None"""
+        now = time.time() if now is None else now
+        best = None
+        with self._lock:
+            self._expire(now)
+            self.lookups += 1
+            for cell in geohash_neighbors(geohash_encode(lat, lon, self.precision)):
+                for entry in self._cells.get(cell, ()):
+                    phash_distance = hamming(phash, entry["phash"])
+                    if phash_distance > self.max_hash_distance:
+                        continue
+                    dhash_distance = hamming(dhash, entry["dhash"])
+                    if dhash_distance > self.max_hash_distance:
+                        continue
+                    meters = haversine_m(lat, lon, entry["lat"], entry["lon"])
+                    if meters > self.radius_m:
+                        continue
+                    score = (phash_distance + dhash_distance, meters)
+                    if best is None or score < best[0]:
+                        best = (score, entry, phash_distance, dhash_distance, meters)
+            if best is None:
+                return None
+            self.hits += 1
+
+        _, entry, phash_distance, dhash_distance, meters = best
+        return {
+            "reportId": entry["reportId"],
+            "distanceMeters": round(meters, 1),
+            "hashDistance": {"phash": phash_distance, "dhash": dhash_distance},
+            "reportedAt": entry["added"],
+            "analysis": entry["analysis"],
+        }
+
+    def add(self, report_id, phash, dhash, lat, lon, analysis=None, now=None):
+        """Index a report so later reports can match it"""
+        now = time.time() if now is None else now
+        cell = geohash_encode(lat, lon, self.precision)
+        entry = {"reportId": report_id, "phash": phash, "dhash": dhash, "lat": lat, "lon": lon,
+                 "cell": cell, "added": now, "analysis": analysis}
+        with self._lock:
+            self._cells.setdefault(cell, []).append(entry)
+            self._order.append(entry)
+            self._expire(now)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._order),
+                "cells": len(self._cells),
+                "geohashPrecision": self.precision,
+                "radiusMeters": self.radius_m,
+                "maxHashDistance": self.max_hash_distance,
+                "lookups": self.lookups,
+                "hits": self.hits,
+            }
@@ -6,237 +6,557 @@ Based on sih2k25.ipynb with improvements for production use
 
 import json
 import base64
+import concurrent.futures
+import contextvars
 import io
 import sys
-import os
+import time
+import uuid
 from PIL import Image
-import torch
-from transformers import BlipProcessor, BlipForConditionalGeneration, pipeline
-import re
+
+# torch/transformers are imported lazily by model_loader, so text-only
+# complaints never pay for loading the ML stack
+from model_loader import LazyModel, IdleModelReaper, ModelManager, BLIP_MODEL_NAME
+from inference_backends import caption_backend_loader, speech_backend_loader
+from keyword_matcher import KeywordMatcher
+from hinglish_normalizer import HinglishNormalizer
+from image_preprocess import load_image
+from instrumentation import METRICS, RequestTrace, profile_thread
+
+# Enhanced Hinglish to English mappings
+HINGLISH_REPLACEMENTS = {
+    "paani": "water",
+    "gaddha": "pothole",
+    "sadak": "road",
+    "bijli": "electricity",
+    "light": "streetlight",
+    "kooda": "garbage",
+    "dustbin": "dustbin",
+    "pipe": "pipeline",
+    "leak": "leakage",
+    "nala": "drainage",
+    "gutter": "drainage",
+    "traffic": "traffic",
+    "signal": "traffic signal",
+    "rasta": "road",
+    "sarak": "road",
+    "pani": "water",
+    "jal": "water",
+    "tap": "water tap",
+    "nal": "water tap",
+    "toilet": "toilet",
+    "shouchalaya": "toilet",
+    "bathroom": "toilet",
+    "street": "street",
+    "gali": "street",
+    "marg": "street",
+    "bridge": "bridge",
+    "pul": "bridge",
+    "park": "park",
+    "bagicha": "park",
+    "garden": "park",
+    "hospital": "hospital",
+    "aspatal": "hospital",
+    "school": "school",
+    "vidyalaya": "school",
+    "college": "college",
+    "university": "university",
+    "market": "market",
+    "bazaar": "market",
+    "shop": "shop",
+    "dukaan": "shop",
+    "bus": "bus",
+    "train": "train",
+    "station": "station",
+    "stop": "bus stop",
+    "bulb": "light bulb",
+    "fan": "fan",
+    "ac": "air conditioning",
+    "cooler": "air cooler",
+    "heater": "heater",
+    "gas": "gas",
+    "petrol": "petrol",
+    "diesel": "diesel",
+    "fuel": "fuel",
+    "fire": "fire",
+    "aag": "fire",
+    "smoke": "smoke",
+    "dhuan": "smoke",
+    "noise": "noise",
+    "shor": "noise",
+    "pollution": "pollution",
+    "pradushan": "pollution",
+    "dirty": "dirty",
+    "ganda": "dirty",
+    "clean": "clean",
+    "saf": "clean",
+    "broken": "broken",
+    "tuta": "broken",
+    "damaged": "damaged",
+    "kharab": "damaged",
+    "fixed": "fixed",
+    "theek": "fixed",
+    "urgent": "urgent",
+    "jaldi": "urgent",
+    "important": "important",
+    "mahatvapurn": "important",
+    "problem": "problem",
+    "samasya": "problem",
+    "issue": "issue",
+    "complaint": "complaint",
+    "shikayat": "complaint",
+    "help": "help",
+    "madad": "help",
+    "support": "support",
+    "sahayata": "support",
+    # Phrases are consumed whole, so the single-word entries above do not
+    # double them up ("street light" would become "street streetlight")
+    "street light": "streetlight",
+    "traffic light": "traffic light",
+    "signal light": "traffic signal",
+    "traffic signal": "traffic signal",
+    "bus stop": "bus stop",
+    "water tap": "water tap",
+    "light bulb": "light bulb",
+    "air cooler": "air cooler"
+}
+
+# Enhanced problem detection patterns
+PROBLEM_KEYWORDS = {
+    "Pothole / Road Damage": [
+        "pothole", "road damage", "road broken", "road crack", "road hole",
+        "sadak", "rasta", "sarak", "gaddha", "hole", "crack", "damage"
+    ],
+    "Streetlight / Electrical Issue": [
+        "streetlight", "street light", "light", "bulb", "electricity", "electrical",
+        "power", "bijli", "light broken", "light not working", "dark", "andhera"
+    ],
+    "Water Leakage / Pipeline Issue": [
+        "water", "leak", "leakage", "pipeline", "pipe", "tap", "nal", "pani", "jal",
+        "water supply", "water problem", "no water", "water pressure"
+    ],
+    "Garbage / Sanitation Issue": [
+        "garbage", "trash", "waste", "dustbin", "kooda", "sanitation", "clean",
+        "dirty", "ganda", "saf", "hygiene", "toilet", "shouchalaya"
+    ],
+    "Drainage Issue": [
+        "drainage", "drain", "nala", "gutter", "sewer", "water logging",
+        "flood", "water accumulation", "blocked drain"
+    ],
+    "Traffic / Signal Issue": [
+        "traffic", "signal", "traffic signal", "road safety", "accident",
+        "congestion", "jam", "traffic light", "signal not working"
+    ],
+    "Park / Public Space Issue": [
+        "park", "garden", "public space", "playground", "bagicha",
+        "recreation", "benches", "trees", "plants"
+    ],
+    "Public Transport Issue": [
+        "bus", "train", "transport", "public transport", "station", "stop",
+        "bus stop", "metro", "auto", "rickshaw"
+    ]
+}
+
+# High priority keywords
+HIGH_PRIORITY_KEYWORDS = [
+    "urgent", "emergency", "dangerous", "hazardous", "critical", "serious",
+    "jaldi", "danger", "risk", "accident", "injury", "fire",
+    "electrical", "water", "gas", "leak", "leakage", "broken", "falling"
+]
+
+# Captions that stand in for a missing image analysis
+PLACEHOLDER_CAPTIONS = ("No image provided", "Image analysis failed", "Image analysis timed out",
+                        "Image analysis skipped")
 
 class EnhancedCivicAnalyzer:
-    def __init__(self):
-        """Initialize the AI models"""
-        try:
-            # Load BLIP for Image Captioning
-            self.processor = BlipProcessor.from_pretrained("Salesforce/blip-image-captioning-large")
-            self.model = BlipForConditionalGeneration.from_pretrained("Salesforce/blip-image-captioning-large")
-            
-            # Load Whisper for Speech-to-Text
-            self.asr = pipeline("automatic-speech-recognition", model="openai/whisper-small")
-            
-            print("✅ AI Models loaded successfully")
-        except Exception as e:
-            print(f"❌ Error loading AI models: {e}")
-            raise
+    # Compiled once at class load and shared by every instance
+    keyword_matcher = KeywordMatcher(PROBLEM_KEYWORDS, HIGH_PRIORITY_KEYWORDS)
+    normalizer = HinglishNormalizer(HINGLISH_REPLACEMENTS)
+
+    caption_max_new_tokens = 50
+
+    def __init__(self, caption_batch_size=1, caption_batch_wait_ms=10.0,
+                 idle_ttl=None, preload=False,
+                 caption_cache_size=256, caption_cache_path=None,
+                 asr_chunk_seconds=30.0, asr_chunk_overlap_seconds=5.0, asr_batch_size=4,
+                 vad_enabled=True, quantize=False, quantized_cache_dir=None,
+                 caption_backend="torch", speech_backend="torch", onnx_dir=None,
+                 branch_threads=None, caption_timeout=None, speech_timeout=None,
+                 dedup=False, dedup_radius_m=50.0, dedup_max_hash_distance=10,
+                 dedup_max_age_seconds=7 * 86400, caption_skip_threshold=None,
+                 text_classifier_path=None, classifier_min_probability=0.5,
+                 model_dir=None, warmup=False, model_memory_budget_mb=None):
+        """Initialize the AI models
+
+        Models load on first use. caption_batch_size > 1 enables micro-batching
+        of BLIP captioning across concurrent callers (see caption_batcher.py);
+        idle_ttl (seconds) unloads models that have not been used for that long.
+        Captions are cached by image content (caption_cache_size entries in
+        memory, plus a SQLite file at caption_cache_path if given).
+        Voice notes longer than asr_chunk_seconds are transcribed as overlapping
+        chunks, asr_batch_size chunks per Whisper forward pass. With vad_enabled,
+        silence is trimmed from decoded audio before it reaches Whisper.
+        quantize=True runs both models with int8 dynamic quantization on CPU
+        (see quantization.py), caching the quantized weights in
+        quantized_cache_dir. caption_backend / speech_backend pick the runtime
+        for each stage, "torch", "onnx" or "tiny" (see inference_backends.py).
+        The image and audio branches of a request run concurrently, each with
+        branch_threads torch intra-op threads; a branch that exceeds
+        caption_timeout / speech_timeout (seconds) is left out of the result
+        and reported in degradedStages. With dedup, a photo matching an earlier
+        report within dedup_radius_m (see duplicate_detector.py) reuses that
+        report's analysis and is marked with duplicateOf. With
+        caption_skip_threshold set, typed complaint text is classified first
+        and the image is only captioned when the text's confidence score is
+        below the threshold or its top categories conflict. text_classifier_path
+        loads a trained model (see text_classifier.py) whose calibrated
+        probabilities pick the category and drive the confidence score; the
+        keyword rules decide when its top probability is below
+        classifier_min_probability or no model is given. model_dir loads the
+        torch models from a pinned local directory (see model_loader.py) with
+        no hub lookups. warmup loads both models and runs a tiny inference
+        through each before returning, so the first request does not pay for
+        lazy initialisation; startup_stats() breaks the time down.
+        model_memory_budget_mb caps the resident size of the loaded models:
+        the least recently used one is unloaded to make room for another, and
+        freed memory is returned to the OS after each request (see
+        ModelManager in model_loader.py).
+        """
+        self.branch_threads = branch_threads
+        self.caption_skip_threshold = caption_skip_threshold
+        self.caption_timeout = caption_timeout
+        self.speech_timeout = speech_timeout
+        self.branch_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=8, thread_name_prefix="analyzer-branch"
+        )
+        self.vad_enabled = vad_enabled
+        self.asr_chunk_seconds = asr_chunk_seconds
+        self.asr_chunk_overlap_seconds = asr_chunk_overlap_seconds
+        self.asr_batch_size = asr_batch_size
+
+        # BLIP for Image Captioning, Whisper for Speech-to-Text
+        self.quantize = quantize
+        self.caption_model_id = f"{BLIP_MODEL_NAME}:{caption_backend}" + (":int8" if quantize else "")
+        self.startup = {"blip": {}, "whisper": {}}
+        blip_loader = caption_backend_loader(caption_backend, quantize=quantize,
+                                             quantized_cache_dir=quantized_cache_dir, onnx_dir=onnx_dir,
+                                             model_dir=model_dir, timings=self.startup["blip"])
+        whisper_loader = speech_backend_loader(speech_backend, quantize=quantize,
+                                               quantized_cache_dir=quantized_cache_dir, onnx_dir=onnx_dir,
+                                               model_dir=model_dir, timings=self.startup["whisper"])
+        self.blip = LazyModel("BLIP", blip_loader, idle_ttl=idle_ttl)
+        self.whisper = LazyModel("Whisper", whisper_loader, idle_ttl=idle_ttl)
+
+        self.model_reaper = None
+        if idle_ttl:
+            self.model_reaper = IdleModelReaper([self.blip, self.whisper],
+                                                interval=min(30.0, idle_ttl))
+        self.model_manager = ModelManager(
+            [self.blip, self.whisper],
+            budget_bytes=int(model_memory_budget_mb * 2 ** 20) if model_memory_budget_mb else None
+        )
+
+        if preload:
+            try:
+                self.blip.get()
+                self.whisper.get()
+                print("✅ AI Models loaded successfully")
+            except Exception as e:
+                print(f"❌ Error loading AI models: {e}")
+                raise
+        if warmup:
+            self.warm_up()
+
+        self.caption_batcher = None
+        if caption_batch_size > 1:
+            from caption_batcher import CaptionBatcher
+            self.caption_batcher = CaptionBatcher(
+                self.generate_captions,
+                max_batch_size=caption_batch_size,
+                max_wait_ms=caption_batch_wait_ms
+            )
+
+        self.caption_cache = None
+        if caption_cache_size or caption_cache_path:
+            from caption_cache import CaptionCache
+            self.caption_cache = CaptionCache(
+                max_entries=caption_cache_size or 1,
+                disk_path=caption_cache_path
+            )
+
+        self.text_classifier = None
+        self.classifier_min_probability = classifier_min_probability
+        if text_classifier_path:
+            from text_classifier import TextClassifier
+            self.text_classifier = TextClassifier.load(text_classifier_path)
+            print(f"✅ Text classifier loaded ({len(self.text_classifier.labels)} categories)")
+
+        self.duplicate_index = None
+        if dedup:
+            from duplicate_detector import DuplicateIndex
+            self.duplicate_index = DuplicateIndex(
+                radius_m=dedup_radius_m,
+                max_hash_distance=dedup_max_hash_distance,
+                max_age_seconds=dedup_max_age_seconds
+            )
+
+    @property
+    def caption_backend(self):
+        return self.blip.get()
+
+    @property
+    def speech_backend(self):
+        return self.whisper.get()
+
+    def model_stats(self):
+        """Load state of each lazily loaded model"""
+        return {"blip": self.blip.stats(), "whisper": self.whisper.stats()}
+
+    def warm_up(self):
+        """
+        Load both models and push a blank image and half a second of silence
+        through them, paying one-off costs (allocator pools, kernel selection,
+        tokenizer caches) before the first real request
+        """
+        import numpy as np
+
+        started = time.perf_counter()
+        self.caption_backend.caption([Image.new("RGB", (64, 64))], max_new_tokens=2)
+        self.startup["blip"]["warmupSeconds"] = round(time.perf_counter() - started, 4)
+
+        started = time.perf_counter()
+        self.speech_backend.transcribe(np.zeros(8000, dtype=np.float32), 16000)
+        self.startup["whisper"]["warmupSeconds"] = round(time.perf_counter() - started, 4)
+        print("✅ AI Models warmed up")
+
+    def startup_stats(self):
+        """Import, weight load and warm-up seconds per model"""
+        stats = {}
+        for name, lazy in (("blip", self.blip), ("whisper", self.whisper)):
+            stats[name] = dict(self.startup[name])
+            if lazy.load_seconds is not None:
+                stats[name]["loadSeconds"] = round(lazy.load_seconds, 4)
+        return stats
+
+    def after_fork(self):
+        """
+        Rebuild what a forked child cannot inherit: threads (the branch pool,
+        the caption batcher's worker) and the caption cache's SQLite handle.
+        Model weights are kept, shared with the parent copy-on-write.
+        """
+        self.branch_pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=8, thread_name_prefix="analyzer-branch"
+        )
+        if self.caption_batcher is not None:
+            from caption_batcher import CaptionBatcher
+            self.caption_batcher = CaptionBatcher(
+                self.generate_captions,
+                max_batch_size=self.caption_batcher.max_batch_size,
+                max_wait_ms=self.caption_batcher.max_wait * 1000.0
+            )
+        if self.caption_cache is not None:
+            self.caption_cache.reopen()
+
+    def decode_base64_image(self, base64_string):
+        """Convert base64 string (optionally a data URL) to raw image bytes"""
+        # Framed input already delivers raw bytes
+        if isinstance(base64_string, (bytes, bytearray, memoryview)):
+            return base64_string
+
+        # Remove data URL prefix if present
+        if base64_string.startswith('data:image'):
+            base64_string = base64_string.split(',')[1]
+        
+        return base64.b64decode(base64_string)
 
     def base64_to_image(self, base64_string):
         """Convert base64 string to PIL Image"""
         try:
-            # Remove data URL prefix if present
-            if base64_string.startswith('data:image'):
-                base64_string = base64_string.split(',')[1]
-            
-            # Decode base64
-            image_data = base64.b64decode(base64_string)
+            image_data = self.decode_base64_image(base64_string)
             image = Image.open(io.BytesIO(image_data))
             return image
         except Exception as e:
             print(f"Error converting base64 to image: {e}")
             return None
 
+    def caption_image_data(self, image_data, trace=None):
+        """Caption a base64 image, reusing the cached caption for identical bytes"""
+        trace = trace or RequestTrace()
+        try:
+            with trace.stage("base64Decode"):
+                image_bytes = self.decode_base64_image(image_data)
+        except Exception as e:
+            print(f"Error converting base64 to image: {e}")
+            return "No image provided"
+        
+        cache_key = None
+        if self.caption_cache is not None:
+            cache_key = self.caption_cache.make_key(
+                image_bytes, self.caption_model_id, {"max_new_tokens": self.caption_max_new_tokens}
+            )
+            with trace.stage("captionCacheLookup") as details:
+                caption = self.caption_cache.get(cache_key)
+                details["hit"] = caption is not None
+            if caption is not None:
+                return caption
+        
+        try:
+            # Reduced-size decode straight to the BLIP input resolution
+            with trace.stage("imageDecode") as details:
+                image = load_image(image_bytes, timings=details)
+        except Exception as e:
+            print(f"Error converting base64 to image: {e}")
+            return "No image provided"
+        
+        with trace.stage("caption"):
+            caption = self.generate_caption(image)
+        if cache_key is not None and caption not in ("No image provided", "Image analysis failed"):
+            self.caption_cache.put(cache_key, caption)
+        return caption
+
     def generate_caption(self, image):
         """Generate caption from image using BLIP"""
         try:
             if image is None:
                 return "No image provided"
             
-            inputs = self.processor(images=image, return_tensors="pt")
-            out = self.model.generate(**inputs, max_new_tokens=50)
-            caption = self.processor.decode(out[0], skip_special_tokens=True)
-            return caption
+            if self.caption_batcher is not None:
+                return self.caption_batcher.caption(image)
+            
+            return self.generate_captions([image])[0]
         except Exception as e:
             print(f"Error generating caption: {e}")
             return "Image analysis failed"
 
-    def speech_to_text(self, audio_data):
-        """Convert speech to text using Whisper"""
+    def generate_captions(self, images):
+        """Generate captions for a batch of images with one generate call"""
+        return self.caption_backend.caption(images, max_new_tokens=self.caption_max_new_tokens)
+
+    def speech_to_text(self, audio_data, on_partial=None, audio_stats=None, trace=None):
+        """Convert speech to text using Whisper
+
+        on_partial(chunk_index, total_chunks, chunk_text, transcript_so_far) is
+        called as chunks of a long recording finish; audio_stats, if given, is
+        filled with the voice activity trimming statistics
+        """
+        trace = trace or RequestTrace()
         try:
             if not audio_data:
                 return ""
             
-            # Handle base64 audio data
-            if isinstance(audio_data, str) and audio_data.startswith('data:audio'):
-                audio_data = audio_data.split(',')[1]
-                audio_bytes = base64.b64decode(audio_data)
-                # Save temporarily and process
-                with open("temp_audio.wav", "wb") as f:
-                    f.write(audio_bytes)
-                text = self.asr("temp_audio.wav")["text"]
-                os.remove("temp_audio.wav")
-                return text
+            # Handle base64 audio data (or raw bytes) entirely in memory
+            is_data_url = isinstance(audio_data, str) and audio_data.startswith('data:audio')
+            if is_data_url or isinstance(audio_data, (bytes, bytearray, memoryview)):
+                with trace.stage("audioDecode"):
+                    audio = self.decode_audio_data(audio_data)
+                if self.vad_enabled:
+                    from audio_decode import SAMPLE_RATE
+                    from vad import trim_silence
+                    with trace.stage("vad"):
+                        audio, vad_stats = trim_silence(audio, SAMPLE_RATE)
+                    if audio_stats is not None:
+                        audio_stats.update(vad_stats)
+                if len(audio) == 0:
+                    # Nothing but silence; Whisper would only hallucinate here
+                    return ""
+                with trace.stage("asr"):
+                    return self.transcribe(audio, on_partial=on_partial)
             else:
-                text = self.asr(audio_data)["text"]
-                return text
+                with trace.stage("asr"):
+                    return self.speech_backend.transcribe(audio_data)
         except Exception as e:
             print(f"Error in speech to text: {e}")
             return ""
 
-    def normalize_text(self, text):
-        """Normalize Hinglish text to English"""
-        if not text:
-            return ""
-        
-        text = text.lower()
+    def decode_audio_data(self, audio_data):
+        """Decode a base64 data URL or raw bytes (WAV, WebM/Opus, MP3) to 16 kHz float32"""
+        from audio_decode import decode_audio
         
-        # Enhanced Hinglish to English mappings
-        replacements = {
-            "paani": "water",
-            "gaddha": "pothole",
-            "sadak": "road",
-            "bijli": "electricity",
-            "light": "streetlight",
-            "kooda": "garbage",
-            "dustbin": "dustbin",
-            "pipe": "pipeline",
-            "leak": "leakage",
-            "nala": "drainage",
-            "gutter": "drainage",
-            "traffic": "traffic",
-            "signal": "traffic signal",
-            "sadak": "road",
-            "rasta": "road",
-            "sarak": "road",
-            "pani": "water",
-            "jal": "water",
-            "tap": "water tap",
-            "nal": "water tap",
-            "toilet": "toilet",
-            "shouchalaya": "toilet",
-            "bathroom": "toilet",
-            "street": "street",
-            "gali": "street",
-            "marg": "street",
-            "bridge": "bridge",
-            "pul": "bridge",
-            "park": "park",
-            "bagicha": "park",
-            "garden": "park",
-            "hospital": "hospital",
-            "aspatal": "hospital",
-            "school": "school",
-            "vidyalaya": "school",
-            "college": "college",
-            "university": "university",
-            "market": "market",
-            "bazaar": "market",
-            "shop": "shop",
-            "dukaan": "shop",
-            "bus": "bus",
-            "train": "train",
-            "station": "station",
-            "stop": "bus stop",
-            "signal": "traffic signal",
-            "light": "streetlight",
-            "bulb": "light bulb",
-            "fan": "fan",
-            "ac": "air conditioning",
-            "cooler": "air cooler",
-            "heater": "heater",
-            "gas": "gas",
-            "petrol": "petrol",
-            "diesel": "diesel",
-            "fuel": "fuel",
-            "fire": "fire",
-            "aag": "fire",
-            "smoke": "smoke",
-            "dhuan": "smoke",
-            "noise": "noise",
-            "shor": "noise",
-            "pollution": "pollution",
-            "pradushan": "pollution",
-            "dirty": "dirty",
-            "ganda": "dirty",
-            "clean": "clean",
-            "saf": "clean",
-            "broken": "broken",
-            "tuta": "broken",
-            "damaged": "damaged",
-            "kharab": "damaged",
-            "fixed": "fixed",
-            "theek": "fixed",
-            "urgent": "urgent",
-            "jaldi": "urgent",
-            "important": "important",
-            "mahatvapurn": "important",
-            "problem": "problem",
-            "samasya": "problem",
-            "issue": "issue",
-            "complaint": "complaint",
-            "shikayat": "complaint",
-            "help": "help",
-            "madad": "help",
-            "support": "support",
-            "sahayata": "support"
-        }
+        if isinstance(audio_data, str):
+            audio_data = base64.b64decode(audio_data.split(',')[1])
+        return decode_audio(audio_data)
+
+    def transcribe(self, audio, on_partial=None):
+        """Run Whisper on 16 kHz mono float32 samples"""
+        from audio_decode import SAMPLE_RATE
         
-        for hindi, english in replacements.items():
-            text = text.replace(hindi, english)
+        speech = self.speech_backend
+        if len(audio) <= self.asr_chunk_seconds * SAMPLE_RATE:
+            return speech.transcribe(audio, SAMPLE_RATE)
         
-        return text
+        # Long voice note: overlapping chunks, batched through Whisper
+        from long_audio import transcribe_long
+        return transcribe_long(
+            speech.transcribe_batch, audio, SAMPLE_RATE,
+            chunk_s=self.asr_chunk_seconds,
+            overlap_s=self.asr_chunk_overlap_seconds,
+            batch_size=self.asr_batch_size,
+            on_partial=on_partial
+        )
 
-    def identify_problem(self, caption, text):
-        """Enhanced problem identification"""
+    def normalize_text(self, text):
+        """Normalize Hinglish text to English"""
+        return self.normalizer.normalize(text)
+
+    def keyword_hits(self, caption, text):
+        """Per-category and priority keyword hit counts in one pass"""
         combined = (caption + " " + text).lower()
-        
-        # Enhanced problem detection patterns
-        problems = {
-            "Pothole / Road Damage": [
-                "pothole", "road damage", "road broken", "road crack", "road hole",
-                "sadak", "rasta", "sarak", "gaddha", "hole", "crack", "damage"
-            ],
-            "Streetlight / Electrical Issue": [
-                "streetlight", "street light", "light", "bulb", "electricity", "electrical",
-                "power", "bijli", "light broken", "light not working", "dark", "andhera"
-            ],
-            "Water Leakage / Pipeline Issue": [
-                "water", "leak", "leakage", "pipeline", "pipe", "tap", "nal", "pani", "jal",
-                "water supply", "water problem", "no water", "water pressure"
-            ],
-            "Garbage / Sanitation Issue": [
-                "garbage", "trash", "waste", "dustbin", "kooda", "sanitation", "clean",
-                "dirty", "ganda", "saf", "hygiene", "toilet", "shouchalaya"
-            ],
-            "Drainage Issue": [
-                "drainage", "drain", "nala", "gutter", "sewer", "water logging",
-                "flood", "water accumulation", "blocked drain"
-            ],
-            "Traffic / Signal Issue": [
-                "traffic", "signal", "traffic signal", "road safety", "accident",
-                "congestion", "jam", "traffic light", "signal not working"
-            ],
-            "Park / Public Space Issue": [
-                "park", "garden", "public space", "playground", "bagicha",
-                "recreation", "benches", "trees", "plants"
-            ],
-            "Public Transport Issue": [
-                "bus", "train", "transport", "public transport", "station", "stop",
-                "bus stop", "metro", "auto", "rickshaw"
-            ]
-        }
-        
-        # Count matches for each problem type
-        problem_scores = {}
-        for problem, keywords in problems.items():
-            score = sum(1 for keyword in keywords if keyword in combined)
-            if score > 0:
-                problem_scores[problem] = score
+        return self.keyword_matcher.scan(combined)
+
+    def category_probabilities(self, caption, text):
+        """Classifier probabilities per problem, or None without a text classifier"""
+        return self.category_probabilities_many([caption], [text])[0]
+
+    def category_probabilities_many(self, captions, texts):
+        """Batched category_probabilities: one sparse predict for the whole batch"""
+        if self.text_classifier is None:
+            return [None] * len(texts)
+        from text_classifier import join_fields
+        documents = [
+            join_fields(None if caption in PLACEHOLDER_CAPTIONS else caption, text)
+            for caption, text in zip(captions, texts)
+        ]
+        return self.text_classifier.classify_many(documents)
+
+    def identify_problem(self, caption, text, hits=None, probabilities=None):
+        """Enhanced problem identification"""
+        if probabilities:
+            problem, probability = max(probabilities.items(), key=lambda item: item[1])
+            if probability >= self.classifier_min_probability:
+                return problem
+
+        if hits is None:
+            hits = self.keyword_hits(caption, text)
         
         # Return the problem with highest score, or default
-        if problem_scores:
-            return max(problem_scores, key=problem_scores.get)
-        else:
-            return "Other Civic Issue"
+        return KeywordMatcher.best(hits["categories"], default="Other Civic Issue")
+
+    def classification_confidence(self, hits, probabilities=None):
+        """
+        (score, conflict) for a classification. With classifier probabilities
+        the score is the top probability. For keyword hits it grows with the
+        winning category's hit count (1 hit: 0.5, 2: 0.75, 3: 0.875, ...) and
+        shrinks with the runner-up's share. Either way, categories conflict when
+        the runner-up scores at least half as much as the winner.
+        """
+        if probabilities:
+            top, second = (sorted(probabilities.values(), reverse=True) + [0.0, 0.0])[:2]
+            return round(top, 4), second * 2 >= top
+
+        counts = sorted(hits["categories"].values(), reverse=True) + [0, 0]
+        top, second = counts[0], counts[1]
+        if not top:
+            return 0.0, False
+        score = (1.0 - 0.5 ** top) * (top - second) / top
+        return round(score, 4), second > 0 and second * 2 >= top
+
+    def confidence_label(self, score):
+        """aiConfidence label for a confidence score"""
+        if score >= 0.75:
+            return "high"
+        if score >= 0.4:
+            return "medium"
+        return "low"
 
     def map_department(self, problem):
         """Map problem to responsible department"""
@@ -253,19 +573,13 @@ class EnhancedCivicAnalyzer:
         }
         return mapping.get(problem, "General Complaints Department")
 
-    def determine_priority(self, problem, caption, text):
+    def determine_priority(self, problem, caption, text, hits=None):
         """Determine priority based on problem type and context"""
-        combined = (caption + " " + text).lower()
-        
-        # High priority keywords
-        high_priority_keywords = [
-            "urgent", "emergency", "dangerous", "hazardous", "critical", "serious",
-            "jaldi", "emergency", "danger", "risk", "accident", "injury", "fire",
-            "electrical", "water", "gas", "leak", "broken", "falling"
-        ]
+        if hits is None:
+            hits = self.keyword_hits(caption, text)
         
         # Check for high priority keywords
-        if any(keyword in combined for keyword in high_priority_keywords):
+        if hits["priority"]:
             return "HIGH"
         
         # High priority problems
@@ -319,7 +633,7 @@ class EnhancedCivicAnalyzer:
         base_title = titles.get(problem, "Civic Issue Reported")
         
         # Add context from caption if available
-        if caption and caption != "No image provided" and caption != "Image analysis failed":
+        if caption and caption not in PLACEHOLDER_CAPTIONS:
             # Extract key words from caption
             words = caption.split()[:3]  # First 3 words
             context = " ".join(words)
@@ -327,35 +641,187 @@ class EnhancedCivicAnalyzer:
         
         return base_title
 
-    def analyze_civic_issue(self, image_data=None, text=None, audio_data=None, location=None):
-        """Main analysis function"""
+    def _submit_branch(self, fn, *args, **kwargs):
+        """Start a branch on the branch pool, carrying over the request's context (profiling)"""
+        return self.branch_pool.submit(contextvars.copy_context().run, self._run_branch, fn, *args, **kwargs)
+
+    def _run_branch(self, fn, *args, **kwargs):
+        """Run an image or audio branch under its intra-op thread budget"""
+        if self.branch_threads:
+            try:
+                import torch
+                # With torch's OpenMP backend this applies to parallel regions
+                # started from the current thread, i.e. just this branch
+                torch.set_num_threads(self.branch_threads)
+            except ImportError:
+                pass
+        with profile_thread():
+            return fn(*args, **kwargs)
+
+    def _await_branch(self, future, timeout, submitted, stage, degraded):
+        """
+        Result of a branch, or None if it missed its stage timeout. The
+        timeout counts from submitted (time.monotonic()), not from when we
+        start waiting, so time spent awaiting the other branch is not added.
+        """
+        remaining = None if timeout is None else max(0.0, submitted + timeout - time.monotonic())
         try:
-            # Process image
-            image = None
-            caption = "No image provided"
-            if image_data:
-                image = self.base64_to_image(image_data)
-                if image:
-                    caption = self.generate_caption(image)
-            
-            # Process text/audio
+            return future.result(timeout=remaining)
+        except concurrent.futures.TimeoutError:
+            # The branch keeps running in the background; we just stop waiting
+            print(f"{stage} stage exceeded {timeout}s; continuing without it")
+            degraded.append(stage)
+            return None
+
+    def report_fingerprint(self, image_data, location):
+        """(pHash, dHash, lat, lon) of a report, or None without a photo or coordinates"""
+        from duplicate_detector import image_bytes_hashes
+        from geo_utils import parse_location
+
+        coordinates = parse_location(location)
+        if not image_data or coordinates is None:
+            return None
+        try:
+            phash, dhash = image_bytes_hashes(self.decode_base64_image(image_data))
+        except Exception as e:
+            print(f"Error hashing image for duplicate detection: {e}")
+            return None
+        return (phash, dhash) + coordinates
+
+    def find_duplicate(self, image_data, location):
+        """Earlier report this one duplicates, or None"""
+        if self.duplicate_index is None:
+            return None
+        fingerprint = self.report_fingerprint(image_data, location)
+        if fingerprint is None:
+            return None
+        return self.duplicate_index.find(*fingerprint)
+
+    def analyze_civic_issue(self, image_data=None, text=None, audio_data=None, location=None,
+                            include_timings=False, on_partial_transcript=None, report_id=None):
+        """Main analysis function
+
+        Every stage is timed into the shared metrics registry; with
+        include_timings the per-stage breakdown is attached as result["timings"].
+        report_id names the report in the duplicate index (a random id is
+        used if omitted).
+        """
+        with self.model_manager.request():
+            return self._analyze_civic_issue(image_data, text, audio_data, location,
+                                             include_timings, on_partial_transcript, report_id)
+
+    def _analyze_civic_issue(self, image_data, text, audio_data, location,
+                             include_timings, on_partial_transcript, report_id):
+        trace = RequestTrace()
+        try:
+            # A repeat photo of an already analyzed spot skips inference entirely
+            fingerprint = None
+            if self.duplicate_index is not None and image_data:
+                with trace.stage("duplicateCheck") as details:
+                    fingerprint = self.report_fingerprint(image_data, location)
+                    duplicate = self.duplicate_index.find(*fingerprint) if fingerprint else None
+                    details["duplicate"] = duplicate is not None
+                if duplicate is not None:
+                    # The stored analysis holds no complaint text; this reporter's
+                    # own words (typed or spoken) are the only ones returned
+                    data = dict(duplicate["analysis"])
+                    complaint_text = ""
+                    tiers = ["duplicate"]
+                    if text:
+                        with trace.stage("normalize"):
+                            complaint_text = self.normalize_text(text)
+                    elif audio_data:
+                        tiers.append("speech")
+                        audio_stats = {}
+                        degraded = []
+                        speech_future = self._submit_branch(
+                            self.speech_to_text, audio_data,
+                            on_partial=on_partial_transcript, audio_stats=audio_stats, trace=trace
+                        )
+                        voice_text = self._await_branch(speech_future, self.speech_timeout, time.monotonic(),
+                                                        "speech", degraded)
+                        with trace.stage("normalize"):
+                            complaint_text = self.normalize_text(voice_text or "")
+                        if audio_stats:
+                            data["voiceActivity"] = audio_stats
+                        if degraded:
+                            data["degradedStages"] = degraded
+                    data["complaintText"] = (complaint_text or
+                                             f"Issue detected from image analysis: {data['imageCaption']}")
+                    data["location"] = location or "Location not provided"
+                    data["duplicateOf"] = {key: value for key, value in duplicate.items() if key != "analysis"}
+                    data["tiersRun"] = tiers
+                    result = {"success": True, "data": data}
+                    if include_timings:
+                        result["timings"] = trace.as_dict()
+                    return result
+
+            # Cheap tier first: typed text that is decisive on its own skips BLIP
             complaint_text = ""
+            skip_caption = False
             if text:
-                complaint_text = self.normalize_text(text)
-            elif audio_data:
-                voice_text = self.speech_to_text(audio_data)
-                complaint_text = self.normalize_text(voice_text)
+                with trace.stage("normalize"):
+                    complaint_text = self.normalize_text(text)
+                if image_data and self.caption_skip_threshold is not None:
+                    with trace.stage("textScore") as details:
+                        score, conflict = self.classification_confidence(
+                            self.keyword_hits("", complaint_text),
+                            self.category_probabilities(None, complaint_text)
+                        )
+                        skip_caption = score >= self.caption_skip_threshold and not conflict
+                        details.update(score=score, conflict=conflict)
+
+            # The image and audio branches run concurrently, each with its own
+            # timeout counted from submission
+            caption_future = speech_future = None
+            audio_stats = None
+            degraded = []
+            tiers = []
+            submitted = time.monotonic()
+            if image_data and not skip_caption:
+                caption_future = self._submit_branch(self.caption_image_data, image_data, trace=trace)
+            if not text and audio_data:
+                audio_stats = {}
+                speech_future = self._submit_branch(
+                    self.speech_to_text, audio_data,
+                    on_partial=on_partial_transcript, audio_stats=audio_stats, trace=trace
+                )
+                tiers.append("speech")
+            tiers.append("text")
+            
+            # Process audio
+            if speech_future is not None:
+                voice_text = self._await_branch(speech_future, self.speech_timeout, submitted, "speech",
+                                                degraded)
+                with trace.stage("normalize"):
+                    complaint_text = self.normalize_text(voice_text or "")
+            
+            # Process image
+            caption = "Image analysis skipped" if skip_caption else "No image provided"
+            if caption_future is not None:
+                tiers.append("caption")
+                caption = self._await_branch(caption_future, self.caption_timeout, submitted, "caption",
+                                             degraded)
+                if caption is None:
+                    caption = "Image analysis timed out"
+            if image_data:
+                METRICS.inc("caption_cascade_total", 1, "Requests with an image, by whether BLIP ran",
+                            caption="skipped" if skip_caption else "run")
             
             # If no text provided, use caption as description
-            if not complaint_text and caption != "No image provided":
+            if not complaint_text and caption not in ("No image provided", "Image analysis timed out"):
                 complaint_text = f"Issue detected: {caption}"
             
             # Problem identification
-            problem = self.identify_problem(caption, complaint_text)
-            department = self.map_department(problem)
-            priority = self.determine_priority(problem, caption, complaint_text)
-            category = self.map_category(problem)
-            title = self.generate_title(problem, caption)
+            with trace.stage("classify"):
+                hits = self.keyword_hits(caption, complaint_text)
+                probabilities = self.category_probabilities(caption, complaint_text)
+                problem = self.identify_problem(caption, complaint_text, hits=hits, probabilities=probabilities)
+                department = self.map_department(problem)
+                priority = self.determine_priority(problem, caption, complaint_text, hits=hits)
+                category = self.map_category(problem)
+                title = self.generate_title(problem, caption)
+                confidence, _ = self.classification_confidence(hits, probabilities)
             
             result = {
                 "success": True,
@@ -368,9 +834,29 @@ class EnhancedCivicAnalyzer:
                     "imageCaption": caption,
                     "complaintText": complaint_text or f"Issue detected from image analysis: {caption}",
                     "location": location or "Location not provided",
-                    "aiConfidence": "high" if complaint_text else "medium"
+                    "aiConfidence": self.confidence_label(confidence),
+                    "confidenceScore": confidence,
+                    "tiersRun": tiers
                 }
             }
+            if probabilities:
+                top = sorted(probabilities.items(), key=lambda item: item[1], reverse=True)[:3]
+                result["data"]["categoryProbabilities"] = {label: round(p, 4) for label, p in top}
+            if audio_stats:
+                result["data"]["voiceActivity"] = audio_stats
+            if degraded:
+                result["data"]["degradedStages"] = degraded
+            # Only a completed image analysis is worth reusing
+            if fingerprint is not None and caption not in PLACEHOLDER_CAPTIONS:
+                report_id = report_id or uuid.uuid4().hex
+                result["data"]["reportId"] = report_id
+                self.duplicate_index.add(report_id, *fingerprint, analysis={
+                    key: result["data"][key]
+                    for key in ("title", "problemIdentified", "department", "priority",
+                                "category", "imageCaption", "aiConfidence")
+                })
+            if include_timings:
+                result["timings"] = trace.as_dict()
             
             return result
             
@@ -392,12 +878,52 @@ class EnhancedCivicAnalyzer:
                 }
             }
 
+def analyze_framed(source):
+    """Analyze every framed request in source, printing one JSON result per line"""
+    from framed_input import FrameError, iter_requests, open_source
+
+    # Results own stdout; model loading chatter goes to stderr
+    out, sys.stdout = sys.stdout, sys.stderr
+    analyzer = None
+    try:
+        with open_source(source) as stream:
+            for request in iter_requests(stream):
+                analyzer = analyzer or EnhancedCivicAnalyzer()
+                result = analyzer.analyze_civic_issue(
+                    image_data=request.get('imageData'),
+                    text=request.get('text'),
+                    audio_data=request.get('audioData'),
+                    location=request.get('location')
+                )
+                if 'id' in request:
+                    result = dict(result, id=request['id'])
+                out.write(json.dumps(result) + "\n")
+                out.flush()
+    except (FrameError, OSError) as e:
+        out.write(json.dumps({"success": False, "error": str(e)}) + "\n")
+    finally:
+        sys.stdout = out
+
 def main():
     """Main function for command line usage"""
     if len(sys.argv) < 2:
         print("Usage: python enhanced_civic_analyzer.py <json_input>")
+        print("       python enhanced_civic_analyzer.py --framed [- | fd:N | path]")
+        print("       python enhanced_civic_analyzer.py --serve [--workers N]")
         sys.exit(1)
     
+    if sys.argv[1] == "--framed":
+        # Length-prefixed requests with raw image/audio bytes (see framed_input.py)
+        analyze_framed(sys.argv[2] if len(sys.argv) > 2 else "-")
+        return
+    
+    if sys.argv[1] == "--serve":
+        # Long-lived mode: load the models once and serve JSON lines on stdin/stdout
+        import analyzer_server
+        sys.argv = [sys.argv[0]] + sys.argv[2:]
+        analyzer_server.main()
+        return
+    
     try:
         # Parse input
         input_data = json.loads(sys.argv[1])
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Framed Input
+Length-prefixed binary requests, so photos and voice notes reach the analyzer
+as raw bytes instead of base64 inside a JSON command-line argument
+
+    request := header blob*
+    header  := u32 length (big endian) + UTF-8 JSON object
+    blob    := u32 length (big endian) + raw bytes
+
+The header carries the small fields (text, location, id) and names the blob
+fields in the order they follow, e.g.
+    {"text": "...", "location": "...", "blobs": ["imageData", "audioData"]}
+Requests are concatenated back to back on one stream. Each blob is read with
+readinto() straight into its own buffer and handed on as a memoryview, so
+there is no argv size limit and no intermediate base64 string.
+"""
+
+import json
+import os
+import sys
+
+# Headers only hold short strings; anything larger is a desynchronised stream
+MAX_HEADER_BYTES = 1 << 20
+
+
+class FrameError(ValueError):
+    """Malformed or truncated framed input"""
+
+
+def open_source(source=None):
+    """Unbuffered binary stream for "-"/None (stdin), "fd:N" or a file path"""
+    if source in (None, "-"):
+        return os.fdopen(sys.stdin.fileno(), "rb", buffering=0, closefd=False)
+    if source.startswith("fd:"):
+        return os.fdopen(int(source[3:]), "rb", buffering=0)
+    return open(source, "rb", buffering=0)
+
+
+def _read_exact(stream, size, allow_eof=False):
+    """memoryview over exactly size bytes read into a fresh buffer; None at a clean EOF"""
+    view = memoryview(bytearray(size))
+    received = 0
+    while received < size:
+        count = stream.readinto(view[received:])
+        if not count:
+            if received == 0 and allow_eof:
+                return None
+            raise FrameError(f"Truncated frame: expected {size} bytes, got {received}")
+        received += count
+    return view
+
+
+def _read_length(stream, allow_eof=False):
+    prefix = _read_exact(stream, 4, allow_eof)
+    return None if prefix is None else int.from_bytes(prefix, "big")
+
+
+def read_request(stream):
+    """Next request as a dict with blob fields as memoryviews, or None at end of stream"""
+    length = _read_length(stream, allow_eof=True)
+    if length is None:
+        return None
+    if length > MAX_HEADER_BYTES:
+        raise FrameError(f"Header of {length} bytes exceeds {MAX_HEADER_BYTES}")
+    try:
+        request = json.loads(_read_exact(stream, length).tobytes())
+    except ValueError as e:
+        raise FrameError(f"Invalid header JSON: {e}")
+    if not isinstance(request, dict):
+        raise FrameError("Header must be a JSON object")
+
+    for field in request.pop("blobs", []):
+        request[field] = _read_exact(stream, _read_length(stream))
+    return request
+
+
+def iter_requests(stream):
+    """Yield requests until the stream ends"""
+    while True:
+        request = read_request(stream)
+        if request is None:
+            return
+        yield request
+
+
+def write_request(stream, fields, blobs=None):
+    """Frame a request: fields as the JSON header, blobs ({field: bytes-like}) as raw frames"""
+    blobs = {field: data for field, data in (blobs or {}).items() if data is not None}
+    header = json.dumps(dict(fields, blobs=list(blobs))).encode("utf-8")
+    stream.write(len(header).to_bytes(4, "big"))
+    stream.write(header)
+    for data in blobs.values():
+        stream.write(len(data).to_bytes(4, "big"))
+        stream.write(data)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Geo Utilities
+Coordinate parsing, geohash encoding and great-circle distances for reports
+"""
+
+import json
+import math
+import re
+
+EARTH_RADIUS_M = 6371008.8
+METERS_PER_DEGREE = 2 * math.pi * EARTH_RADIUS_M / 360
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+_GEOHASH_INDEX = {char: i for i, char in enumerate(GEOHASH_ALPHABET)}
+
+_NUMBER = r"[-+]?\d{1,3}(?:\.\d+)?"
+_LAT_LNG_LABELLED = re.compile(
+    rf"lat(?:itude)?\s*[:=]?\s*({_NUMBER}).*?(?:lng|lon|long|longitude)\s*[:=]?\s*({_NUMBER})", re.I | re.S
+)
+# Bare pairs must carry decimals so house and sector numbers are not mistaken for coordinates
+_DECIMAL = r"[-+]?\d{1,3}\.\d+"
+_LAT_LNG_PAIR = re.compile(rf"\s*({_DECIMAL})\s*[,;\s]\s*({_DECIMAL})")
+
+
+def _valid(lat, lon):
+    return -90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0
+
+
+def parse_location(location):
+    """
+    (lat, lon) from the location a report carries, or None for plain addresses.
+    Accepts {"lat", "lng"} / {"latitude", "longitude"} dicts (or their JSON),
+    [lat, lon] pairs, "23.34, 85.31 (Ranchi)" and "Lat: 23.34, Lng: 85.31" strings.
+    """
+    if location is None:
+        return None
+
+    if isinstance(location, str):
+        text = location.strip()
+        if text.startswith(("{", "[")):
+            try:
+                return parse_location(json.loads(text))
+            except ValueError:
+                return None
+        match = _LAT_LNG_LABELLED.search(text) or _LAT_LNG_PAIR.match(text)
+        if not match:
+            return None
+        lat, lon = float(match.group(1)), float(match.group(2))
+        return (lat, lon) if _valid(lat, lon) else None
+
+    if isinstance(location, dict):
+        lat = location.get("lat", location.get("latitude"))
+        lon = location.get("lng", location.get("lon", location.get("longitude")))
+    elif isinstance(location, (list, tuple)) and len(location) == 2:
+        lat, lon = location
+    else:
+        return None
+
+    try:
+        lat, lon = float(lat), float(lon)
+    except (TypeError, ValueError):
+        return None
+    return (lat, lon) if _valid(lat, lon) else None
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """Great-circle distance in meters"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def geohash_encode(lat, lon, precision=7):
+    """Standard base32 geohash of the given length"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lon_range, lon) if even else (lat_range, lat)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return "".join(chars)
+
+
+def geohash_bounds(geohash):
+    """(min_lat, min_lon, max_lat, max_lon) of a geohash cell"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        value = _GEOHASH_INDEX[char]
+        for shift in range(4, -1, -1):
+            interval = lon_range if even else lat_range
+            middle = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def geohash_cell_size(precision):
+    """(height, width) of a cell in degrees"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+
+def geohash_precision_for_radius(radius_m, max_latitude=60.0):
+    """
+    Longest geohash whose cells are at least radius_m on both sides up to
+    max_latitude, so a cell and its 8 neighbours cover any radius query
+    """
+    shrink = math.cos(math.radians(max_latitude))
+    for precision in range(12, 0, -1):
+        height, width = geohash_cell_size(precision)
+        if min(height * METERS_PER_DEGREE, width * METERS_PER_DEGREE * shrink) >= radius_m:
+            return precision
+    return 1
+
+
+def geohash_neighbors(geohash):
+    """The cell itself followed by its (up to) 8 neighbours"""
+    min_lat, min_lon, max_lat, max_lon = geohash_bounds(geohash)
+    height, width = max_lat - min_lat, max_lon - min_lon
+    center_lat, center_lon = (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+
+    cells = [geohash]
+    for d_lat in (-1, 0, 1):
+        for d_lon in (-1, 0, 1):
+            if not d_lat and not d_lon:
+                continue
+            lat = center_lat + d_lat * height
+            if not -90.0 < lat < 90.0:
+                continue
+            lon = (center_lon + d_lon * width + 180.0) % 360.0 - 180.0
+            cell = geohash_encode(lat, lon, len(geohash))
+            if cell not in cells:
+                cells.append(cell)
+    return cells
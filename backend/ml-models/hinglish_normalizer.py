@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Hinglish Normalizer
+Token-aware, single-pass replacement of Hinglish words and phrases with English
+"""
+
+import re
+
+TOKEN_PATTERN = re.compile(r"\w+|\W+")
+
+
+class HinglishNormalizer:
+    def __init__(self, replacements):
+        """
+        replacements maps a word or multi-word phrase to its English form.
+        Only whole tokens are replaced and the output is never rescanned, so
+        "light" -> "streetlight" cannot cascade into "streetstreetlight" and
+        "tap" no longer matches inside other words.
+        """
+        self.trie = {}
+        for phrase, english in replacements.items():
+            words = phrase.lower().split()
+            if not words or (len(words) == 1 and words[0] == english):
+                continue
+            node = self.trie
+            for word in words:
+                node = node.setdefault(word, {})
+            node[None] = english
+
+    def _match(self, tokens, start):
+        """Longest phrase starting at tokens[start]; returns (replacement, end)"""
+        node = self.trie.get(tokens[start])
+        best = (None, start)
+        i = start
+        while node is not None:
+            if None in node:
+                best = (node[None], i + 1)
+            # Phrases continue across a single whitespace separator only
+            if i + 2 >= len(tokens) or not tokens[i + 1].isspace():
+                break
+            i += 2
+            node = node.get(tokens[i])
+        return best
+
+    def normalize(self, text):
+        """Lowercase text and replace known words in one left-to-right pass"""
+        if not text:
+            return ""
+
+        tokens = TOKEN_PATTERN.findall(text.lower())
+        output = []
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token in self.trie:
+                replacement, end = self._match(tokens, i)
+                if replacement is not None:
+                    output.append(replacement)
+                    i = end
+                    continue
+            output.append(token)
+            i += 1
+        return "".join(output)
+
+    def normalize_many(self, texts):
+        """Normalize a batch of texts, e.g. for offline reprocessing"""
+        return [self.normalize(text) for text in texts]
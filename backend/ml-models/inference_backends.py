@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Inference Backends
+Pluggable implementations of the captioning and speech stages
+
+    torch - eager PyTorch (optionally int8 quantized, see quantization.py)
+    onnx  - ONNX Runtime on the CPU execution provider with full graph
+            optimizations; BLIP runs an exported vision encoder plus a text
+            decoder driven by a KV-cache greedy decoding loop, Whisper runs
+            through optimum's ORTModelForSpeechSeq2Seq
+    tiny  - random-weight NumPy stand-ins (tiny_models.py) for offline
+            benchmarks and smoke tests; the outputs are meaningless
+
+The ONNX backend needs: pip install onnxruntime optimum[onnxruntime]
+"""
+
+import json
+import os
+import sys
+
+from instrumentation import timed
+from model_loader import BLIP_MODEL_NAME, WHISPER_MODEL_NAME, load_blip, load_whisper, resolve_pinned
+
+BACKENDS = ("torch", "onnx", "tiny")
+
+DEFAULT_ONNX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "civic-analyzer", "onnx")
+
+
+class CaptionBackend:
+    """Captioning stage: a batch of RGB images in, one caption per image out"""
+    name = "base"
+
+    def caption(self, images, max_new_tokens=50):
+        raise NotImplementedError
+
+
+class SpeechBackend:
+    """Speech stage: 16 kHz mono float32 audio (or a file path) in, text out"""
+    name = "base"
+
+    def transcribe(self, audio, sampling_rate=16000):
+        return self.transcribe_batch([audio], sampling_rate)[0]
+
+    def transcribe_batch(self, audios, sampling_rate=16000):
+        raise NotImplementedError
+
+
+class TorchCaptionBackend(CaptionBackend):
+    name = "torch"
+
+    def __init__(self, processor, model):
+        self.processor = processor
+        self.model = model
+
+    def caption(self, images, max_new_tokens=50):
+        with timed("caption.processor"):
+            inputs = self.processor(images=images, return_tensors="pt")
+        with timed("caption.generate"):
+            out = self.model.generate(**inputs, max_new_tokens=max_new_tokens)
+        return self.processor.batch_decode(out, skip_special_tokens=True)
+
+
+class PipelineSpeechBackend(SpeechBackend):
+    """Any transformers ASR pipeline, whatever runtime sits underneath it"""
+
+    def __init__(self, asr, name="torch"):
+        self.asr = asr
+        self.name = name
+
+    def _input(self, audio, sampling_rate):
+        if isinstance(audio, str):
+            return audio
+        return {"raw": audio, "sampling_rate": sampling_rate}
+
+    def transcribe(self, audio, sampling_rate=16000):
+        return self.asr(self._input(audio, sampling_rate))["text"]
+
+    def transcribe_batch(self, audios, sampling_rate=16000):
+        inputs = [self._input(audio, sampling_rate) for audio in audios]
+        return [output["text"] for output in self.asr(inputs, batch_size=len(inputs))]
+
+
+def _onnx_session_options(num_threads=None):
+    import onnxruntime as ort
+
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    if num_threads:
+        options.intra_op_num_threads = num_threads
+    return options
+
+
+def _require_onnxruntime():
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError as e:
+        print(f"Error importing ONNX Runtime: {e}", file=sys.stderr)
+        print("Please install required packages: pip install onnxruntime optimum[onnxruntime]", file=sys.stderr)
+        raise
+
+
+def export_blip_onnx(model_name=BLIP_MODEL_NAME, output_dir=None, pinned_dir=None):
+    """
+    Export BLIP to vision_encoder.onnx, decoder_init.onnx (no past) and
+    decoder_with_past.onnx (one token plus the KV cache), with the processor
+    saved alongside for preprocessing and detokenization. With pinned_dir the
+    weights and processor come from the pinned copy (see model_loader.py)
+    instead of the hub.
+    """
+    import torch
+    from transformers import BlipProcessor, BlipForConditionalGeneration
+
+    output_dir = output_dir or os.path.join(DEFAULT_ONNX_DIR, model_name.replace("/", "--"))
+    os.makedirs(output_dir, exist_ok=True)
+
+    source = resolve_pinned(model_name, pinned_dir) if pinned_dir else model_name
+    processor = BlipProcessor.from_pretrained(source, local_files_only=bool(pinned_dir))
+    model = BlipForConditionalGeneration.from_pretrained(source, local_files_only=bool(pinned_dir)).eval()
+    text_config = model.config.text_config
+    decoder = model.text_decoder
+
+    def legacy(past):
+        return past.to_legacy_cache() if hasattr(past, "to_legacy_cache") else past
+
+    def as_cache(past):
+        try:
+            from transformers.cache_utils import EncoderDecoderCache
+            return EncoderDecoderCache.from_legacy_cache(past)
+        except ImportError:
+            return past
+
+    class VisionEncoder(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.vision_model = model.vision_model
+
+        def forward(self, pixel_values):
+            return self.vision_model(pixel_values=pixel_values, return_dict=True).last_hidden_state
+
+    with torch.no_grad():
+        pixel_values = torch.zeros(1, 3, 384, 384)
+        encoder_hidden_states = VisionEncoder()(pixel_values)
+        input_ids = torch.full((1, 1), text_config.bos_token_id, dtype=torch.long)
+        first = decoder(input_ids=input_ids, encoder_hidden_states=encoder_hidden_states,
+                        use_cache=True, return_dict=True)
+        past = legacy(first.past_key_values)
+
+    num_layers = len(past)
+    per_layer = len(past[0])
+    past_names = [f"past_{layer}_{i}" for layer in range(num_layers) for i in range(per_layer)]
+    present_names = [f"present_{layer}_{i}" for layer in range(num_layers) for i in range(per_layer)]
+
+    class DecoderInit(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.decoder = decoder
+
+        def forward(self, input_ids, encoder_hidden_states):
+            out = self.decoder(input_ids=input_ids, encoder_hidden_states=encoder_hidden_states,
+                               use_cache=True, return_dict=True)
+            return (out.logits,) + tuple(t for layer in legacy(out.past_key_values) for t in layer)
+
+    class DecoderWithPast(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.decoder = decoder
+
+        def forward(self, input_ids, encoder_hidden_states, *flat_past):
+            past = tuple(tuple(flat_past[l * per_layer:(l + 1) * per_layer]) for l in range(num_layers))
+            out = self.decoder(input_ids=input_ids, encoder_hidden_states=encoder_hidden_states,
+                               past_key_values=as_cache(past), use_cache=True, return_dict=True)
+            return (out.logits,) + tuple(t for layer in legacy(out.past_key_values) for t in layer)
+
+    batch = {0: "batch"}
+    kv_axes = {0: "batch", 2: "kv_length"}
+    with torch.no_grad():
+        torch.onnx.export(
+            VisionEncoder(), (pixel_values,), os.path.join(output_dir, "vision_encoder.onnx"),
+            input_names=["pixel_values"], output_names=["encoder_hidden_states"],
+            dynamic_axes={"pixel_values": batch, "encoder_hidden_states": batch}, opset_version=17
+        )
+        torch.onnx.export(
+            DecoderInit(), (input_ids, encoder_hidden_states), os.path.join(output_dir, "decoder_init.onnx"),
+            input_names=["input_ids", "encoder_hidden_states"],
+            output_names=["logits"] + present_names,
+            dynamic_axes=dict({"input_ids": {0: "batch", 1: "sequence"},
+                               "encoder_hidden_states": batch, "logits": {0: "batch", 1: "sequence"}},
+                              **{name: kv_axes for name in present_names}),
+            opset_version=17
+        )
+        flat_past = tuple(t for layer in past for t in layer)
+        torch.onnx.export(
+            DecoderWithPast(), (input_ids, encoder_hidden_states) + flat_past,
+            os.path.join(output_dir, "decoder_with_past.onnx"),
+            input_names=["input_ids", "encoder_hidden_states"] + past_names,
+            output_names=["logits"] + present_names,
+            dynamic_axes=dict({"input_ids": batch, "encoder_hidden_states": batch, "logits": batch},
+                              **{name: kv_axes for name in past_names + present_names}),
+            opset_version=17
+        )
+
+    processor.save_pretrained(output_dir)
+    with open(os.path.join(output_dir, "blip_onnx.json"), "w") as f:
+        json.dump({
+            "model": model_name,
+            "numLayers": num_layers,
+            "pastPerLayer": per_layer,
+            "bosTokenId": text_config.bos_token_id,
+            "eosTokenId": text_config.sep_token_id,
+            "padTokenId": text_config.pad_token_id,
+        }, f, indent=2)
+    return output_dir
+
+
+class OnnxCaptionBackend(CaptionBackend):
+    name = "onnx"
+
+    def __init__(self, model_dir, num_threads=None):
+        import onnxruntime as ort
+        from transformers import BlipProcessor
+
+        with open(os.path.join(model_dir, "blip_onnx.json")) as f:
+            self.meta = json.load(f)
+        self.processor = BlipProcessor.from_pretrained(model_dir, local_files_only=True)
+
+        options = _onnx_session_options(num_threads)
+        providers = ["CPUExecutionProvider"]
+        self.vision = ort.InferenceSession(os.path.join(model_dir, "vision_encoder.onnx"), options, providers=providers)
+        self.decoder_init = ort.InferenceSession(os.path.join(model_dir, "decoder_init.onnx"), options, providers=providers)
+        self.decoder_with_past = ort.InferenceSession(os.path.join(model_dir, "decoder_with_past.onnx"), options, providers=providers)
+        self.past_names = [i.name for i in self.decoder_with_past.get_inputs()][2:]
+
+    def caption(self, images, max_new_tokens=50):
+        import numpy as np
+
+        with timed("caption.processor"):
+            pixel_values = self.processor(images=images, return_tensors="np")["pixel_values"].astype(np.float32)
+        with timed("caption.generate"):
+            tokens = self._generate(pixel_values, max_new_tokens)
+        return self.processor.batch_decode(tokens, skip_special_tokens=True)
+
+    def _generate(self, pixel_values, max_new_tokens):
+        import numpy as np
+
+        encoder_hidden_states = self.vision.run(None, {"pixel_values": pixel_values})[0]
+
+        batch = pixel_values.shape[0]
+        eos, pad = self.meta["eosTokenId"], self.meta["padTokenId"]
+        input_ids = np.full((batch, 1), self.meta["bosTokenId"], dtype=np.int64)
+        outputs = self.decoder_init.run(None, {"input_ids": input_ids,
+                                               "encoder_hidden_states": encoder_hidden_states})
+
+        tokens = [input_ids]
+        finished = np.zeros(batch, dtype=bool)
+        for _ in range(max_new_tokens):
+            logits, presents = outputs[0], outputs[1:]
+            next_ids = logits[:, -1, :].argmax(axis=-1)
+            next_ids = np.where(finished, pad, next_ids)
+            tokens.append(next_ids[:, None])
+            finished |= next_ids == eos
+            if finished.all():
+                break
+
+            feed = {"input_ids": next_ids[:, None].astype(np.int64),
+                    "encoder_hidden_states": encoder_hidden_states}
+            feed.update(zip(self.past_names, presents))
+            outputs = self.decoder_with_past.run(None, feed)
+
+        return np.concatenate(tokens, axis=1)
+
+
+def _whisper_preprocessors(model_dir, source, local_files_only):
+    """Tokenizer and feature extractor of the export in model_dir, copied there from source on first use"""
+    from transformers import AutoFeatureExtractor, AutoTokenizer
+
+    saved = all(os.path.exists(os.path.join(model_dir, name))
+                for name in ("tokenizer_config.json", "preprocessor_config.json"))
+    if not saved:
+        # Fresh exports, and exports made before these were saved alongside
+        AutoTokenizer.from_pretrained(source, local_files_only=local_files_only).save_pretrained(model_dir)
+        AutoFeatureExtractor.from_pretrained(source, local_files_only=local_files_only).save_pretrained(model_dir)
+    return (AutoTokenizer.from_pretrained(model_dir, local_files_only=True),
+            AutoFeatureExtractor.from_pretrained(model_dir, local_files_only=True))
+
+
+def load_whisper_onnx(model_name=WHISPER_MODEL_NAME, model_dir=None, num_threads=None, pinned_dir=None):
+    """
+    Whisper ASR pipeline on ONNX Runtime, exporting the model on first use
+    (from pinned_dir's copy when given) with its tokenizer and feature
+    extractor saved alongside, so later loads only read model_dir
+    """
+    try:
+        from optimum.onnxruntime import ORTModelForSpeechSeq2Seq
+    except ImportError as e:
+        print(f"Error importing optimum: {e}", file=sys.stderr)
+        print("Please install required packages: pip install onnxruntime optimum[onnxruntime]", file=sys.stderr)
+        raise
+    from transformers import pipeline
+
+    model_dir = model_dir or os.path.join(DEFAULT_ONNX_DIR, model_name.replace("/", "--"))
+    source = resolve_pinned(model_name, pinned_dir) if pinned_dir else model_name
+    options = _onnx_session_options(num_threads)
+    if os.path.exists(os.path.join(model_dir, "config.json")):
+        model = ORTModelForSpeechSeq2Seq.from_pretrained(
+            model_dir, use_cache=True, provider="CPUExecutionProvider", session_options=options
+        )
+    else:
+        model = ORTModelForSpeechSeq2Seq.from_pretrained(
+            source, export=True, use_cache=True, provider="CPUExecutionProvider", session_options=options,
+            local_files_only=bool(pinned_dir)
+        )
+        model.save_pretrained(model_dir)
+
+    tokenizer, feature_extractor = _whisper_preprocessors(model_dir, source, bool(pinned_dir))
+    return pipeline(
+        "automatic-speech-recognition",
+        model=model,
+        tokenizer=tokenizer,
+        feature_extractor=feature_extractor
+    )
+
+
+def caption_backend_loader(backend="torch", quantize=False, quantized_cache_dir=None,
+                           onnx_dir=None, num_threads=None, model_dir=None, timings=None):
+    """Zero-argument callable that builds the configured captioning backend
+
+    model_dir points the backend at pinned local weights (see model_loader.py);
+    the onnx backend exports from them. timings receives the torch backend's
+    import/weight load breakdown.
+    """
+    if backend == "onnx":
+        def load():
+            _require_onnxruntime()
+            export_dir = os.path.join(onnx_dir or DEFAULT_ONNX_DIR, BLIP_MODEL_NAME.replace("/", "--"))
+            if not os.path.exists(os.path.join(export_dir, "blip_onnx.json")):
+                print(f"Exporting {BLIP_MODEL_NAME} to ONNX in {export_dir}...", file=sys.stderr)
+                export_blip_onnx(BLIP_MODEL_NAME, export_dir, pinned_dir=model_dir)
+            return OnnxCaptionBackend(export_dir, num_threads=num_threads)
+        return load
+
+    if backend == "tiny":
+        def load():
+            from tiny_models import load_tiny_blip
+            caption = TorchCaptionBackend(*load_tiny_blip())
+            caption.name = "tiny"
+            return caption
+        return load
+
+    if backend != "torch":
+        raise ValueError(f"Unknown caption backend: {backend} (expected one of {BACKENDS})")
+
+    def load():
+        if quantize:
+            from quantization import load_blip_quantized
+            return TorchCaptionBackend(*load_blip_quantized(cache_dir=quantized_cache_dir, model_dir=model_dir))
+        return TorchCaptionBackend(*load_blip(model_dir=model_dir, timings=timings))
+    return load
+
+
+def speech_backend_loader(backend="torch", quantize=False, quantized_cache_dir=None,
+                          onnx_dir=None, num_threads=None, model_dir=None, timings=None):
+    """Zero-argument callable that builds the configured speech backend
+
+    model_dir and timings work as for caption_backend_loader.
+    """
+    if backend == "onnx":
+        def load():
+            _require_onnxruntime()
+            export_dir = os.path.join(onnx_dir or DEFAULT_ONNX_DIR, WHISPER_MODEL_NAME.replace("/", "--"))
+            asr = load_whisper_onnx(model_dir=export_dir, num_threads=num_threads, pinned_dir=model_dir)
+            return PipelineSpeechBackend(asr, name="onnx")
+        return load
+
+    if backend == "tiny":
+        def load():
+            from tiny_models import load_tiny_whisper
+            return PipelineSpeechBackend(load_tiny_whisper(), name="tiny")
+        return load
+
+    if backend != "torch":
+        raise ValueError(f"Unknown speech backend: {backend} (expected one of {BACKENDS})")
+
+    def load():
+        if quantize:
+            from quantization import load_whisper_quantized
+            return PipelineSpeechBackend(load_whisper_quantized(cache_dir=quantized_cache_dir, model_dir=model_dir))
+        return PipelineSpeechBackend(load_whisper(model_dir=model_dir, timings=timings))
+    return load
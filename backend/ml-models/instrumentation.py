@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Pipeline Instrumentation
+Per-stage wall time, CPU time and memory for analyzer requests, aggregated
+into histograms that render in the Prometheus text format, plus sampled
+cProfile / torch profiler dumps
+"""
+
+import contextlib
+import contextvars
+import os
+import random
+import resource
+import sys
+import threading
+import time
+
+# Histogram buckets in seconds, from sub-millisecond text stages to model runs
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 20.0, 30.0)
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# Branch profiles of the request being cProfiled, collected by profile_thread()
+_profile_session = contextvars.ContextVar("profile_session", default=None)
+
+
+def current_rss_bytes():
+    """Resident set size of this process (Linux), or None where unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def peak_rss_bytes():
+    """
+    High-water mark of the resident set size. VmHWM is preferred because
+    ru_maxrss survives fork and exec, so a worker spawned by a large parent
+    would report the parent's peak.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def memory_rollup(pid="self"):
+    """
+    Rss, Pss, Shared_* and Private_* of a process in bytes, from
+    /proc/<pid>/smaps_rollup (Linux 4.14+), or None where unavailable. Pss
+    charges each shared page 1/N to each of the N processes mapping it, so
+    the Pss of forked workers adds up to the memory they really use.
+    """
+    rollup = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) == 3 and fields[2] == "kB":
+                    rollup[fields[0].rstrip(":")] = int(fields[1]) * 1024
+    except (OSError, ValueError):
+        return None
+    return rollup or None
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class MetricsRegistry:
+    def __init__(self, prefix="civic_analyzer"):
+        self.prefix = prefix
+        self._histograms = {}
+        self._counters = {}
+        self._help = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def observe(self, name, value, help_text="", **labels):
+        """Add a sample to the histogram name{labels}"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._help.setdefault(name, help_text)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def inc(self, name, amount=1, help_text="", **labels):
+        """Increment the counter name{labels}"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._help.setdefault(name, help_text)
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def add_collector(self, collect):
+        """
+        Register a callable returning [(name, type, help, {labels: value} or value)]
+        that is evaluated at scrape time, e.g. for cache or queue gauges
+        """
+        self._collectors.append(collect)
+
+    @staticmethod
+    def _labels(pairs, extra=None):
+        pairs = list(pairs) + (list(extra) if extra else [])
+        if not pairs:
+            return ""
+        escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                   for k, v in pairs)
+        return "{" + ",".join(escaped) + "}"
+
+    def render_prometheus(self):
+        """Text exposition format (version 0.0.4)"""
+        lines = []
+        with self._lock:
+            by_name = {}
+            for (name, labels), histogram in self._histograms.items():
+                by_name.setdefault(name, []).append((labels, histogram))
+            for name, series in sorted(by_name.items()):
+                metric = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {metric} {self._help.get(name, '')}")
+                lines.append(f"# TYPE {metric} histogram")
+                for labels, histogram in series:
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{metric}_bucket{self._labels(labels, [('le', bound)])} {cumulative}")
+                    lines.append(f"{metric}_bucket{self._labels(labels, [('le', '+Inf')])} {histogram.count}")
+                    lines.append(f"{metric}_sum{self._labels(labels)} {histogram.sum}")
+                    lines.append(f"{metric}_count{self._labels(labels)} {histogram.count}")
+
+            by_name = {}
+            for (name, labels), value in self._counters.items():
+                by_name.setdefault(name, []).append((labels, value))
+            for name, series in sorted(by_name.items()):
+                metric = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {metric} {self._help.get(name, '')}")
+                lines.append(f"# TYPE {metric} counter")
+                for labels, value in series:
+                    lines.append(f"{metric}{self._labels(labels)} {value}")
+            collectors = list(self._collectors)
+
+        for collect in collectors:
+            for name, metric_type, help_text, value in collect():
+                metric = f"{self.prefix}_{name}"
+                lines.append(f"# HELP {metric} {help_text}")
+                lines.append(f"# TYPE {metric} {metric_type}")
+                if isinstance(value, dict):
+                    for labels, sample in value.items():
+                        if sample is not None:
+                            lines.append(f"{metric}{self._labels(labels)} {sample}")
+                elif value is not None:
+                    lines.append(f"{metric} {value}")
+
+        rss = current_rss_bytes()
+        if rss is not None:
+            lines.append(f"# HELP {self.prefix}_resident_memory_bytes Current resident set size")
+            lines.append(f"# TYPE {self.prefix}_resident_memory_bytes gauge")
+            lines.append(f"{self.prefix}_resident_memory_bytes {rss}")
+        lines.append(f"# HELP {self.prefix}_peak_resident_memory_bytes Peak resident set size")
+        lines.append(f"# TYPE {self.prefix}_peak_resident_memory_bytes gauge")
+        lines.append(f"{self.prefix}_peak_resident_memory_bytes {peak_rss_bytes()}")
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry shared by the analyzer, backends and server
+METRICS = MetricsRegistry()
+
+
+def observe_stage(name, wall_seconds, cpu_seconds=None, metrics=METRICS):
+    """Record one stage run in the aggregated histograms"""
+    metrics.observe("stage_seconds", wall_seconds, "Wall time per pipeline stage", stage=name)
+    if cpu_seconds is not None:
+        metrics.observe("stage_cpu_seconds", cpu_seconds, "CPU time per pipeline stage", stage=name)
+
+
+@contextlib.contextmanager
+def timed(name, metrics=METRICS):
+    """Feed a block into the shared histograms only, e.g. inside a batched model call"""
+    cpu_before = time.thread_time()
+    wall_before = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - wall_before, time.thread_time() - cpu_before, metrics)
+
+
+class RequestTrace:
+    def __init__(self, metrics=METRICS):
+        """Per-request stage timings; every stage also feeds the shared histograms"""
+        self.metrics = metrics
+        self.started = time.perf_counter()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Time a block: wall and CPU time of this thread, RSS and peak-RSS growth.
+        Yields a dict whose entries are added to the stage record.
+        """
+        details = {}
+        peak_before = peak_rss_bytes()
+        cpu_before = time.thread_time()
+        wall_before = time.perf_counter()
+        try:
+            yield details
+        finally:
+            wall = time.perf_counter() - wall_before
+            cpu = time.thread_time() - cpu_before
+            peak_after = peak_rss_bytes()
+            rss = current_rss_bytes()
+            details.update({
+                "rssMb": round(rss / 2 ** 20, 1) if rss is not None else None,
+                "peakRssMb": round(peak_after / 2 ** 20, 1),
+                "peakRssGrowthMb": round((peak_after - peak_before) / 2 ** 20, 1),
+            })
+            self.record(name, wall, cpu, details)
+
+    def record(self, name, wall_seconds, cpu_seconds=None, extra=None):
+        """Add an externally measured stage, e.g. image decode phases"""
+        entry = {"wallMs": round(wall_seconds * 1000, 3)}
+        if cpu_seconds is not None:
+            entry["cpuMs"] = round(cpu_seconds * 1000, 3)
+        if extra:
+            entry.update(extra)
+        with self._lock:
+            self.stages[name] = entry
+        observe_stage(name, wall_seconds, cpu_seconds, self.metrics)
+
+    def as_dict(self):
+        with self._lock:
+            stages = dict(self.stages)
+        return {"totalMs": round((time.perf_counter() - self.started) * 1000, 3), "stages": stages}
+
+
+@contextlib.contextmanager
+def profile_thread():
+    """
+    Profile a block running on a worker thread into the cProfile dump of the
+    request that submitted it. The submitter must run the work in a copy of
+    its context (contextvars.copy_context().run); outside a profiled request
+    this does nothing.
+    """
+    session = _profile_session.get()
+    if session is None:
+        yield
+        return
+    import cProfile
+    profile = cProfile.Profile()
+    try:
+        profile.enable()
+    except ValueError:
+        # Python 3.12+ allows only one active profiler at a time
+        yield
+        return
+    try:
+        yield
+    finally:
+        profile.disable()
+        session.append(profile)
+
+
+class Profiler:
+    def __init__(self, sample_rate=0.0, output_dir="profiles", mode="cprofile"):
+        """
+        Dump a profile for a random sample_rate fraction of requests.
+        mode "cprofile" writes .prof files of the calling thread merged with
+        the branch threads it fans out to via profile_thread() (open with
+        snakeviz or pstats), mode "torch" writes Chrome traces of every
+        thread's torch ops (open in chrome://tracing or Perfetto).
+        """
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.mode = mode
+        self.dumps = 0
+
+    @contextlib.contextmanager
+    def maybe_profile(self, request_id=None):
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            yield
+            return
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        stem = os.path.join(self.output_dir, f"{int(time.time() * 1000)}-{request_id or 'request'}")
+
+        if self.mode == "torch":
+            import torch
+            with torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU],
+                                        record_shapes=True, profile_memory=True) as prof:
+                yield
+            prof.export_chrome_trace(f"{stem}.json")
+        else:
+            import cProfile
+            import pstats
+            profile = cProfile.Profile()
+            branches = []
+            token = _profile_session.set(branches)
+            profile.enable()
+            try:
+                yield
+            finally:
+                profile.disable()
+                _profile_session.reset(token)
+                stats = pstats.Stats(profile)
+                # Branches that outlived the request (timed out) are left out
+                for branch in list(branches):
+                    stats.add(branch)
+                stats.dump_stats(f"{stem}.prof")
+        self.dumps += 1
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Keyword Matcher
+Scores every problem category and priority cue in a single regex pass
+"""
+
+import re
+
+
+# Plurals and simple inflections still count as the keyword: potholes, drains,
+# buses, damaged, leaking
+INFLECTION = r"(?:s|es|d|ed|ing)?"
+
+
+class KeywordMatcher:
+    def __init__(self, categories, priority_cues=()):
+        """
+        categories maps a label to its keywords; priority_cues is a flat list of
+        keywords that raise the priority. Everything is compiled into one
+        alternation, longest keywords first, that must start at a word
+        boundary and may end in an inflection, so "light" no longer matches
+        inside "streetlight" but "streetlights" still counts.
+        """
+        self.labels = list(categories)
+        self._targets = {}
+        for label, keywords in categories.items():
+            for keyword in keywords:
+                self._add(keyword, label)
+        for keyword in priority_cues:
+            self._add(keyword, None)
+
+        # A match only reports the longest keyword at its position. It also
+        # implies the shorter keywords it starts with ("light" in "light
+        # broken", "drain" in "drainage"), and those of its own categories
+        # inside it ("light" in "streetlight", "hole" in "pothole"), but not
+        # another category's ("nal" in "signal", "saf" in "road safety")
+        self._implied = {
+            keyword: [other for other in self._targets
+                      if keyword.startswith(other)
+                      or (other in keyword and set(self._targets[other]) & set(self._targets[keyword]))]
+            for keyword in self._targets
+        }
+
+        alternatives = sorted(self._targets, key=len, reverse=True)
+        pattern = "|".join(re.escape(keyword) for keyword in alternatives)
+        # Zero-width, so overlapping keywords are all found: "road broken"
+        # does not hide the "broken" priority cue inside it
+        self.pattern = re.compile(r"\b(?=(" + pattern + r")" + INFLECTION + r"\b)")
+
+    def _add(self, keyword, label):
+        targets = self._targets.setdefault(" ".join(keyword.lower().split()), [])
+        if label not in targets:
+            targets.append(label)
+
+    def scan(self, text):
+        """
+        Return {"categories": {label: hits}, "priority": hits, "keywords": [...]}
+        for lowercased text. Hits count distinct keywords, however often each
+        occurs. Every label is present in "categories", in the order the
+        categories were given.
+        """
+        found = {}
+        for match in self.pattern.finditer(" ".join(text.split())):
+            for keyword in self._implied[match.group(1)]:
+                found[keyword] = True
+
+        counts = dict.fromkeys(self.labels, 0)
+        priority = 0
+        for keyword in found:
+            for label in self._targets[keyword]:
+                if label is None:
+                    priority += 1
+                else:
+                    counts[label] += 1
+        return {"categories": counts, "priority": priority, "keywords": list(found)}
+
+    def scan_many(self, texts):
+        """Scan a batch of lowercased texts, e.g. for bulk re-classification"""
+        return [self.scan(text) for text in texts]
+
+    @staticmethod
+    def best(category_hits, default=None):
+        """Label with the most hits (first one wins ties), or default when none hit"""
+        best_label, best_hits = default, 0
+        for label, hits in category_hits.items():
+            if hits > best_hits:
+                best_label, best_hits = label, hits
+        return best_label
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Long Audio Transcription
+Splits long voice complaints into overlapping chunks, runs them through
+Whisper as batches and stitches the transcript back together
+"""
+
+import re
+
+WORD_PATTERN = re.compile(r"[^\w']+")
+
+
+def split_chunks(audio, sampling_rate, chunk_s=30.0, overlap_s=5.0):
+    """Return overlapping windows of at most chunk_s seconds (views, not copies)"""
+    chunk = int(chunk_s * sampling_rate)
+    step = max(1, chunk - int(overlap_s * sampling_rate))
+    if len(audio) <= chunk:
+        return [audio]
+
+    chunks = []
+    start = 0
+    while True:
+        chunks.append(audio[start:start + chunk])
+        if start + chunk >= len(audio):
+            return chunks
+        start += step
+
+
+def merge_transcripts(previous, current, max_overlap_words=30):
+    """
+    Append current to previous, dropping the words both chunks heard in their
+    overlapping audio (the longest suffix of previous equal to a prefix of current)
+    """
+    previous = previous.strip()
+    current = current.strip()
+    if not previous:
+        return current
+    if not current:
+        return previous
+
+    prev_words = previous.split()
+    cur_words = current.split()
+
+    def key(word):
+        return WORD_PATTERN.sub("", word.lower())
+
+    prev_keys = [key(word) for word in prev_words[-max_overlap_words:]]
+    cur_keys = [key(word) for word in cur_words[:max_overlap_words]]
+
+    for size in range(min(len(prev_keys), len(cur_keys)), 0, -1):
+        if prev_keys[-size:] == cur_keys[:size]:
+            return " ".join(prev_words + cur_words[size:])
+    return " ".join(prev_words + cur_words)
+
+
+def transcribe_long(transcribe_batch, audio, sampling_rate, chunk_s=30.0, overlap_s=5.0,
+                    batch_size=4, on_partial=None):
+    """
+    Transcribe audio of any length. transcribe_batch(chunks, sampling_rate)
+    returns one text per chunk, e.g. SpeechBackend.transcribe_batch.
+
+    Chunks are transcribed batch_size at a time so one forward pass covers
+    several windows. If on_partial is given it is called after every
+    chunk as on_partial(chunk_index, total_chunks, chunk_text, transcript_so_far).
+    """
+    chunks = split_chunks(audio, sampling_rate, chunk_s, overlap_s)
+    batch_size = max(1, int(batch_size))
+
+    transcript = ""
+    for batch_start in range(0, len(chunks), batch_size):
+        batch = chunks[batch_start:batch_start + batch_size]
+        texts = transcribe_batch(batch, sampling_rate)
+
+        for offset, text in enumerate(texts):
+            transcript = merge_transcripts(transcript, text)
+            if on_partial is not None:
+                on_partial(batch_start + offset, len(chunks), text, transcript)
+
+    return transcript
@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Model Loader
+Lazy, per-modality loading of the BLIP and Whisper models
+
+Nothing in this module imports torch or transformers at import time, so the
+text-only analysis path stays free of the ML stack.
+
+With a model_dir the models are read from a pinned local copy instead of
+the hub cache: no network lookups, and the safetensors weights are
+memory-mapped straight into the model without a random initialisation
+first. Populate the directory once with:
+    python model_loader.py pin --model-dir /opt/civic-models
+
+ModelManager keeps the loaded models within a memory budget, unloading the
+least recently used one when another needs room, for nodes that cannot
+hold BLIP and Whisper side by side.
+"""
+
+import argparse
+import contextlib
+import ctypes
+import ctypes.util
+import gc
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from instrumentation import METRICS, current_rss_bytes
+
+BLIP_MODEL_NAME = "Salesforce/blip-image-captioning-large"
+WHISPER_MODEL_NAME = "openai/whisper-small"
+
+# Everything from_pretrained needs, minus the duplicate PyTorch/TF/Flax weights
+PINNED_FILE_PATTERNS = ["*.json", "*.safetensors", "*.txt", "*.model", "*.tiktoken"]
+PIN_MANIFEST = "pinned.json"
+
+
+def pinned_model_path(model_name, model_dir):
+    """Local directory holding the pinned copy of model_name"""
+    return os.path.join(model_dir, model_name.replace("/", "--"))
+
+
+def resolve_pinned(model_name, model_dir):
+    """Pinned directory of model_name, refusing to fall back to the network"""
+    path = pinned_model_path(model_name, model_dir)
+    if not os.path.exists(os.path.join(path, "config.json")):
+        raise FileNotFoundError(
+            f"{model_name} is not pinned in {model_dir}; run: python model_loader.py pin --model-dir {model_dir}"
+        )
+    # Callers pass local_files_only=True for everything they load from path;
+    # HF_HUB_OFFLINE would be read too late here, once transformers is imported
+    return path
+
+
+def _pinned_kwargs():
+    return {"local_files_only": True, "use_safetensors": True, "low_cpu_mem_usage": True}
+
+
+def _record(timings, phase, started):
+    if timings is not None:
+        timings[phase] = round(time.perf_counter() - started, 4)
+
+
+def load_blip(model_name=BLIP_MODEL_NAME, model_dir=None, timings=None):
+    """Load the BLIP processor and captioning model
+
+    timings, if given, receives importSeconds and weightsSeconds.
+    """
+    started = time.perf_counter()
+    try:
+        from transformers import BlipProcessor, BlipForConditionalGeneration
+    except ImportError as e:
+        print(f"Error importing ML libraries: {e}", file=sys.stderr)
+        print("Please install required packages: pip install transformers torch pillow", file=sys.stderr)
+        raise
+    _record(timings, "importSeconds", started)
+
+    started = time.perf_counter()
+    if model_dir:
+        path = resolve_pinned(model_name, model_dir)
+        processor = BlipProcessor.from_pretrained(path, local_files_only=True)
+        model = BlipForConditionalGeneration.from_pretrained(path, **_pinned_kwargs()).eval()
+    else:
+        processor = BlipProcessor.from_pretrained(model_name)
+        model = BlipForConditionalGeneration.from_pretrained(model_name)
+    _record(timings, "weightsSeconds", started)
+    return processor, model
+
+
+def load_whisper(model_name=WHISPER_MODEL_NAME, model_dir=None, timings=None):
+    """Load the Whisper speech recognition pipeline
+
+    timings, if given, receives importSeconds and weightsSeconds.
+    """
+    started = time.perf_counter()
+    try:
+        from transformers import pipeline
+    except ImportError as e:
+        print(f"Error importing ML libraries: {e}", file=sys.stderr)
+        print("Please install required packages: pip install transformers torch pillow", file=sys.stderr)
+        raise
+    _record(timings, "importSeconds", started)
+
+    started = time.perf_counter()
+    if model_dir:
+        from transformers import AutoProcessor, WhisperForConditionalGeneration
+
+        path = resolve_pinned(model_name, model_dir)
+        processor = AutoProcessor.from_pretrained(path, local_files_only=True)
+        model = WhisperForConditionalGeneration.from_pretrained(path, **_pinned_kwargs()).eval()
+        asr = pipeline("automatic-speech-recognition", model=model, tokenizer=processor.tokenizer,
+                       feature_extractor=processor.feature_extractor)
+    else:
+        asr = pipeline("automatic-speech-recognition", model=model_name)
+    _record(timings, "weightsSeconds", started)
+    return asr
+
+
+def pin_models(model_dir, model_names=(BLIP_MODEL_NAME, WHISPER_MODEL_NAME), revisions=None):
+    """
+    Download each model's safetensors weights, configs and tokenizer files into
+    model_dir and record the exact commit in pinned.json. Re-running with the
+    same revisions is a no-op apart from the hub's file checks.
+    """
+    from huggingface_hub import HfApi, snapshot_download
+
+    revisions = revisions or {}
+    manifest_path = os.path.join(model_dir, PIN_MANIFEST)
+    manifest = {}
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    api = HfApi()
+    for name in model_names:
+        commit = api.model_info(name, revision=revisions.get(name)).sha
+        print(f"Pinning {name}@{commit}...", file=sys.stderr)
+        path = snapshot_download(name, revision=commit, local_dir=pinned_model_path(name, model_dir),
+                                 allow_patterns=PINNED_FILE_PATTERNS)
+        if not any(file.endswith(".safetensors") for file in os.listdir(path)):
+            raise RuntimeError(f"{name}@{commit} publishes no safetensors weights")
+        manifest[name] = {"revision": commit, "path": os.path.basename(path), "pinnedAt": time.time()}
+
+    os.makedirs(model_dir, exist_ok=True)
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+    return manifest
+
+
+def torch_modules(backend):
+    """The torch modules held by a loaded caption or speech backend"""
+    modules = []
+    for owner in (backend, getattr(backend, "asr", None)):
+        model = getattr(owner, "model", None)
+        if hasattr(model, "parameters"):
+            modules.append(model)
+    return modules
+
+
+def tensor_bytes(backend):
+    """Bytes held by the parameters and buffers of a backend's torch modules"""
+    total = 0
+    for module in torch_modules(backend):
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            total += tensor.numel() * tensor.element_size()
+    return total
+
+
+_libc = None
+
+
+def release_memory():
+    """
+    Hand freed memory back to the OS: collect reference cycles (which can
+    hold on to tensors of a finished request), empty the CUDA cache and
+    malloc_trim the glibc heap, whose freed arenas otherwise stay resident
+    """
+    global _libc
+    gc.collect()
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+    if _libc is None:
+        name = ctypes.util.find_library("c")
+        try:
+            _libc = ctypes.CDLL(name) if name else False
+        except OSError:
+            _libc = False
+    if _libc and hasattr(_libc, "malloc_trim"):
+        _libc.malloc_trim(0)
+
+
+def _mb(size):
+    return round(size / 2 ** 20, 1) if size is not None else None
+
+
+class LazyModel:
+    def __init__(self, name, loader, idle_ttl=None):
+        """
+        Wrap a loader so the model is built on first get().
+        With idle_ttl (seconds) set, evict_if_idle() drops a model that has not
+        been used for that long; the next get() loads it again.
+        resident_bytes is the process RSS growth the last load caused and
+        tensor_bytes what its weights take; both are kept after an unload as
+        the estimate for the next load.
+        """
+        self.name = name
+        self.loader = loader
+        self.idle_ttl = idle_ttl
+        self.manager = None
+        self.value = None
+        self.loads = 0
+        self.evictions = 0
+        self.last_used = None
+        self.load_seconds = None
+        self.resident_bytes = None
+        self.tensor_bytes = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self.value is not None
+
+    def get(self):
+        """Return the model, loading it on first use"""
+        value = self.value
+        if value is None:
+            # Outside our lock: making room takes the other models' locks
+            if self.manager is not None:
+                self.manager.make_room(self)
+            loaded_now = False
+            # Managed models load one at a time, so each RSS delta is that model's alone
+            load_lock = self.manager.load_lock if self.manager is not None else contextlib.nullcontext()
+            with load_lock, self._lock:
+                if self.value is None:
+                    started = time.perf_counter()
+                    rss_before = current_rss_bytes()
+                    print(f"Loading {self.name} model...", file=sys.stderr)
+                    self.value = self.loader()
+                    self.load_seconds = time.perf_counter() - started
+                    self.loads += 1
+                    rss_after = current_rss_bytes()
+                    if rss_before is not None and rss_after is not None:
+                        self.resident_bytes = max(0, rss_after - rss_before)
+                    self.tensor_bytes = tensor_bytes(self.value) or None
+                    loaded_now = True
+                    print(f"✅ {self.name} model loaded in {self.load_seconds:.1f}s "
+                          f"(+{_mb(self.resident_bytes)} MB resident)", file=sys.stderr)
+                value = self.value
+            if loaded_now and self.manager is not None:
+                self.manager.loaded(self)
+        self.last_used = time.monotonic()
+        return value
+
+    def unload(self, reason="idle"):
+        """Drop the model reference so its memory can be reclaimed"""
+        with self._lock:
+            if self.value is None:
+                return False
+            self.value = None
+            self.evictions += 1
+        # Requests still running keep their reference; the rest is freed now
+        release_memory()
+        print(f"Unloaded {self.name} model ({reason})", file=sys.stderr)
+        if self.manager is not None:
+            self.manager.unloaded(self, reason)
+        return True
+
+    def evict_if_idle(self, now=None):
+        """Unload the model if it has been idle longer than idle_ttl"""
+        if self.idle_ttl is None or self.value is None or self.last_used is None:
+            return False
+        now = time.monotonic() if now is None else now
+        if now - self.last_used < self.idle_ttl:
+            return False
+        return self.unload()
+
+    def stats(self):
+        idle = time.monotonic() - self.last_used if self.last_used is not None else None
+        return {
+            "loaded": self.loaded,
+            "loads": self.loads,
+            "evictions": self.evictions,
+            "loadSeconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "idleSeconds": round(idle, 3) if idle is not None else None,
+            "idleTtlSeconds": self.idle_ttl,
+            "residentMb": _mb(self.resident_bytes),
+            "tensorMb": _mb(self.tensor_bytes),
+        }
+
+
+class IdleModelReaper:
+    def __init__(self, models, interval=30.0):
+        """Background thread that periodically evicts idle models"""
+        self.models = models
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="model-reaper", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            for model in self.models:
+                model.evict_if_idle()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class ModelManager:
+    def __init__(self, models, budget_bytes=None, release_after_request=None, max_events=100):
+        """
+        Keep the resident size of `models` (LazyModels) within budget_bytes:
+        before a model loads, and after it has, the least recently used other
+        models are unloaded until the total fits. A model's size is what its
+        parameters and buffers take or, for backends without torch modules,
+        the RSS growth its last load caused; loads run one at a time under
+        load_lock so those deltas do not include each other. A model never
+        loaded yet counts as zero until it is measured. One model
+        larger than the whole budget is still loaded, with a warning.
+        With release_after_request (default: on when there is a budget),
+        release_memory() runs whenever the last in-flight request finishes.
+        Load and unload events are logged to stderr, counted in the
+        model_events_total metric and kept for stats().
+        """
+        self.models = list(models)
+        self.budget_bytes = budget_bytes
+        self.release_after_request = (budget_bytes is not None if release_after_request is None
+                                      else release_after_request)
+        self.events = deque(maxlen=max_events)
+        self.in_flight = 0
+        self.releases = 0
+        self._lock = threading.Lock()
+        self.load_lock = threading.Lock()
+        for model in self.models:
+            model.manager = self
+
+    @staticmethod
+    def size(model):
+        # Tensor bytes are exact; an RSS delta also catches whatever else grew meanwhile
+        return model.tensor_bytes or model.resident_bytes or 0
+
+    def resident_bytes(self):
+        return sum(self.size(model) for model in self.models if model.loaded)
+
+    def _evict(self, keep, incoming=0):
+        """Unload least recently used models other than keep until incoming more bytes fit"""
+        if self.budget_bytes is None:
+            return
+        while True:
+            with self._lock:
+                if self.resident_bytes() + incoming <= self.budget_bytes:
+                    return
+                candidates = [model for model in self.models if model.loaded and model is not keep]
+                if not candidates:
+                    return
+                victim = min(candidates, key=lambda model: model.last_used or 0.0)
+            victim.unload(reason=f"budget:{keep.name}")
+
+    def make_room(self, model):
+        """Called before model loads: evict for its size as last measured"""
+        self._evict(model, incoming=self.size(model))
+
+    def loaded(self, model):
+        """Called after model loaded: record it and evict for its measured size"""
+        self._record("load", model, seconds=model.load_seconds)
+        self._evict(model)
+        if self.budget_bytes is not None and self.size(model) > self.budget_bytes:
+            print(f"⚠️ {model.name} alone ({_mb(self.size(model))} MB) exceeds the "
+                  f"{_mb(self.budget_bytes)} MB model memory budget", file=sys.stderr)
+
+    def unloaded(self, model, reason):
+        self._record("unload", model, reason=reason)
+
+    def _record(self, event, model, **details):
+        METRICS.inc("model_events_total", 1, "Model loads and unloads", event=event, model=model.name)
+        entry = {"at": time.time(), "event": event, "model": model.name, "residentMb": _mb(self.size(model))}
+        entry.update({key: round(value, 3) if isinstance(value, float) else value
+                      for key, value in details.items() if value is not None})
+        with self._lock:
+            self.events.append(entry)
+        print(f"Model {event}: {json.dumps(entry)}", file=sys.stderr)
+
+    @contextlib.contextmanager
+    def request(self):
+        """Wrap one analysis; the last request out releases memory"""
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                release = self.release_after_request and self.in_flight == 0
+                if release:
+                    self.releases += 1
+            if release:
+                release_memory()
+
+    def stats(self):
+        with self._lock:
+            events = list(self.events)
+        rss = current_rss_bytes()
+        return {
+            "budgetMb": _mb(self.budget_bytes),
+            "modelsResidentMb": _mb(self.resident_bytes()),
+            "processRssMb": _mb(rss),
+            "releaseAfterRequest": self.release_after_request,
+            "releases": self.releases,
+            # Least recently used first: the next to go when room is needed
+            "lruOrder": [model.name for model in sorted(
+                (model for model in self.models if model.loaded), key=lambda model: model.last_used or 0.0)],
+            "recentEvents": events[-10:],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the pinned local model directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    pin = commands.add_parser("pin", help="Download BLIP and Whisper into --model-dir")
+    pin.add_argument("--model-dir", required=True)
+    pin.add_argument("--blip-revision", help="Commit, branch or tag of the BLIP model (default: main)")
+    pin.add_argument("--whisper-revision", help="Commit, branch or tag of the Whisper model (default: main)")
+    args = parser.parse_args()
+
+    revisions = {BLIP_MODEL_NAME: args.blip_revision, WHISPER_MODEL_NAME: args.whisper_revision}
+    print(json.dumps(pin_models(args.model_dir, revisions=revisions), indent=2))
+
+
+if __name__ == "__main__":
+    main()
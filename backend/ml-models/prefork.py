@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Pre-fork Workers
+The server process loads BLIP and Whisper once, freezes them and forks worker
+processes that share the weight pages copy-on-write
+
+Each worker is pinned to its own slice of the CPUs with a matching torch
+thread budget, so N workers use all cores without oversubscribing them. The
+parent keeps the stdin/stdout protocol, counters and the spatial index, and
+hands analyze requests to the least busy worker over a Unix socket pair
+(JSON lines, the same framing as the main protocol).
+
+Fork safety: the parent must fork before it starts any thread of its own or
+runs any inference, since neither threads nor OpenMP pools survive fork. The
+ONNX Runtime backend creates its thread pools at load time and is therefore
+not supported here.
+"""
+
+import gc
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from instrumentation import memory_rollup
+from model_loader import torch_modules
+
+
+def split_cpus(workers, cpus=None):
+    """Contiguous, disjoint CPU sets for each worker (shared round-robin if workers > CPUs)"""
+    cpus = sorted(cpus if cpus is not None else os.sched_getaffinity(0))
+    if workers >= len(cpus):
+        return [{cpus[i % len(cpus)]} for i in range(workers)]
+    size, extra = divmod(len(cpus), workers)
+    sets, start = [], 0
+    for i in range(workers):
+        end = start + size + (1 if i < extra else 0)
+        sets.append(set(cpus[start:end]))
+        start = end
+    return sets
+
+
+def freeze_for_fork(analyzer):
+    """
+    Load both models and make them safe to share: inference mode weights that
+    nothing writes to, and every object that exists so far moved out of the
+    garbage collector's reach, so collections in the workers do not touch
+    (and so copy) the parent's pages.
+    """
+    analyzer.blip.get()
+    analyzer.whisper.get()
+    for module in torch_modules(analyzer.blip.value) + torch_modules(analyzer.whisper.value):
+        module.eval()
+        for parameter in module.parameters():
+            parameter.requires_grad_(False)
+    gc.collect()
+    gc.freeze()
+
+
+def _pin_worker(cpus, threads, interop_threads):
+    """Restrict this process to cpus and size torch's pools to match"""
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return
+    torch.set_num_threads(threads or len(cpus))
+    try:
+        torch.set_num_interop_threads(interop_threads)
+    except RuntimeError:
+        # Only allowed before the inter-op pool starts; the parent never uses it
+        pass
+
+
+class WorkerProcess:
+    def __init__(self, index, pid, sock, cpus):
+        """Parent-side handle of one forked worker"""
+        self.index = index
+        self.pid = pid
+        self.sock = sock
+        self.cpus = cpus
+        self.alive = True
+        self.in_flight = 0
+        self.handled = 0
+        self._reader = sock.makefile("r", encoding="utf-8")
+        self._write_lock = threading.Lock()
+        self._pending = {}
+        self._next_seq = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start reading responses; only once every worker has been forked"""
+        threading.Thread(target=self._read_loop, name=f"prefork-reader-{self.index}", daemon=True).start()
+
+    def submit(self, request, emit=None):
+        """Send a request; the Future resolves to the worker's result"""
+        future = Future()
+        with self._lock:
+            if not self.alive:
+                raise RuntimeError(f"Worker {self.index} has exited")
+            self._next_seq += 1
+            seq = self._next_seq
+            self._pending[seq] = (future, emit)
+            self.in_flight += 1
+        line = json.dumps({"seq": seq, "request": request}) + "\n"
+        try:
+            with self._write_lock:
+                self.sock.sendall(line.encode("utf-8"))
+        except OSError:
+            with self._lock:
+                if self._pending.pop(seq, None) is not None:
+                    self.in_flight -= 1
+            raise
+        return future
+
+    def _read_loop(self):
+        for line in self._reader:
+            message = json.loads(line)
+            with self._lock:
+                if message.get("event"):
+                    entry = self._pending.get(message["seq"])
+                else:
+                    entry = self._pending.pop(message["seq"], None)
+                    self.in_flight -= 1
+                    self.handled += 1
+            if entry is None:
+                continue
+            future, emit = entry
+            if message.get("event"):
+                if emit is not None:
+                    emit(message["event"])
+            else:
+                future.set_result(message["result"])
+
+        # EOF: the worker exited; fail whatever it still owed
+        with self._lock:
+            self.alive = False
+            pending, self._pending = self._pending, {}
+            self.in_flight = 0
+        for future, _ in pending.values():
+            future.set_result({"success": False, "error": f"Worker {self.index} exited"})
+
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_WR)
+        except OSError:
+            pass
+
+    def stats(self):
+        memory = memory_rollup(self.pid) if self.alive else None
+        return {
+            "pid": self.pid,
+            "alive": self.alive,
+            "cpus": sorted(self.cpus),
+            "inFlight": self.in_flight,
+            "handled": self.handled,
+            "rssMb": round(memory["Rss"] / 2 ** 20, 1) if memory else None,
+            "pssMb": round(memory["Pss"] / 2 ** 20, 1) if memory else None,
+            "privateMb": round((memory["Private_Clean"] + memory["Private_Dirty"]) / 2 ** 20, 1)
+            if memory else None,
+        }
+
+
+def _serve_worker(service, sock, concurrency):
+    """Child side: analyze requests from the parent until it closes the socket"""
+    reader = sock.makefile("r", encoding="utf-8")
+    write_lock = threading.Lock()
+
+    def send(message):
+        line = json.dumps(message) + "\n"
+        with write_lock:
+            sock.sendall(line.encode("utf-8"))
+
+    def process(seq, request):
+        def emit(event):
+            send({"seq": seq, "event": event})
+        try:
+            result = service.analyze(request, emit=emit)
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        send({"seq": seq, "result": result})
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="prefork-worker") as pool:
+        for line in reader:
+            message = json.loads(line)
+            pool.submit(process, message["seq"], message["request"])
+
+
+class PreforkPool:
+    def __init__(self, service, workers, threads_per_worker=None, interop_threads=1, concurrency=1):
+        """
+        Fork `workers` children of an already started service. Each gets an
+        equal slice of this process's CPUs, threads_per_worker torch intra-op
+        threads (default: one per CPU of its slice) and interop_threads inter-op
+        threads, and analyzes up to `concurrency` requests at once.
+        """
+        self.service = service
+        self.workers = []
+        freeze_for_fork(service.analyzer)
+
+        for index, cpus in enumerate(split_cpus(workers)):
+            parent_sock, child_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+            pid = os.fork()
+            if pid == 0:
+                parent_sock.close()
+                for worker in self.workers:
+                    worker.sock.close()
+                self._run_child(index, child_sock, cpus, threads_per_worker, interop_threads, concurrency)
+            child_sock.close()
+            self.workers.append(WorkerProcess(index, pid, parent_sock, cpus))
+        for worker in self.workers:
+            worker.start()
+        print(f"✅ Forked {workers} analyzer workers", file=sys.stderr)
+
+    def _run_child(self, index, sock, cpus, threads, interop_threads, concurrency):
+        code = 0
+        try:
+            # The protocol belongs to the parent: no stdin, stray writes go to stderr
+            devnull = os.open(os.devnull, os.O_RDONLY)
+            os.dup2(devnull, 0)
+            os.dup2(2, 1)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            _pin_worker(cpus, threads, interop_threads)
+            self.service.analyzer.after_fork()
+            if self.service.warmup:
+                self.service.analyzer.warm_up()
+            _serve_worker(self.service, sock, concurrency)
+        except Exception as e:
+            print(f"Prefork worker {index} failed: {e}", file=sys.stderr)
+            code = 1
+        finally:
+            # Skip the parent's cleanup (atexit hooks, spatial index saves)
+            os._exit(code)
+
+    def analyze(self, request, emit=None):
+        """Run a request on the least busy live worker"""
+        alive = [worker for worker in self.workers if worker.alive]
+        if not alive:
+            return {"success": False, "error": "All analyzer workers have exited"}
+        worker = min(alive, key=lambda w: w.in_flight)
+        try:
+            return worker.submit(request, emit).result()
+        except (OSError, RuntimeError) as e:
+            return {"success": False, "error": str(e)}
+
+    def close(self):
+        """Let the workers drain and exit"""
+        for worker in self.workers:
+            worker.close()
+        for worker in self.workers:
+            try:
+                os.waitpid(worker.pid, 0)
+            except ChildProcessError:
+                pass
+
+    def stats(self):
+        """Per-worker state plus RSS vs PSS totals of the whole process tree"""
+        workers = [worker.stats() for worker in self.workers]
+        parent = memory_rollup() or {}
+        total_rss = parent.get("Rss", 0) + sum((w["rssMb"] or 0) * 2 ** 20 for w in workers)
+        total_pss = parent.get("Pss", 0) + sum((w["pssMb"] or 0) * 2 ** 20 for w in workers)
+        return {
+            "workers": workers,
+            "parentRssMb": round(parent["Rss"] / 2 ** 20, 1) if parent else None,
+            "parentPssMb": round(parent["Pss"] / 2 ** 20, 1) if parent else None,
+            # RSS double-counts shared pages; the gap to PSS is what sharing saves
+            "totalRssMb": round(total_rss / 2 ** 20, 1),
+            "totalPssMb": round(total_pss / 2 ** 20, 1),
+            "sharedSavingsMb": round((total_rss - total_pss) / 2 ** 20, 1),
+        }
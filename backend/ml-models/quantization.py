@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Quantized Models
+Int8 dynamic quantization of the Linear layers of BLIP and Whisper for CPU
+inference, with the quantized modules cached on disk so startup does not
+re-quantize them
+
+Cache entries are keyed on the files the fp32 model was built from (pinned
+directory or hub snapshot), so a re-pin, a local model swap or a new hub
+revision re-quantizes instead of loading stale weights.
+"""
+
+import glob
+import hashlib
+import os
+import re
+import sys
+
+from model_loader import BLIP_MODEL_NAME, WHISPER_MODEL_NAME, resolve_pinned
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "civic-analyzer", "quantized")
+
+
+def quantize_linear(model):
+    """Dynamically quantize every nn.Linear to int8 weights"""
+    import torch
+
+    model.eval()
+    return torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def source_dir(source):
+    """Local directory with the files of source: source itself, or its hub cache snapshot"""
+    if os.path.isdir(source):
+        return source
+    try:
+        from huggingface_hub import try_to_load_from_cache
+    except ImportError:
+        return None
+    config = try_to_load_from_cache(source, "config.json")
+    # Snapshot directories are named by commit, so a new revision changes the path
+    return os.path.dirname(config) if isinstance(config, str) else None
+
+
+def source_fingerprint(source):
+    """
+    Short hash of the source directory's path and the name, size and mtime
+    of its weight and config files, or None if source is not available
+    locally. File metadata rather than content keeps startup from reading
+    gigabytes of weights; any re-pin or swap rewrites the files.
+    """
+    directory = source_dir(source)
+    if directory is None:
+        return None
+    digest = hashlib.sha256(os.path.realpath(directory).encode("utf-8"))
+    for name in sorted(os.listdir(directory)):
+        if name.endswith((".safetensors", ".bin", ".json")):
+            stat = os.stat(os.path.join(directory, name))
+            digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def cache_path(model_name, fingerprint, cache_dir=None):
+    """Cache file for a model built from the source with this fingerprint; keyed on
+    the torch version too since pickles are not portable"""
+    import torch
+
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "--", model_name)
+    return os.path.join(cache_dir or DEFAULT_CACHE_DIR,
+                        f"{safe_name}-{fingerprint}-torch{torch.__version__}-int8.pt")
+
+
+def load_or_quantize(model_name, build_model, cache_dir=None, source=None):
+    """Load the cached int8 module, or build the fp32 model, quantize and cache it"""
+    import torch
+
+    source = source or model_name
+    fingerprint = source_fingerprint(source)
+    path = cache_path(model_name, fingerprint, cache_dir) if fingerprint else None
+    if path and os.path.exists(path):
+        try:
+            model = torch.load(path, weights_only=False)
+            model.eval()
+            return model
+        except Exception as e:
+            print(f"Ignoring unreadable quantized cache {path}: {e}", file=sys.stderr)
+
+    print(f"Quantizing {model_name} to int8...", file=sys.stderr)
+    model = quantize_linear(build_model())
+
+    # A first hub download only has a snapshot to fingerprint once built
+    fingerprint = fingerprint or source_fingerprint(source)
+    if fingerprint is None:
+        print(f"Not caching quantized {model_name}: its source files are not local", file=sys.stderr)
+        return model
+    path = cache_path(model_name, fingerprint, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    torch.save(model, tmp_path)
+    os.replace(tmp_path, path)
+    # Entries for earlier sources of this model can never be loaded again
+    for stale in glob.glob(cache_path(model_name, "*", cache_dir)):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return model
+
+
+def load_blip_quantized(model_name=BLIP_MODEL_NAME, cache_dir=None, model_dir=None):
+    """BLIP processor plus the int8 captioning model (read from model_dir if pinned)"""
+    from transformers import BlipProcessor, BlipForConditionalGeneration
+
+    source = resolve_pinned(model_name, model_dir) if model_dir else model_name
+    processor = BlipProcessor.from_pretrained(source, local_files_only=bool(model_dir))
+    model = load_or_quantize(
+        model_name,
+        lambda: BlipForConditionalGeneration.from_pretrained(source, local_files_only=bool(model_dir)),
+        cache_dir,
+        source=source
+    )
+    return processor, model
+
+
+def load_whisper_quantized(model_name=WHISPER_MODEL_NAME, cache_dir=None, model_dir=None):
+    """Whisper ASR pipeline running the int8 model (read from model_dir if pinned)"""
+    from transformers import AutoFeatureExtractor, AutoTokenizer, WhisperForConditionalGeneration, pipeline
+
+    source = resolve_pinned(model_name, model_dir) if model_dir else model_name
+    model = load_or_quantize(
+        model_name,
+        lambda: WhisperForConditionalGeneration.from_pretrained(source, local_files_only=bool(model_dir)),
+        cache_dir,
+        source=source
+    )
+    return pipeline(
+        "automatic-speech-recognition",
+        model=model,
+        tokenizer=AutoTokenizer.from_pretrained(source, local_files_only=bool(model_dir)),
+        feature_extractor=AutoFeatureExtractor.from_pretrained(source, local_files_only=bool(model_dir))
+    )
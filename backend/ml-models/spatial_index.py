@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Spatial Issue Index
+Geohash-bucketed NumPy index of analyzed issues with radius and bounding-box
+queries, plus incremental per-category DBSCAN for hotspot detection
+
+Issues are only ever added, so clustering is updated on insert (Ester et al.,
+"Incremental Clustering for Mining in a Data Warehousing Environment"): the
+new point raises its neighbours' counts, points that reach min_samples become
+core points and are unioned with the core points around them. Clusters can
+only grow or merge, never split, so no re-clustering pass is needed.
+
+State is saved as a single uncompressed .npz file and reloads without
+recomputing geohashes or clusters.
+"""
+
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from geo_utils import EARTH_RADIUS_M, METERS_PER_DEGREE, geohash_cell_size, geohash_encode
+
+# Beyond this many cells a bounding box is answered by one vectorized scan
+MAX_QUERY_CELLS = 4096
+
+
+def haversine_many(lat, lon, lats, lons):
+    """Distances in meters from one point to arrays of points"""
+    phi1 = math.radians(lat)
+    phi2 = np.radians(lats)
+    a = (np.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * np.cos(phi2) * np.sin(np.radians(lons - lon) / 2) ** 2)
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.sqrt(a)))
+
+
+class SpatialIndex:
+    def __init__(self, precision=6, eps_m=100.0, min_samples=5, capacity=1024):
+        """
+        precision is the geohash length of the buckets (6 is ~1.2 x 0.6 km).
+        eps_m and min_samples are the DBSCAN parameters used per category.
+        """
+        self.precision = precision
+        self.eps_m = eps_m
+        self.min_samples = min_samples
+        self.size = 0
+        self.lat = np.empty(capacity, dtype=np.float64)
+        self.lon = np.empty(capacity, dtype=np.float64)
+        self.category = np.empty(capacity, dtype=np.int32)
+        self.added = np.empty(capacity, dtype=np.float64)
+        self.neighbor_count = np.zeros(capacity, dtype=np.int32)
+        self.parent = np.empty(capacity, dtype=np.int64)   # union-find over core points
+        self.border_of = np.full(capacity, -1, dtype=np.int64)  # a core neighbour of a border point
+        self.ids = []
+        self.cells = []
+        self.categories = []
+        self._category_codes = {}
+        self._buckets = {}
+        self._row_of_id = {}
+        self._lock = threading.Lock()
+
+    # -- storage -----------------------------------------------------------
+
+    def _grow(self):
+        capacity = self.lat.size * 2
+        for name in ("lat", "lon", "category", "added", "neighbor_count", "parent"):
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            setattr(self, name, grown)
+        grown = np.full(capacity, -1, dtype=np.int64)
+        grown[:self.size] = self.border_of[:self.size]
+        self.border_of = grown
+
+    def _category_code(self, category):
+        code = self._category_codes.get(category)
+        if code is None:
+            code = self._category_codes[category] = len(self.categories)
+            self.categories.append(category)
+        return code
+
+    def __len__(self):
+        return self.size
+
+    # -- queries -----------------------------------------------------------
+
+    def _cells_for_box(self, min_lat, min_lon, max_lat, max_lon):
+        """Bucket keys covering a box, or None if a full scan is cheaper"""
+        height, width = geohash_cell_size(self.precision)
+        rows = int((max_lat - min_lat) / height) + 2
+        cols = int((max_lon - min_lon) / width) + 2
+        if rows * cols > MAX_QUERY_CELLS:
+            return None
+        cells = set()
+        for row in range(rows):
+            lat = min(max_lat, min_lat + row * height)
+            for col in range(cols):
+                lon = min(max_lon, min_lon + col * width)
+                cells.add(geohash_encode(lat, lon, self.precision))
+        return cells
+
+    def _candidates(self, min_lat, min_lon, max_lat, max_lon):
+        cells = self._cells_for_box(min_lat, min_lon, max_lat, max_lon)
+        if cells is None:
+            return np.arange(self.size)
+        rows = [self._buckets[cell] for cell in cells if cell in self._buckets]
+        if not rows:
+            return np.empty(0, dtype=np.int64)
+        return np.fromiter((row for bucket in rows for row in bucket), dtype=np.int64)
+
+    def _radius_rows(self, lat, lon, radius_m, category_code=None):
+        d_lat = radius_m / METERS_PER_DEGREE
+        d_lon = radius_m / (METERS_PER_DEGREE * max(math.cos(math.radians(lat)), 1e-6))
+        rows = self._candidates(max(-90.0, lat - d_lat), max(-180.0, lon - d_lon),
+                                min(90.0, lat + d_lat), min(180.0, lon + d_lon))
+        if category_code is not None and rows.size:
+            rows = rows[self.category[rows] == category_code]
+        if not rows.size:
+            return rows, np.empty(0)
+        distances = haversine_many(lat, lon, self.lat[rows], self.lon[rows])
+        keep = distances <= radius_m
+        return rows[keep], distances[keep]
+
+    def _describe(self, row, distance=None):
+        item = {
+            "id": self.ids[row],
+            "lat": float(self.lat[row]),
+            "lng": float(self.lon[row]),
+            "category": self.categories[self.category[row]],
+            "addedAt": float(self.added[row]),
+        }
+        if distance is not None:
+            item["distanceMeters"] = round(float(distance), 1)
+        return item
+
+    def radius(self, lat, lon, radius_m, category=None, limit=None):
+        """Issues within radius_m, nearest first"""
+        with self._lock:
+            code = self._category_codes.get(category) if category is not None else None
+            if category is not None and code is None:
+                return []
+            rows, distances = self._radius_rows(lat, lon, radius_m, code)
+            order = np.argsort(distances, kind="stable")[:limit]
+            return [self._describe(rows[i], distances[i]) for i in order]
+
+    def bbox(self, min_lat, min_lon, max_lat, max_lon, category=None, limit=None):
+        """Issues inside a bounding box"""
+        with self._lock:
+            rows = self._candidates(min_lat, min_lon, max_lat, max_lon)
+            if rows.size:
+                lats, lons = self.lat[rows], self.lon[rows]
+                rows = rows[(lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)]
+            if category is not None:
+                code = self._category_codes.get(category)
+                rows = rows[self.category[rows] == code] if code is not None else rows[:0]
+            rows = np.sort(rows)[:limit]
+            return [self._describe(row) for row in rows]
+
+    # -- incremental DBSCAN -----------------------------------------------
+
+    def _find(self, row):
+        root = row
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[row] != root:
+            self.parent[row], row = root, self.parent[row]
+        return root
+
+    def _union(self, a, b):
+        root_a, root_b = self._find(a), self._find(b)
+        if root_a != root_b:
+            self.parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    def _is_core(self, row):
+        return self.neighbor_count[row] >= self.min_samples
+
+    def _promote(self, row):
+        """row just became a core point: merge with nearby cores, claim nearby borders"""
+        neighbours, _ = self._radius_rows(self.lat[row], self.lon[row], self.eps_m, self.category[row])
+        for other in neighbours:
+            if other == row:
+                continue
+            if self._is_core(other):
+                self._union(row, other)
+            elif self.border_of[other] < 0:
+                self.border_of[other] = row
+
+    def add(self, issue_id, lat, lon, category, added=None):
+        """Index an issue and update the clusters of its category; re-adding an id is a no-op"""
+        with self._lock:
+            if issue_id in self._row_of_id:
+                return self._row_of_id[issue_id]
+            if self.size == self.lat.size:
+                self._grow()
+
+            row = self.size
+            code = self._category_code(category)
+            cell = geohash_encode(lat, lon, self.precision)
+            self.lat[row], self.lon[row] = lat, lon
+            self.category[row] = code
+            self.added[row] = time.time() if added is None else added
+            self.parent[row] = row
+            self.border_of[row] = -1
+            self.ids.append(issue_id)
+            self.cells.append(cell)
+            self._buckets.setdefault(cell, []).append(row)
+            self._row_of_id[issue_id] = row
+            self.size += 1
+
+            neighbours, _ = self._radius_rows(lat, lon, self.eps_m, code)
+            self.neighbor_count[row] = neighbours.size
+            others = neighbours[neighbours != row]
+            was_core = self.neighbor_count[others] >= self.min_samples
+            self.neighbor_count[others] += 1
+
+            promoted = [int(other) for other, core in zip(others, was_core)
+                        if not core and self._is_core(other)]
+            if self._is_core(row):
+                promoted.append(row)
+            for core in promoted:
+                self._promote(core)
+
+            if not self._is_core(row) and self.border_of[row] < 0:
+                for other in others:
+                    if self._is_core(other):
+                        self.border_of[row] = other
+                        break
+            return row
+
+    def _labels(self, code=None):
+        """Cluster root per row (-1 for noise), optionally for one category"""
+        rows = np.arange(self.size)
+        if code is not None:
+            rows = rows[self.category[:self.size] == code]
+        labels = np.full(self.size, -1, dtype=np.int64)
+        for row in rows:
+            if self._is_core(row):
+                labels[row] = self._find(row)
+            elif self.border_of[row] >= 0:
+                labels[row] = self._find(self.border_of[row])
+        return labels
+
+    def hotspots(self, category=None, min_size=None, limit=None, max_ids=50):
+        """Clusters, largest first, with centroid, spread and member ids"""
+        with self._lock:
+            code = None
+            if category is not None:
+                code = self._category_codes.get(category)
+                if code is None:
+                    return []
+            labels = self._labels(code)
+            clustered = np.flatnonzero(labels >= 0)
+            if not clustered.size:
+                return []
+
+            roots, members = np.unique(labels[clustered], return_inverse=True)
+            spots = []
+            for index, root in enumerate(roots):
+                rows = clustered[members == index]
+                if min_size and rows.size < min_size:
+                    continue
+                lats, lons = self.lat[rows], self.lon[rows]
+                center_lat, center_lon = float(lats.mean()), float(lons.mean())
+                spread = haversine_many(center_lat, center_lon, lats, lons)
+                spots.append({
+                    "clusterId": int(root),
+                    "category": self.categories[self.category[root]],
+                    "size": int(rows.size),
+                    "center": {"lat": center_lat, "lng": center_lon},
+                    "geohash": geohash_encode(center_lat, center_lon, self.precision),
+                    "radiusMeters": round(float(spread.max()), 1),
+                    "bbox": [float(lats.min()), float(lons.min()), float(lats.max()), float(lons.max())],
+                    "firstReportedAt": float(self.added[rows].min()),
+                    "lastReportedAt": float(self.added[rows].max()),
+                    "ids": [self.ids[row] for row in rows[:max_ids]],
+                })
+            spots.sort(key=lambda spot: spot["size"], reverse=True)
+            return spots[:limit]
+
+    def stats(self):
+        with self._lock:
+            counts = np.bincount(self.category[:self.size], minlength=len(self.categories))
+            return {
+                "issues": self.size,
+                "buckets": len(self._buckets),
+                "geohashPrecision": self.precision,
+                "epsMeters": self.eps_m,
+                "minSamples": self.min_samples,
+                "categories": {name: int(count) for name, count in zip(self.categories, counts)},
+                "corePoints": int((self.neighbor_count[:self.size] >= self.min_samples).sum()),
+            }
+
+    # -- persistence -------------------------------------------------------
+
+    def save(self, path):
+        """Write the whole index to one .npz file (atomically)"""
+        with self._lock:
+            n = self.size
+            tmp_path = f"{path}.tmp.npz"
+            np.savez(
+                tmp_path,
+                params=np.array([self.precision, self.eps_m, self.min_samples], dtype=np.float64),
+                lat=self.lat[:n], lon=self.lon[:n], category=self.category[:n], added=self.added[:n],
+                neighbor_count=self.neighbor_count[:n], parent=self.parent[:n], border_of=self.border_of[:n],
+                ids=np.array(self.ids, dtype=str), cells=np.array(self.cells, dtype=str),
+                categories=np.array(self.categories, dtype=str),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Restore an index written by save()"""
+        with np.load(path, allow_pickle=False) as data:
+            precision, eps_m, min_samples = data["params"]
+            n = data["lat"].size
+            index = cls(int(precision), float(eps_m), int(min_samples), capacity=max(1024, n))
+            for name in ("lat", "lon", "category", "added", "neighbor_count", "parent", "border_of"):
+                getattr(index, name)[:n] = data[name]
+            index.size = n
+            index.ids = data["ids"].tolist()
+            index.cells = data["cells"].tolist()
+            index.categories = data["categories"].tolist()
+
+        index._category_codes = {name: code for code, name in enumerate(index.categories)}
+        index._row_of_id = {issue_id: row for row, issue_id in enumerate(index.ids)}
+        if n:
+            cells, inverse = np.unique(np.array(index.cells), return_inverse=True)
+            order = np.argsort(inverse, kind="stable")
+            bounds = np.searchsorted(inverse[order], np.arange(cells.size + 1))
+            index._buckets = {str(cell): order[bounds[i]:bounds[i + 1]].tolist()
+                              for i, cell in enumerate(cells)}
+        return index
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Analyzer server protocol test: malformed requests get an error response and
+the server keeps answering the requests after them
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def serve(lines):
+    """Responses, by id, of a tiny-model server fed these request lines"""
+    process = subprocess.run(
+        [sys.executable, os.path.join(HERE, "analyzer_server.py"),
+         "--caption-backend", "tiny", "--speech-backend", "tiny"],
+        input="".join(json.dumps(line) + "\n" for line in lines),
+        capture_output=True, text=True, cwd=HERE, timeout=120,
+    )
+    assert process.returncode == 0, process.stderr
+    messages = [json.loads(line) for line in process.stdout.splitlines() if line.strip()]
+    return {message["id"]: message for message in messages if "id" in message}
+
+
+@pytest.mark.parametrize("deadline", ["abc", {}, [], -5, float("nan"), True])
+def test_invalid_deadline_does_not_stop_server(deadline):
+    responses = serve([
+        {"id": 1, "text": "road pe gaddha", "deadlineMs": deadline},
+        {"id": 2, "text": "paani ka pipe leak ho raha hai"},
+    ])
+    assert responses[1]["success"] is False
+    assert responses[1]["error"] == "invalid deadlineMs"
+    assert responses[2]["success"] is True
+    assert responses[2]["data"]["problemIdentified"] == "Water Leakage / Pipeline Issue"
+
+
+def test_valid_deadline_is_accepted():
+    responses = serve([{"id": 1, "text": "kooda pada hai", "deadlineMs": 30000}])
+    assert responses[1]["success"] is True
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Batch analysis input and resume checks that run without a worker pool
+"""
+
+import json
+
+import pytest
+
+from batch_analyze import iter_complaints, run_batch, save_checkpoint
+
+
+def test_non_object_records_become_errors(tmp_path):
+    source = tmp_path / "complaints.jsonl"
+    source.write_text('{"id": "a", "text": "pothole"}\n[1, 2]\n"text"\n\nnot json\n')
+
+    records = list(iter_complaints(str(source)))
+    assert records[0] == {"id": "a", "text": "pothole"}
+    assert [r["_error"] for r in records[1:3]] == ["Invalid JSON on line 2: complaint must be an object",
+                                                  "Invalid JSON on line 3: complaint must be an object"]
+    assert records[3]["_error"].startswith("Invalid JSON on line 5:")
+
+
+def test_non_object_file_keeps_its_id(tmp_path):
+    (tmp_path / "c1.json").write_text("42")
+
+    (record,) = iter_complaints(str(tmp_path))
+    assert record == {"_error": "Invalid JSON in c1.json: complaint must be an object", "id": "c1"}
+
+
+@pytest.mark.parametrize("existing", [None, b"", b'{"index": 0}\n'])
+def test_resume_refuses_missing_or_short_output(tmp_path, existing):
+    source = tmp_path / "complaints.jsonl"
+    source.write_text(json.dumps({"text": "pothole"}) + "\n")
+    output = tmp_path / "results.jsonl"
+    if existing is not None:
+        output.write_bytes(existing)
+    save_checkpoint(f"{output}.ckpt", {"source": str(source), "processed": 5, "outputBytes": 500})
+
+    with pytest.raises(ValueError, match="Cannot resume"):
+        run_batch(str(source), str(output), workers=1, resume=True)
+    # The output is left as it was, not truncated or padded
+    assert (output.read_bytes() if output.exists() else None) == existing
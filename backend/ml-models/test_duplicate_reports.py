@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Duplicate report test: a repeat photo reuses the earlier report's analysis
+but never another reporter's complaint text
+"""
+
+import base64
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from enhanced_civic_analyzer import EnhancedCivicAnalyzer
+
+LOCATION = "28.6139, 77.2090"
+
+
+@pytest.fixture
+def analyzer():
+    return EnhancedCivicAnalyzer(caption_backend="tiny", speech_backend="tiny", dedup=True,
+                                 caption_cache_size=0)
+
+
+@pytest.fixture(scope="module")
+def photo():
+    pixels = (np.random.RandomState(0).rand(64, 64, 3) * 255).astype("uint8")
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, "PNG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def test_duplicate_does_not_copy_earlier_complaint_text(analyzer, photo):
+    first = analyzer.analyze_civic_issue(image_data=photo, text="Asha from flat 4B: gaddha", location=LOCATION)
+    assert "reportId" in first["data"]
+
+    image_only = analyzer.analyze_civic_issue(image_data=photo, location=LOCATION)["data"]
+    assert image_only["duplicateOf"]["reportId"] == first["data"]["reportId"]
+    assert "Asha" not in image_only["complaintText"]
+    assert image_only["complaintText"] == f"Issue detected from image analysis: {image_only['imageCaption']}"
+
+    typed = analyzer.analyze_civic_issue(image_data=photo, text="road pe gaddha", location=LOCATION)["data"]
+    assert typed["complaintText"] == "road pe pothole"
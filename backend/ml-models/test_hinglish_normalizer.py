@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Hinglish normalizer test: phrases are consumed whole, so the single-word
+expansions ("light" -> "streetlight", "stop" -> "bus stop") never double up
+"""
+
+import pytest
+
+from enhanced_civic_analyzer import EnhancedCivicAnalyzer
+from hinglish_normalizer import HinglishNormalizer
+
+normalize = EnhancedCivicAnalyzer.normalizer.normalize
+
+
+@pytest.mark.parametrize("text,expected", [
+    ("street light kharab hai", "streetlight damaged hai"),
+    ("Street  Light band", "streetlight band"),
+    ("bus stop pe bheed", "bus stop pe bheed"),
+    ("traffic signal band hai", "traffic signal band hai"),
+    ("traffic light not working", "traffic light not working"),
+    ("signal light toota", "traffic signal toota"),
+    ("light bulb fuse ho gaya", "light bulb fuse ho gaya"),
+    ("water tap leak", "water tap leakage"),
+    ("air cooler kharab", "air cooler damaged"),
+    # Single words still expand on their own
+    ("light nahi hai", "streetlight nahi hai"),
+    ("stop ke paas", "bus stop ke paas"),
+    ("signal band", "traffic signal band"),
+])
+def test_phrases(text, expected):
+    assert normalize(text) == expected
+
+
+def test_no_cascade_or_partial_words():
+    assert normalize("light") == "streetlight"
+    assert normalize("laptop") == "laptop"
+
+
+def test_longest_phrase_wins():
+    normalizer = HinglishNormalizer({"a": "x", "a b": "y", "a b c": "z"})
+    assert normalizer.normalize("a b c d") == "z d"
+    assert normalizer.normalize("a b d") == "y d"
+    assert normalizer.normalize("a,b") == "x,b"
+    assert normalizer.normalize_many(["a", "b"]) == ["x", "b"]
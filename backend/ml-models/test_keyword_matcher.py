@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Keyword matcher regression test: on a fixed set of complaints the compiled
+matcher must pick exactly the category and priority the original
+substring checks picked (recorded below from that implementation)
+"""
+
+import pytest
+
+from enhanced_civic_analyzer import EnhancedCivicAnalyzer, PROBLEM_KEYWORDS
+
+SAMPLES = [
+    ("There are potholes all over the main road", "Pothole / Road Damage", "MEDIUM"),
+    ("road is damaged near the school", "Pothole / Road Damage", "MEDIUM"),
+    ("sadak kharab hai", "Pothole / Road Damage", "MEDIUM"),
+    ("sadak tuta hua hai", "Pothole / Road Damage", "HIGH"),
+    ("road broken near the bus stand", "Pothole / Road Damage", "HIGH"),
+    ("kooda aur gaddha dono hain", "Pothole / Road Damage", "MEDIUM"),
+    ("gaddha bahut bada hai, accident ho sakta hai", "Pothole / Road Damage", "HIGH"),
+    ("dangerous pothole near hospital", "Pothole / Road Damage", "HIGH"),
+    ("streetlights not working in our colony", "Streetlight / Electrical Issue", "HIGH"),
+    ("street light not working since a week", "Streetlight / Electrical Issue", "HIGH"),
+    ("street light kharab hai", "Streetlight / Electrical Issue", "HIGH"),
+    ("lights are off in the park at night", "Streetlight / Electrical Issue", "HIGH"),
+    ("bijli nahi hai do din se", "Streetlight / Electrical Issue", "HIGH"),
+    ("urgent: electrical wire falling on the road", "Streetlight / Electrical Issue", "HIGH"),
+    ("drains are blocked and overflowing", "Drainage Issue", "MEDIUM"),
+    ("the drainage is clogged", "Drainage Issue", "MEDIUM"),
+    ("nala jam ho gaya hai, bahut ganda", "Drainage Issue", "MEDIUM"),
+    ("paani ka pipe leak ho raha hai", "Water Leakage / Pipeline Issue", "HIGH"),
+    ("leaking pipeline on the street", "Water Leakage / Pipeline Issue", "HIGH"),
+    ("water logging after rain in the colony", "Water Leakage / Pipeline Issue", "HIGH"),
+    ("toilet is dirty and no water", "Water Leakage / Pipeline Issue", "HIGH"),
+    ("garbage dumped near the market, very dirty", "Garbage / Sanitation Issue", "LOW"),
+    ("kooda pada hai gali mein", "Garbage / Sanitation Issue", "LOW"),
+    ("traffic signal not working at the junction", "Traffic / Signal Issue", "HIGH"),
+    ("traffic signal not working near bus stop", "Traffic / Signal Issue", "HIGH"),
+    ("park benches broken and trees falling", "Park / Public Space Issue", "HIGH"),
+    ("buses are always late", "Public Transport Issue", "LOW"),
+    ("bus stop shelter damaged", "Public Transport Issue", "LOW"),
+    ("auto rickshaw stand is crowded", "Public Transport Issue", "LOW"),
+]
+
+
+@pytest.fixture(scope="module")
+def analyzer():
+    return EnhancedCivicAnalyzer(caption_cache_size=0)
+
+
+@pytest.mark.parametrize("complaint,category,priority", SAMPLES)
+def test_matches_substring_baseline(analyzer, complaint, category, priority):
+    text = analyzer.normalize_text(complaint)
+    hits = analyzer.keyword_hits("", text)
+
+    problem = analyzer.identify_problem("", text, hits=hits)
+    assert problem == category
+    assert analyzer.determine_priority(problem, "", text, hits=hits) == priority
+
+
+def test_word_start_required(analyzer):
+    # The false hits the matcher exists to avoid: keywords inside unrelated
+    # words, or inside another category's keyword
+    assert analyzer.keyword_hits("", "insaf chahiye")["categories"]["Garbage / Sanitation Issue"] == 0
+    assert analyzer.keyword_hits("", "flashlight")["keywords"] == []
+    water = "Water Leakage / Pipeline Issue"
+    assert "nal" in PROBLEM_KEYWORDS[water]
+    assert analyzer.keyword_hits("", "signal")["categories"][water] == 0
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Silence trimming test: inner pauses up to max_pause_s are kept whole,
+longer ones are shortened to max_pause_s, so the kept pause never shrinks
+as the real pause grows
+"""
+
+import numpy as np
+import pytest
+
+from vad import trim_silence
+
+RATE = 16000
+FRAME_MS = 30
+MAX_PAUSE_S = 0.6
+
+
+def tone(seconds):
+    t = np.arange(int(round(seconds * RATE))) / RATE
+    return 0.5 * np.sin(2 * np.pi * 200 * t)
+
+
+def kept_pause(pause_s):
+    """Seconds of the pause between two 0.51 s tones that survive trimming"""
+    audio = np.concatenate((tone(0.51), np.zeros(int(round(pause_s * RATE))), tone(0.51)))
+    trimmed, _ = trim_silence(audio, RATE, frame_ms=FRAME_MS, padding_ms=0, max_pause_s=MAX_PAUSE_S)
+    return trimmed.size / RATE - 1.02
+
+
+@pytest.mark.parametrize("pause_s,expected_s", [
+    (0.57, 0.57),  # just below max_pause_s: kept whole
+    (0.60, 0.60),  # at max_pause_s: kept whole
+    (0.63, 0.60),  # just above: shortened to max_pause_s
+    (1.50, 0.60),
+])
+def test_inner_pauses(pause_s, expected_s):
+    assert kept_pause(pause_s) == pytest.approx(expected_s, abs=1e-3)
+
+
+def test_kept_pause_is_monotonic():
+    pauses = [0.09, 0.3, 0.57, 0.6, 0.63, 0.9, 1.2]
+    kept = [kept_pause(pause) for pause in pauses]
+    assert kept == sorted(kept)
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Text Classifier
+Hashing vectorizer plus a calibrated linear model over the image caption and
+normalized complaint text, predicting the problem category
+
+The vectorizer is stateless, so the saved model is just the (sparse) linear
+weights and their sigmoid calibrators: it unpickles in milliseconds once
+scikit-learn is imported, and a whole batch is classified with one sparse
+matrix product. Keyword rules stay the fallback when no model is configured
+or the model is unsure.
+
+Training data is JSONL with a label and the text to learn from, e.g. the
+output of batch_analyze.py after reviewers corrected problemIdentified:
+    python text_classifier.py train labelled.jsonl classifier.pkl
+    python text_classifier.py predict classifier.pkl "paani ka pipe leak ho raha hai"
+"""
+
+import argparse
+import json
+import os
+import pickle
+import sys
+import time
+
+FORMAT_VERSION = 1
+
+# Hashed feature space; 2**18 columns keeps collisions rare for complaint-sized texts
+N_FEATURES = 2 ** 18
+
+
+def make_vectorizer():
+    """Word unigrams/bigrams plus character n-grams, which absorb Hinglish spelling variants"""
+    from sklearn.pipeline import FeatureUnion
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    return FeatureUnion([
+        ("words", HashingVectorizer(n_features=N_FEATURES, ngram_range=(1, 2), alternate_sign=False,
+                                    norm="l2", lowercase=True)),
+        ("chars", HashingVectorizer(n_features=N_FEATURES, analyzer="char_wb", ngram_range=(3, 5),
+                                    alternate_sign=False, norm="l2", lowercase=True)),
+    ])
+
+
+def join_fields(caption, text):
+    """The single document a report is classified from"""
+    return f"{caption or ''} {text or ''}".strip()
+
+
+class TextClassifier:
+    def __init__(self, model, labels, trained_at=None, samples=None):
+        """Use TextClassifier.train() or TextClassifier.load() to build one"""
+        self.vectorizer = make_vectorizer()
+        self.model = model
+        self.labels = [str(label) for label in labels]
+        self.trained_at = trained_at
+        self.samples = samples
+
+    @classmethod
+    def train(cls, documents, labels, C=1.0, calibration_folds=3):
+        """
+        Fit a linear SVM with sigmoid (Platt) calibration. With ensemble=False
+        a single SVM is fitted on all data and the calibrators on
+        cross-validated decision values, so prediction costs one product.
+        """
+        from collections import Counter
+
+        from sklearn.calibration import CalibratedClassifierCV
+        from sklearn.svm import LinearSVC
+
+        counts = Counter(labels)
+        if len(counts) < 2:
+            raise ValueError("Training data needs at least two categories")
+        folds = min(calibration_folds, min(counts.values()))
+        if folds < 2:
+            rare = sorted(label for label, count in counts.items() if count < 2)
+            raise ValueError(f"Every category needs at least two examples: {rare}")
+
+        features = make_vectorizer().transform(documents)
+        model = CalibratedClassifierCV(LinearSVC(C=C), method="sigmoid", cv=folds, ensemble=False)
+        model.fit(features, labels)
+        # Hashed columns no training text touched keep zero weight; sparse
+        # weights shrink the pickle from tens of MB to the vocabulary actually seen
+        for calibrated in model.calibrated_classifiers_:
+            calibrated.estimator.sparsify()
+        return cls(model, model.classes_, trained_at=time.time(), samples=len(documents))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        if state.get("format") != FORMAT_VERSION:
+            raise ValueError(f"{path} has classifier format {state.get('format')}, expected {FORMAT_VERSION}")
+        import sklearn
+        if state.get("sklearn") != sklearn.__version__:
+            print(f"⚠️ {path} was trained with scikit-learn {state.get('sklearn')}, "
+                  f"running {sklearn.__version__}")
+        return cls(state["model"], state["labels"], trained_at=state.get("trainedAt"),
+                   samples=state.get("samples"))
+
+    def save(self, path):
+        """Atomically write the model"""
+        import sklearn
+
+        state = {
+            "format": FORMAT_VERSION,
+            "sklearn": sklearn.__version__,
+            "labels": self.labels,
+            "model": self.model,
+            "trainedAt": self.trained_at,
+            "samples": self.samples,
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    def predict_proba(self, documents):
+        """(n_documents, n_labels) calibrated probabilities, columns in self.labels order"""
+        return self.model.predict_proba(self.vectorizer.transform(documents))
+
+    def classify_many(self, documents):
+        """{label: probability} per document"""
+        return [dict(zip(self.labels, row.tolist())) for row in self.predict_proba(documents)]
+
+    def classify(self, document):
+        return self.classify_many([document])[0]
+
+    def stats(self):
+        return {"labels": len(self.labels), "samples": self.samples, "trainedAt": self.trained_at}
+
+
+def read_training_data(path, label_field="problemIdentified", caption_field="imageCaption",
+                       text_field="complaintText"):
+    """(documents, labels) from JSONL records, skipping records without a label or any text"""
+    documents, labels = [], []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            # batch_analyze.py output nests the analysis under "data"
+            if isinstance(record.get("data"), dict):
+                record = record["data"]
+            label = record.get(label_field)
+            document = join_fields(record.get(caption_field), record.get(text_field) or record.get("text"))
+            if label and document:
+                documents.append(document)
+                labels.append(label)
+    return documents, labels
+
+
+def evaluate(classifier, documents, labels):
+    """Accuracy and mean log loss on held-out data"""
+    import numpy as np
+
+    probabilities = classifier.predict_proba(documents)
+    index = {label: i for i, label in enumerate(classifier.labels)}
+    known = [i for i, label in enumerate(labels) if label in index]
+    truth = np.array([index[labels[i]] for i in known])
+    rows = probabilities[known]
+    accuracy = float((rows.argmax(axis=1) == truth).mean()) if known else 0.0
+    log_loss = float(-np.log(np.clip(rows[np.arange(len(known)), truth], 1e-12, 1.0)).mean()) if known else 0.0
+    return {"samples": len(labels), "accuracy": round(accuracy, 4), "logLoss": round(log_loss, 4)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train or query the complaint text classifier")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    train = commands.add_parser("train", help="Fit a classifier on labelled JSONL")
+    train.add_argument("data", help="JSONL with a label plus caption and/or text per line")
+    train.add_argument("output", help="Where to write the pickled classifier")
+    train.add_argument("--label-field", default="problemIdentified")
+    train.add_argument("--caption-field", default="imageCaption")
+    train.add_argument("--text-field", default="complaintText")
+    train.add_argument("--test-fraction", type=float, default=0.2,
+                       help="Share of the data held out for the reported accuracy (0 trains on all of it)")
+    train.add_argument("--C", type=float, default=1.0, help="Inverse regularization strength")
+    train.add_argument("--seed", type=int, default=0)
+
+    predict = commands.add_parser("predict", help="Print category probabilities for texts")
+    predict.add_argument("model")
+    predict.add_argument("texts", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "predict":
+        started = time.perf_counter()
+        classifier = TextClassifier.load(args.model)
+        loaded = time.perf_counter()
+        results = classifier.classify_many(args.texts)
+        print(f"Loaded in {(loaded - started) * 1000:.1f} ms, "
+              f"classified {len(args.texts)} in {(time.perf_counter() - loaded) * 1000:.1f} ms", file=sys.stderr)
+        for text, probabilities in zip(args.texts, results):
+            top = sorted(probabilities.items(), key=lambda item: item[1], reverse=True)[:3]
+            print(json.dumps({"text": text, "top": [{"label": label, "probability": round(p, 4)}
+                                                    for label, p in top]}))
+        return
+
+    documents, labels = read_training_data(args.data, args.label_field, args.caption_field, args.text_field)
+    print(f"Read {len(documents)} labelled documents", file=sys.stderr)
+
+    report = None
+    if args.test_fraction > 0:
+        from sklearn.model_selection import train_test_split
+        train_docs, test_docs, train_labels, test_labels = train_test_split(
+            documents, labels, test_size=args.test_fraction, random_state=args.seed, stratify=labels
+        )
+        report = evaluate(TextClassifier.train(train_docs, train_labels, C=args.C), test_docs, test_labels)
+        print(f"Held-out: {json.dumps(report)}", file=sys.stderr)
+
+    # The saved model is refitted on everything
+    classifier = TextClassifier.train(documents, labels, C=args.C)
+    classifier.save(args.output)
+    print(json.dumps({"output": args.output, "labels": classifier.labels,
+                      "samples": classifier.samples, "heldOut": report}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Tiny Stand-in Models
+Random-weight NumPy replacements for BLIP and Whisper with the same call
+interfaces as the transformers processor/model/pipeline objects
+
+They need no downloads and no torch, so the rest of the pipeline (decoding,
+batching, VAD, normalization, classification) can be benchmarked or smoke
+tested offline. Outputs are deterministic for a given seed but meaningless.
+"""
+
+import numpy as np
+
+# Word pieces the stand-ins emit, biased towards the keyword tables so the
+# classifier sees a realistic mix of hits and misses
+VOCAB = [
+    "<pad>", "<eos>", "a", "the", "of", "on", "in", "with", "near", "street",
+    "road", "pothole", "water", "pipe", "leak", "garbage", "pile", "drain",
+    "streetlight", "pole", "wire", "traffic", "signal", "car", "people",
+    "building", "wall", "tree", "dog", "broken", "dirty", "flooded", "dark",
+    "paani", "sadak", "gaddha", "bijli", "kooda", "nala", "nahi", "hai", "bahut",
+]
+PAD_ID, EOS_ID = 0, 1
+
+
+class TinyBlipProcessor:
+    def __init__(self, image_size=64):
+        self.image_size = image_size
+
+    def __call__(self, images=None, return_tensors=None, **kwargs):
+        if not isinstance(images, (list, tuple)):
+            images = [images]
+        pixels = [
+            np.asarray(image.convert("RGB").resize((self.image_size, self.image_size)), dtype=np.float32)
+            for image in images
+        ]
+        pixel_values = (np.stack(pixels) / 127.5 - 1.0).transpose(0, 3, 1, 2)
+        return {"pixel_values": pixel_values}
+
+    def decode(self, ids, skip_special_tokens=True):
+        words = []
+        for token in np.asarray(ids).tolist():
+            if token == EOS_ID:
+                break
+            if token == PAD_ID and skip_special_tokens:
+                continue
+            words.append(VOCAB[token])
+        return " ".join(words)
+
+    def batch_decode(self, sequences, skip_special_tokens=True):
+        return [self.decode(ids, skip_special_tokens) for ids in sequences]
+
+
+class TinyBlipModel:
+    def __init__(self, image_size=64, patch=8, hidden=128, seed=0):
+        rng = np.random.default_rng(seed)
+        self.patch = patch
+        patch_dim = 3 * patch * patch
+        self.w_patch = rng.standard_normal((patch_dim, hidden)).astype(np.float32) / np.sqrt(patch_dim)
+        self.w_embed = rng.standard_normal((len(VOCAB), hidden)).astype(np.float32)
+        self.w_hidden = rng.standard_normal((hidden, hidden)).astype(np.float32) / np.sqrt(hidden)
+        self.w_out = rng.standard_normal((hidden, len(VOCAB))).astype(np.float32) / np.sqrt(hidden)
+
+    def generate(self, pixel_values=None, max_new_tokens=20, **kwargs):
+        """Greedy decode from a mean-pooled patch embedding"""
+        pixel_values = np.asarray(pixel_values, dtype=np.float32)
+        batch, channels, height, width = pixel_values.shape
+        p = self.patch
+        patches = pixel_values.reshape(batch, channels, height // p, p, width // p, p)
+        patches = patches.transpose(0, 2, 4, 1, 3, 5).reshape(batch, -1, channels * p * p)
+        state = np.tanh(patches @ self.w_patch).mean(axis=1)
+
+        tokens = np.full((batch, 1), PAD_ID, dtype=np.int64)
+        finished = np.zeros(batch, dtype=bool)
+        for step in range(max_new_tokens):
+            state = np.tanh(state @ self.w_hidden + self.w_embed[tokens[:, -1]])
+            logits = state @ self.w_out
+            logits[:, PAD_ID] = -np.inf
+            if step < 3:
+                logits[:, EOS_ID] = -np.inf  # at least a few words per caption
+            next_ids = np.where(finished, PAD_ID, logits.argmax(axis=-1))
+            tokens = np.concatenate((tokens, next_ids[:, None]), axis=1)
+            finished |= next_ids == EOS_ID
+            if finished.all():
+                break
+        return tokens
+
+
+class TinyAsrPipeline:
+    """Callable like a transformers ASR pipeline: one word per ~0.4 s of audio"""
+
+    def __init__(self, frame=400, hop=160, seconds_per_word=0.4, sampling_rate=16000, seed=0):
+        rng = np.random.default_rng(seed + 1)
+        self.frame = frame
+        self.hop = hop
+        self.sampling_rate = sampling_rate
+        self.frames_per_word = max(1, int(seconds_per_word * sampling_rate / hop))
+        bins = frame // 2 + 1
+        self.w_out = rng.standard_normal((bins, len(VOCAB) - 2)).astype(np.float32) / np.sqrt(bins)
+        self.window = np.hanning(frame).astype(np.float32)
+
+    def _load(self, source):
+        if isinstance(source, dict):
+            return np.asarray(source["raw"], dtype=np.float32)
+        if isinstance(source, str):
+            from audio_decode import decode_audio
+            with open(source, "rb") as f:
+                return decode_audio(f.read())
+        return np.asarray(source, dtype=np.float32)
+
+    def _transcribe(self, audio):
+        n_frames = 1 + (len(audio) - self.frame) // self.hop if len(audio) >= self.frame else 0
+        if n_frames <= 0:
+            return ""
+        index = np.arange(self.frame)[None, :] + self.hop * np.arange(n_frames)[:, None]
+        spectrum = np.log1p(np.abs(np.fft.rfft(audio[index] * self.window, axis=1)))
+        words = []
+        for start in range(0, n_frames, self.frames_per_word):
+            segment = spectrum[start:start + self.frames_per_word].mean(axis=0)
+            words.append(VOCAB[2 + int((segment @ self.w_out).argmax())])
+        return " ".join(words)
+
+    def __call__(self, inputs, batch_size=None, **kwargs):
+        if isinstance(inputs, list):
+            return [{"text": self._transcribe(self._load(item))} for item in inputs]
+        return {"text": self._transcribe(self._load(inputs))}
+
+
+def load_tiny_blip(seed=0):
+    """(processor, model) pair shaped like model_loader.load_blip()"""
+    return TinyBlipProcessor(), TinyBlipModel(seed=seed)
+
+
+def load_tiny_whisper(seed=0):
+    """ASR callable shaped like model_loader.load_whisper()"""
+    return TinyAsrPipeline(seed=seed)
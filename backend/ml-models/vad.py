@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Voice Activity Detection
+Energy / zero-crossing based silence trimming ahead of Whisper, vectorized in NumPy
+"""
+
+import numpy as np
+
+
+def trim_silence(audio, sampling_rate=16000, frame_ms=30, threshold_db=12.0,
+                 min_speech_db=-50.0, max_noise_floor_db=-45.0, zcr_threshold=0.25,
+                 padding_ms=200, max_pause_s=0.6):
+    """
+    Drop leading/trailing silence and shorten pauses longer than max_pause_s.
+
+    A frame counts as speech when its energy is threshold_db above the
+    recording's noise floor (10th percentile frame energy, capped at
+    max_noise_floor_db so a recording without any pause is not mistaken for
+    all-silence) and above min_speech_db dBFS; quieter frames with a high
+    zero-crossing rate (unvoiced consonants) count too if they are within
+    6 dB of that threshold. Speech regions are padded by padding_ms on both sides.
+
+    Returns (trimmed_audio, stats) where stats reports the seconds removed.
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    original_seconds = audio.size / sampling_rate
+    frame = max(1, int(sampling_rate * frame_ms / 1000))
+    n_frames = audio.size // frame
+
+    def stats(kept):
+        kept_seconds = kept / sampling_rate
+        return {
+            "originalSeconds": round(original_seconds, 3),
+            "keptSeconds": round(kept_seconds, 3),
+            "removedSeconds": round(original_seconds - kept_seconds, 3),
+        }
+
+    if n_frames < 2:
+        return audio, stats(audio.size)
+
+    frames = audio[:n_frames * frame].reshape(n_frames, frame)
+    energy_db = 10.0 * np.log10(np.mean(frames * frames, axis=1) + 1e-10)
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame
+
+    noise_floor = min(np.percentile(energy_db, 10), max_noise_floor_db)
+    threshold = max(noise_floor + threshold_db, min_speech_db)
+    speech = (energy_db > threshold) | ((energy_db > threshold - 6.0) & (zcr > zcr_threshold))
+
+    if not speech.any():
+        return audio[:0], stats(0)
+
+    # Pad speech regions so word onsets and tails are not clipped
+    pad = int(round(padding_ms / frame_ms))
+    if pad:
+        speech = np.convolve(speech.astype(np.int8), np.ones(2 * pad + 1, dtype=np.int8), mode="same") > 0
+
+    keep = speech.copy()
+    max_pause = max(0, int(round(max_pause_s * 1000 / frame_ms)))
+    half = max_pause // 2
+
+    # Runs of silence between speech: keep at most max_pause frames of each
+    edges = np.flatnonzero(np.diff(np.concatenate(([1], speech.astype(np.int8), [1]))))
+    for start, end in zip(edges[::2], edges[1::2]):
+        if start == 0 or end == n_frames:
+            continue  # leading/trailing silence is dropped entirely
+        if end - start > max_pause:
+            keep[start:start + half] = True
+            keep[end - (max_pause - half):end] = True
+        else:
+            keep[start:end] = True
+
+    sample_mask = np.repeat(keep, frame)
+    tail = audio.size - sample_mask.size
+    if tail:
+        sample_mask = np.concatenate((sample_mask, np.full(tail, keep[-1])))
+
+    trimmed = audio[sample_mask]
+    return trimmed, stats(trimmed.size)
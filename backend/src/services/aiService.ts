@@ -1,14 +1,27 @@
-import { spawn } from 'child_process';
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process';
+import readline from 'readline';
 import path from 'path';
 
+interface PendingRequest {
+  resolve: (value: any) => void;
+  reject: (reason: Error) => void;
+  timer: NodeJS.Timeout;
+}
+
 export class AIService {
   private static instance: AIService;
   private pythonPath: string;
   private scriptPath: string;
+  private serverScriptPath: string;
+  private serverProcess: ChildProcessWithoutNullStreams | null = null;
+  private serverReady = false;
+  private pendingRequests = new Map<string, PendingRequest>();
+  private nextRequestId = 0;
 
   constructor() {
     this.pythonPath = 'python3'; // or 'python' depending on your system
     this.scriptPath = path.join(__dirname, '../../ml-models/enhanced_civic_analyzer.py');
+    this.serverScriptPath = path.join(__dirname, '../../ml-models/analyzer_server.py');
   }
 
   public static getInstance(): AIService {
@@ -20,6 +33,22 @@ export class AIService {
 
   public async analyzeCivicIssue(imageData?: string, text?: string, audioData?: string, location?: string): Promise<any> {
     try {
+      // Long-lived analyzer process keeps the models loaded between requests
+      if (process.env.ML_ANALYZER_MODE === 'server') {
+        const result = await this.runAnalyzerServerRequest({ imageData, text, audioData, location });
+        if (result.shed) {
+          // Shed by the analyzer's admission control; answer now instead of waiting out the timeout
+          console.warn(`AI analysis shed (${result.shed}); using fallback analysis`);
+          return this.fallbackAnalysis(text || '', location || '');
+        }
+        return result;
+      }
+
+      // One Python process per request: no resident models, but every request pays the load
+      if (process.env.ML_ANALYZER_MODE === 'spawn') {
+        return await this.runPythonScript({ imageData, text, audioData, location });
+      }
+
       // For now, use the simplified analysis without Python
       return this.simplifiedAnalysis(imageData, text, audioData, location);
     } catch (error) {
@@ -68,11 +97,35 @@ export class AIService {
     };
   }
 
+  // Raw bytes of a base64 data URL (or bare base64) payload
+  private decodeDataUrl(data: string): Buffer {
+    const comma = data.startsWith('data:') ? data.indexOf(',') : -1;
+    return Buffer.from(comma >= 0 ? data.slice(comma + 1) : data, 'base64');
+  }
+
+  // Length-prefixed request for enhanced_civic_analyzer.py --framed (see framed_input.py):
+  // a JSON header naming the binary fields, then each field's raw bytes
+  private encodeFramedRequest(inputData: any): Buffer {
+    const { imageData, audioData, ...fields } = inputData;
+    const blobs: [string, Buffer][] = [];
+    if (imageData) blobs.push(['imageData', this.decodeDataUrl(imageData)]);
+    if (audioData) blobs.push(['audioData', this.decodeDataUrl(audioData)]);
+
+    const header = Buffer.from(JSON.stringify({ ...fields, blobs: blobs.map(([field]) => field) }), 'utf8');
+    const frames: Buffer[] = [];
+    for (const payload of [header, ...blobs.map(([, data]) => data)]) {
+      const length = Buffer.alloc(4);
+      length.writeUInt32BE(payload.length, 0);
+      frames.push(length, payload);
+    }
+    return Buffer.concat(frames);
+  }
+
   private runPythonScript(inputData: any): Promise<any> {
     return new Promise((resolve, reject) => {
-      const inputJson = JSON.stringify(inputData);
-      
-      const pythonProcess = spawn(this.pythonPath, [this.scriptPath, inputJson]);
+      // Payloads travel as frames on stdin: no argv size limit, no base64 on the Python side
+      const pythonProcess = spawn(this.pythonPath, [this.scriptPath, '--framed']);
+      pythonProcess.stdin.end(this.encodeFramedRequest(inputData));
       
       let stdout = '';
       let stderr = '';
@@ -107,6 +160,85 @@ export class AIService {
     });
   }
 
+  public isAnalyzerServerReady(): boolean {
+    return this.serverReady;
+  }
+
+  private ensureAnalyzerServer(): ChildProcessWithoutNullStreams {
+    if (this.serverProcess) {
+      return this.serverProcess;
+    }
+
+    // A pinned model directory gives an offline startup; warm up before reporting ready
+    const serverArgs = process.env.ML_MODEL_DIR
+      ? ['--model-dir', process.env.ML_MODEL_DIR, '--warmup']
+      : [];
+    // Small nodes cap model memory; the least recently used model is unloaded to make room
+    if (process.env.ML_MODEL_MEMORY_BUDGET_MB) {
+      serverArgs.push('--model-memory-budget-mb', process.env.ML_MODEL_MEMORY_BUDGET_MB);
+    }
+    const serverProcess = spawn(this.pythonPath, [this.serverScriptPath, ...serverArgs]);
+    this.serverProcess = serverProcess;
+    this.serverReady = false;
+
+    const lines = readline.createInterface({ input: serverProcess.stdout });
+    lines.on('line', (line) => {
+      let message: any;
+      try {
+        message = JSON.parse(line);
+      } catch (error) {
+        console.error('Error parsing analyzer server output:', line);
+        return;
+      }
+
+      if (message.event) {
+        this.serverReady = message.event === 'ready';
+        console.log(`AI analyzer server ${message.event}`);
+        return;
+      }
+
+      const pending = this.pendingRequests.get(message.id);
+      if (pending) {
+        clearTimeout(pending.timer);
+        this.pendingRequests.delete(message.id);
+        pending.resolve(message);
+      }
+    });
+
+    serverProcess.stderr.on('data', (data) => {
+      console.error('AI analyzer server:', data.toString());
+    });
+
+    serverProcess.on('close', (code) => {
+      console.error(`AI analyzer server exited with code ${code}`);
+      this.serverProcess = null;
+      this.serverReady = false;
+      for (const [id, pending] of this.pendingRequests) {
+        clearTimeout(pending.timer);
+        pending.reject(new Error('AI analyzer server exited'));
+        this.pendingRequests.delete(id);
+      }
+    });
+
+    return serverProcess;
+  }
+
+  private runAnalyzerServerRequest(inputData: any, timeoutMs = 30000): Promise<any> {
+    return new Promise((resolve, reject) => {
+      const serverProcess = this.ensureAnalyzerServer();
+      const id = `req-${++this.nextRequestId}`;
+
+      const timer = setTimeout(() => {
+        this.pendingRequests.delete(id);
+        reject(new Error('AI analysis timed out'));
+      }, timeoutMs);
+
+      this.pendingRequests.set(id, { resolve, reject, timer });
+      // The analyzer sheds work it cannot finish before we give up on it
+      serverProcess.stdin.write(JSON.stringify({ id, op: 'analyze', deadlineMs: timeoutMs, ...inputData }) + '\n');
+    });
+  }
+
   private fallbackAnalysis(text: string, location: string): any {
     const normalizedText = this.normalizeText(text);
     const problem = this.identifyProblem(normalizedText);